@@ -0,0 +1,134 @@
+# ai_cache.py — كاش إجابات /ask_ai (LRU+TTL في الذاكرة + طبقة SQLite اختيارية)
+# ----------------------------------------------------------
+# المفتاح = نص السؤال بعد التطبيع + الموديل + الأسلوب + التعاطف
+# (نفس مدخلات ai_system_prompt)، فلا نعيد نداء LLM لأسئلة متكررة.
+import os, re, time, sqlite3, hashlib, asyncio, threading, logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+AI_CACHE_SIZE = int(os.environ.get("AI_CACHE_SIZE", "2000"))
+AI_CACHE_TTL  = float(os.environ.get("AI_CACHE_TTL", str(7 * 24 * 3600)))  # ث
+AI_CACHE_DB   = os.environ.get("AI_CACHE_DB")  # مسار SQLite اختياري يبقى بعد إعادة التشغيل
+
+log = logging.getLogger(__name__)
+
+# ===== تطبيع السؤال =====
+_AR_MARKS   = re.compile("[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")  # تشكيل + تطويل
+_PUNCT      = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES     = re.compile(r"\s+")
+_AR_FOLD    = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ى": "ي", "ة": "ه", "ؤ": "و", "ئ": "ي"})
+_AR_DIGITS  = str.maketrans("٠١٢٣٤٥٦٧٨٩", "0123456789")
+
+def normalize_question(text: str) -> str:
+    """«كيف أذاكر القدرات؟» و«كيف اذاكر القدرات» يعطيان نفس المفتاح."""
+    t = (text or "").translate(_AR_DIGITS)
+    t = _AR_MARKS.sub("", t).translate(_AR_FOLD)
+    t = _PUNCT.sub(" ", t)
+    return _SPACES.sub(" ", t).strip().casefold()
+
+def cache_key(question: str, model: str, style: str, ei_enabled: bool) -> str:
+    raw = "\x1f".join((normalize_question(question), model, style, "1" if ei_enabled else "0"))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class AnswerCache:
+    """LRU+TTL في الذاكرة، مع طبقة SQLite اختيارية تُقرأ عند فوات الذاكرة."""
+
+    def __init__(self, maxsize: int = AI_CACHE_SIZE, ttl: float = AI_CACHE_TTL, db_path: Optional[str] = None,
+                 table: str = "answers"):
+        if not table.isidentifier():
+            raise ValueError(f"invalid cache table name: {table!r}")
+        self.table = table  # كاش مستقل لكل جدول: إخلاء وعدّادات لا تختلط بغيره
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._mem: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    # ----- الذاكرة -----
+    def _mem_get(self, key: str) -> Optional[str]:
+        item = self._mem.get(key)
+        if item is None:
+            return None
+        created, value = item
+        if time.time() - created > self.ttl:
+            del self._mem[key]
+            return None
+        self._mem.move_to_end(key)
+        return value
+
+    def _mem_put(self, key: str, value: str, created: float):
+        self._mem[key] = (created, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.maxsize:
+            self._mem.popitem(last=False)
+
+    # ----- القرص -----
+    def _disk_get(self, key: str) -> Optional[Tuple[float, str]]:
+        with self._db_lock:
+            row = self._db.execute(f"SELECT created, value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+        return row[0], row[1]
+
+    def _disk_put(self, key: str, value: str, created: float):
+        with self._db_lock:
+            self._db.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, created) VALUES (?, ?, ?)", (key, value, created))
+            self._writes += 1
+            if self._writes % 500 == 0:  # تنظيف دوري للمنتهي
+                self._db.execute(f"DELETE FROM {self.table} WHERE created < ?", (time.time() - self.ttl,))
+            self._db.commit()
+
+    # ----- الواجهة -----
+    async def get(self, key: str) -> Optional[str]:
+        value = self._mem_get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self._db is not None:
+            try:
+                row = await asyncio.to_thread(self._disk_get, key)
+            except sqlite3.Error:
+                log.exception("ai cache disk read failed")
+                row = None
+            if row is not None:
+                self._mem_put(key, row[1], row[0])
+                self.disk_hits += 1
+                return row[1]
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, value: str):
+        if not value:
+            return
+        created = time.time()
+        self._mem_put(key, value, created)
+        if self._db is not None:
+            try:
+                await asyncio.to_thread(self._disk_put, key, value, created)
+            except sqlite3.Error:
+                log.exception("ai cache disk write failed")
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._mem),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+answers = AnswerCache(db_path=AI_CACHE_DB)
@@ -0,0 +1,177 @@
+# ai_client.py — عميل LLM غير متزامن مشترك لكل مسارات الذكاء الاصطناعي
+# ----------------------------------------------------------
+# عميل httpx واحد للعملية كلها (keep-alive + حدود تجمّع الاتصالات)،
+# فلا يدفع كل سؤال مصافحة TLS جديدة ولا يحجز خيطاً من المنفّذ الافتراضي.
+import os, logging, asyncio
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+
+import ai_governor
+
+try:
+    from openai import AsyncOpenAI, APITimeoutError
+except ModuleNotFoundError:  # نعرض رسالة واضحة في البوت بدل الانهيار
+    AsyncOpenAI = None
+    APITimeoutError = None
+
+# ===== الإعدادات من المتغيرات البيئية =====
+AI_API_KEY  = os.environ.get("AI_API_KEY")
+AI_BASE_URL = os.environ.get("AI_BASE_URL")  # اختياري (OpenAI/OpenRouter…)
+
+AI_TIMEOUT          = float(os.environ.get("AI_TIMEOUT", "25"))          # مهلة النداء الكاملة (ث)
+AI_STREAM_TIMEOUT   = float(os.environ.get("AI_STREAM_TIMEOUT", "90"))   # سقف البث كاملاً (ث)
+AI_CONNECT_TIMEOUT  = float(os.environ.get("AI_CONNECT_TIMEOUT", "5"))
+AI_POOL_MAX         = int(os.environ.get("AI_POOL_MAX", "100"))          # أقصى اتصالات مفتوحة
+AI_POOL_KEEPALIVE   = int(os.environ.get("AI_POOL_KEEPALIVE", "20"))     # اتصالات خاملة محفوظة
+AI_KEEPALIVE_EXPIRY = float(os.environ.get("AI_KEEPALIVE_EXPIRY", "60"))
+AI_SDK_RETRIES      = int(os.environ.get("AI_SDK_RETRIES", "0"))         # إعادة المحاولة يتولاها ai_governor
+
+logger = logging.getLogger(__name__)
+
+_http: Optional[httpx.AsyncClient] = None
+_clients: Dict[Optional[str], "AsyncOpenAI"] = {}
+
+
+def available() -> bool:
+    """هل مكتبة openai مثبتة؟"""
+    return AsyncOpenAI is not None
+
+
+def _get_http() -> httpx.AsyncClient:
+    global _http
+    if _http is None or _http.is_closed:
+        _http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=AI_POOL_MAX,
+                max_keepalive_connections=AI_POOL_KEEPALIVE,
+                keepalive_expiry=AI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(AI_TIMEOUT, connect=AI_CONNECT_TIMEOUT),
+        )
+    return _http
+
+
+def get_client(base_url: Optional[str] = None) -> Optional["AsyncOpenAI"]:
+    """عميل AsyncOpenAI لكل base_url، وكلها تتشارك تجمّع اتصالات واحد."""
+    if not available() or not AI_API_KEY:
+        return None
+    base_url = base_url or AI_BASE_URL
+    client = _clients.get(base_url)
+    if client is None:
+        kwargs = {"api_key": AI_API_KEY, "http_client": _get_http(), "max_retries": AI_SDK_RETRIES}
+        if base_url:
+            kwargs["base_url"] = base_url
+        client = AsyncOpenAI(**kwargs)
+        _clients[base_url] = client
+    return client
+
+
+async def chat(
+    messages: List[Dict[str, str]],
+    model: str,
+    temperature: float,
+    max_tokens: Optional[int] = None,
+    timeout: Optional[float] = None,
+    base_url: Optional[str] = None,
+    on_queued: ai_governor.OnQueued = None,
+    on_slot: Optional[Callable[[], Any]] = None,
+) -> str:
+    """نداء محادثة عبر طبقة القبول؛ يرفع asyncio.TimeoutError عند تجاوز المهلة.
+
+    on_queued(position): يُستدعى إن انتظر النداء في الطابور.
+    on_slot(): يُستدعى عند بدء النداء فعلاً (بعد انتظار الطابور).
+    """
+    return await ai_governor.GOVERNOR.call(
+        lambda: _chat_once(messages, model, temperature, max_tokens, timeout, base_url), on_queued, on_slot
+    )
+
+
+async def _chat_once(messages, model, temperature, max_tokens, timeout, base_url) -> str:
+    client = get_client(base_url)
+    if client is None:
+        raise RuntimeError("AI client not configured")
+    timeout = timeout or AI_TIMEOUT
+    kwargs = {"model": model, "temperature": temperature, "messages": messages, "timeout": timeout}
+    if max_tokens:
+        kwargs["max_tokens"] = max_tokens
+    try:
+        resp = await asyncio.wait_for(client.chat.completions.create(**kwargs), timeout=timeout)
+    except Exception as e:
+        if APITimeoutError is not None and isinstance(e, APITimeoutError):
+            raise asyncio.TimeoutError() from e
+        raise
+    return (resp.choices[0].message.content or "").strip()
+
+
+async def stream_chat(
+    messages: List[Dict[str, str]],
+    model: str,
+    temperature: float,
+    max_tokens: Optional[int] = None,
+    timeout: Optional[float] = None,
+    base_url: Optional[str] = None,
+    on_queued: ai_governor.OnQueued = None,
+    on_slot: Optional[Callable[[], Any]] = None,
+) -> AsyncIterator[str]:
+    """بثّ الإجابة كقطع نصية متتالية عبر طبقة القبول.
+
+    timeout: أقصى انتظار بين قطعتين (ومنها أول قطعة)، و AI_STREAM_TIMEOUT سقف البث كاملاً.
+    on_slot: كما في chat.
+    """
+    stream = ai_governor.GOVERNOR.stream(
+        lambda: _stream_once(messages, model, temperature, max_tokens, timeout, base_url), on_queued, on_slot
+    )
+    async with aclosing(stream):
+        async for delta in stream:
+            yield delta
+
+
+async def _stream_once(messages, model, temperature, max_tokens, timeout, base_url) -> AsyncIterator[str]:
+    client = get_client(base_url)
+    if client is None:
+        raise RuntimeError("AI client not configured")
+    timeout = timeout or AI_TIMEOUT
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + AI_STREAM_TIMEOUT
+    kwargs = {"model": model, "temperature": temperature, "messages": messages,
+              "timeout": timeout, "stream": True}
+    if max_tokens:
+        kwargs["max_tokens"] = max_tokens
+
+    def _left() -> float:
+        left = min(timeout, deadline - loop.time())
+        if left <= 0:
+            raise asyncio.TimeoutError()
+        return left
+
+    try:
+        stream = await asyncio.wait_for(client.chat.completions.create(**kwargs), timeout=_left())
+        try:
+            it = stream.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(it.__anext__(), timeout=_left())
+                except StopAsyncIteration:
+                    break
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            await stream.close()
+    except Exception as e:
+        if APITimeoutError is not None and isinstance(e, APITimeoutError):
+            raise asyncio.TimeoutError() from e
+        raise
+
+
+async def aclose() -> None:
+    """إغلاق تجمّع الاتصالات عند إيقاف البوت."""
+    global _http
+    _clients.clear()
+    if _http is not None and not _http.is_closed:
+        await _http.aclose()
+    _http = None
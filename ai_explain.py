@@ -0,0 +1,179 @@
+# ai_explain.py — «اشرح أكثر» للإجابات الخاطئة: دفعات صغيرة + كاش ببصمة السؤال
+# ----------------------------------------------------------
+# الطلبات التي تصل خلال نافذة قصيرة تُجمع في نداء LLM واحد متعدد البنود،
+# ثم تُقسم الإجابات على أصحابها. الأسئلة المولّدة تتكرر كثيراً، فالشرح
+# يُخزَّن ببصمة السؤال (Question.fp: نص السؤال + الإجابة الصحيحة) ويُشارك بين كل الطلاب؛
+# لذا يُبنى الطلب من السؤال والإجابة فقط، فلا يذكر الشرح حروف خيارات يختلف ترتيبها.
+import os, re, json, asyncio, logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import ai_cache
+import ai_client
+from question import Question
+
+AI_EXPLAIN_WINDOW    = float(os.environ.get("AI_EXPLAIN_WINDOW", "0.4"))  # ث لتجميع الدفعة
+AI_EXPLAIN_MAX_BATCH = int(os.environ.get("AI_EXPLAIN_MAX_BATCH", "8"))
+AI_EXPLAIN_TOKENS    = int(os.environ.get("AI_EXPLAIN_TOKENS", "220"))    # لكل بند
+AI_MODEL             = os.environ.get("AI_MODEL", "gpt-4o-mini")
+AI_EXPLAIN_MODEL     = os.environ.get("AI_EXPLAIN_MODEL") or os.environ.get("AI_FAST_MODEL") or AI_MODEL
+AI_EXPLAIN_FILE      = os.environ.get("AI_EXPLAIN_FILE") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "verbal_explanations.json")
+
+log = logging.getLogger(__name__)
+
+
+def fp_key(q: Question) -> str:
+    """مفتاح الكاش والشروح الجاهزة: Question.fp بصيغة نصية."""
+    return f"{q.fp:016x}"
+
+
+def static_key(question: str, answer: str) -> str:
+    """مفتاح الشروح المولّدة مسبقاً: نص السؤال + الإجابة الصحيحة (الخيارات الخاطئة عشوائية)."""
+    return fp_key(Question(question, [answer], 0))
+
+
+def static_prompt(question: str, answer: str) -> str:
+    return f"السؤال: {question}\nالإجابة الصحيحة: {answer}"
+
+
+class MicroBatcher:
+    """يجمع الطلبات خلال window ثانية (أو حتى max_batch) في نداء واحد."""
+
+    def __init__(self, run_batch: Callable[[List[str]], Awaitable[List[Optional[str]]]],
+                 window: float = AI_EXPLAIN_WINDOW, max_batch: int = AI_EXPLAIN_MAX_BATCH):
+        self.run_batch = run_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: List[Tuple[str, str, asyncio.Future]] = []
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, key: str, prompt: str) -> str:
+        fut = self._pending.get(key)
+        if fut is None:  # نفس السؤال في نفس الدفعة يُطلب مرة واحدة
+            fut = asyncio.get_running_loop().create_future()
+            fut.add_done_callback(lambda f: f.cancelled() or f.exception())  # لا تحذير إن غادر المنتظرون
+            self._pending[key] = fut
+            self._queue.append((key, prompt, fut))
+            if len(self._queue) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await asyncio.shield(fut)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._queue = self._queue, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[str, str, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.run_batch([p for _, p, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (key, _, fut), res in zip(batch, results):
+            self._pending.pop(key, None)
+            if fut.done():
+                continue
+            if isinstance(res, BaseException):
+                fut.set_exception(res)
+            elif not res:
+                fut.set_exception(RuntimeError("missing item in batch answer"))
+            else:
+                fut.set_result(res)
+
+
+_ITEM_RE = re.compile(r"\[\[(\d+)\]\]")
+
+def split_batch_answer(text: str, n: int) -> List[Optional[str]]:
+    """يقسم الإجابة المجمّعة على البنود حسب العلامات [[1]] [[2]] …"""
+    out: List[Optional[str]] = [None] * n
+    parts = _ITEM_RE.split(text or "")
+    # parts = [قبل أول علامة, رقم, نص, رقم, نص, ...]
+    for i in range(1, len(parts) - 1, 2):
+        idx = int(parts[i]) - 1
+        body = parts[i + 1].strip()
+        if 0 <= idx < n and body and out[idx] is None:
+            out[idx] = body
+    return out
+
+
+def batch_messages(prompts: List[str]) -> List[Dict[str, str]]:
+    numbered = "\n\n".join(f"[[{i + 1}]]\n{p}" for i, p in enumerate(prompts))
+    return [
+        {"role": "system", "content": (
+            "أنت مدرّس قدرات (قياس) خبير بالعربية. ستصلك أسئلة مرقّمة مع إجاباتها الصحيحة.\n"
+            "لكل سؤال اكتب شرحاً مفصّلاً بخطوات مرقمة قصيرة يوضّح لماذا الإجابة صحيحة وأين يخطئ الطلاب عادة.\n"
+            "ابدأ شرح كل سؤال بسطر فيه رقمه بنفس الصيغة [[رقم]] ولا تكتب شيئاً قبل [[1]]."
+        )},
+        {"role": "user", "content": numbered},
+    ]
+
+
+async def _explain_batch(prompts: List[str]) -> List[Optional[str]]:
+    text = await ai_client.chat(
+        batch_messages(prompts),
+        model=AI_EXPLAIN_MODEL,
+        temperature=0.2,
+        max_tokens=AI_EXPLAIN_TOKENS * len(prompts),
+    )
+    return split_batch_answer(text, len(prompts))
+
+
+# ===== شروح مولّدة مسبقاً (pregen_explanations.py) =====
+PREGEN: Dict[str, str] = {}
+
+def read_pregenerated(path: str) -> Dict[str, str]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return dict(data.get("items", {}))
+
+def load_pregenerated(path: str = AI_EXPLAIN_FILE) -> int:
+    """يحمّل ملف الشروح الجاهزة عند الإقلاع (إن وُجد)؛ يعيد عدد العناصر."""
+    if not os.path.exists(path):
+        return 0
+    try:
+        PREGEN.clear()
+        PREGEN.update(read_pregenerated(path))
+    except (OSError, ValueError):
+        log.exception("failed to load %s", path)
+    return len(PREGEN)
+
+
+# جدول مستقل عن كاش /ask_ai: سياسة إخلاء وإحصاءات خاصة بالشروح
+explanations = ai_cache.AnswerCache(db_path=ai_cache.AI_CACHE_DB, table="explanations")
+_stats = {"pregen_hits": 0}
+BATCHER = MicroBatcher(_explain_batch)
+
+
+async def cached(key: str) -> Optional[str]:
+    return await explanations.get(key)
+
+
+async def explain(q: Question, on_miss: Optional[Callable[[], None]] = None) -> str:
+    """on_miss: يُستدعى قبل طلب LLM فقط (مثلاً لفحص معدّل المستخدم)، وله أن يرفع استثناءً."""
+    key = fp_key(q)
+    ready = PREGEN.get(key)
+    if ready:
+        _stats["pregen_hits"] += 1
+        return ready
+    hit = await cached(key)
+    if hit:
+        return hit
+    if on_miss is not None:
+        on_miss()
+    text = await BATCHER.submit(key, static_prompt(q.question, q.answer))
+    await explanations.put(key, text)
+    return text
+
+
+def stats() -> Dict[str, Any]:
+    c = explanations.stats()
+    return {"batches": BATCHER.batches, "items": BATCHER.items, "hits": c["hits"] + c["disk_hits"], "misses": c["misses"],
+            "pregen": len(PREGEN), "pregen_hits": _stats["pregen_hits"]}
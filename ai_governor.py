@@ -0,0 +1,299 @@
+# ai_governor.py — طبقة قبول أمام كل نداء LLM
+# ----------------------------------------------------------
+# - سقف عام لعدد النداءات المتزامنة + طابور انتظار محدود يُخبر المستخدم بترتيبه
+# - دلو رموز لكل مستخدم (أسئلة كثيرة بسرعة → انتظر)
+# - إعادة محاولة بتراجع أُسّي عشوائي (jitter) تحترم Retry-After عند 429
+# - قاطع دائرة: بعد فشل متتالٍ نرفض فوراً حتى تهدأ الخدمة
+import os, time, random, asyncio, logging
+from collections import deque
+from contextlib import aclosing, asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+AI_MAX_CONCURRENCY   = int(os.environ.get("AI_MAX_CONCURRENCY", "8"))
+AI_QUEUE_MAX         = int(os.environ.get("AI_QUEUE_MAX", "100"))
+AI_USER_RATE         = float(os.environ.get("AI_USER_RATE", "0.2"))   # سؤال/ث لكل مستخدم (1 كل 5 ث)
+AI_USER_BURST        = float(os.environ.get("AI_USER_BURST", "3"))
+AI_RETRIES           = int(os.environ.get("AI_RETRIES", "2"))         # محاولات إضافية بعد الأولى
+AI_BACKOFF_BASE      = float(os.environ.get("AI_BACKOFF_BASE", "1.0"))
+AI_BACKOFF_MAX       = float(os.environ.get("AI_BACKOFF_MAX", "20"))
+AI_BREAKER_THRESHOLD = int(os.environ.get("AI_BREAKER_THRESHOLD", "5"))
+AI_BREAKER_COOLDOWN  = float(os.environ.get("AI_BREAKER_COOLDOWN", "30"))
+
+log = logging.getLogger(__name__)
+
+OnQueued = Optional[Callable[[int], Awaitable[Any]]]
+
+
+# ===== أخطاء القبول =====
+class GovernorError(Exception):
+    def __init__(self, retry_after: float = 0.0):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+class UserRateLimited(GovernorError):
+    """المستخدم تجاوز معدّله."""
+
+class QueueFull(GovernorError):
+    """الطابور ممتلئ."""
+
+class CircuitOpen(GovernorError):
+    """الخدمة معطّلة مؤقتاً والقاطع مفتوح."""
+
+
+# ===== تصنيف أخطاء المزوّد =====
+def _status(e: BaseException) -> Optional[int]:
+    code = getattr(e, "status_code", None)
+    if code is None and getattr(e, "response", None) is not None:
+        code = getattr(e.response, "status_code", None)
+    return code
+
+def _retry_after(e: BaseException) -> Optional[float]:
+    resp = getattr(e, "response", None)
+    headers = getattr(resp, "headers", None)
+    if not headers:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    raw = headers.get("retry-after")
+    if not raw:
+        return None
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(raw).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def _is_retryable(e: BaseException) -> bool:
+    if isinstance(e, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    code = _status(e)
+    if code is None:
+        # أخطاء الاتصال في openai/httpx لا تحمل status
+        return type(e).__name__ in ("APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout", "RemoteProtocolError")
+    return code == 429 or code >= 500
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._b: Dict[Any, Tuple[float, float]] = {}
+
+    def take(self, key: Any) -> float:
+        """يأخذ رمزاً؛ يعيد 0 إن نجح وإلا عدد الثواني حتى يتوفر رمز."""
+        now = time.monotonic()
+        tokens, ts = self._b.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - ts) * self.rate)
+        if tokens >= 1:
+            self._b[key] = (tokens - 1, now)
+            if len(self._b) > 10000:
+                self._prune(now)
+            return 0.0
+        self._b[key] = (tokens, now)
+        return (1 - tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def peek(self, key: Any) -> float:
+        """مثل take دون أخذ رمز: 0 إن توفر رمز الآن وإلا الثواني حتى يتوفر."""
+        now = time.monotonic()
+        tokens, ts = self._b.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - ts) * self.rate)
+        if tokens >= 1:
+            return 0.0
+        return (1 - tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def _prune(self, now: float):
+        # الدلاء الممتلئة تعادل «لا سجل» فنحذفها
+        full = [k for k, (t, ts) in self._b.items() if t + (now - ts) * self.rate >= self.burst]
+        for k in full:
+            del self._b[k]
+
+
+class Governor:
+    def __init__(self, max_concurrency: int = AI_MAX_CONCURRENCY, queue_max: int = AI_QUEUE_MAX,
+                 user_rate: float = AI_USER_RATE, user_burst: float = AI_USER_BURST):
+        self.max_concurrency = max_concurrency
+        self.queue_max = queue_max
+        self.users = TokenBucket(user_rate, user_burst)
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # قاطع الدائرة
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+        # عدّادات
+        self.calls = 0
+        self.retries = 0
+        self.rejected = {"user": 0, "queue": 0, "breaker": 0}
+        self.peak_queue = 0
+
+    # ----- المستخدم -----
+    def check_user(self, user_id: Any):
+        wait = self.users.take(user_id)
+        if wait:
+            self.rejected["user"] += 1
+            raise UserRateLimited(wait)
+
+    # ----- قاطع الدائرة -----
+    def _check_breaker(self) -> bool:
+        """يرفع CircuitOpen إن كان القاطع مفتوحاً؛ يعيد True إن كان هذا النداء هو التجريبي."""
+        if self._failures < AI_BREAKER_THRESHOLD:
+            return False
+        now = time.monotonic()
+        if now < self._open_until or self._probing:
+            self.rejected["breaker"] += 1
+            raise CircuitOpen(max(0.0, self._open_until - now))
+        self._probing = True  # نصف مفتوح: نداء تجريبي واحد
+        return True
+
+    def _on_success(self):
+        self._failures = 0
+        self._probing = False
+
+    def _on_failure(self, e: BaseException):
+        if not _is_retryable(e) or _status(e) == 429:
+            self._probing = False
+            return  # أخطاء الطلب نفسه أو تحديد المعدل لا تعني أن الخدمة متوقفة
+        self._failures += 1
+        self._probing = False
+        if self._failures >= AI_BREAKER_THRESHOLD:
+            self._open_until = time.monotonic() + AI_BREAKER_COOLDOWN
+            log.warning("AI circuit open for %.0fs after %d failures", AI_BREAKER_COOLDOWN, self._failures)
+
+    def breaker_state(self) -> str:
+        if self._failures < AI_BREAKER_THRESHOLD:
+            return "closed"
+        return "open" if time.monotonic() < self._open_until else "half-open"
+
+    # ----- السقف العام والطابور -----
+    @asynccontextmanager
+    async def slot(self, on_queued: OnQueued = None):
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+        else:
+            if len(self._waiters) >= self.queue_max:
+                self.rejected["queue"] += 1
+                raise QueueFull(AI_BACKOFF_BASE)
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            self.peak_queue = max(self.peak_queue, len(self._waiters))
+            try:
+                if on_queued is not None:
+                    try:
+                        await on_queued(len(self._waiters))
+                    except Exception:
+                        log.exception("on_queued callback failed")
+                await fut
+            except BaseException:
+                if fut.done() and not fut.cancelled():
+                    self._release()  # سُلّمنا المكان ثم أُلغينا: مرّره للتالي
+                else:
+                    fut.cancel()
+                    try:
+                        self._waiters.remove(fut)
+                    except ValueError:
+                        pass
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)  # المكان ينتقل مباشرة دون إنقاص العدّاد
+                return
+        self._active -= 1
+
+    def _backoff(self, e: BaseException, attempt: int) -> float:
+        ra = _retry_after(e) if _status(e) == 429 else None
+        if ra is not None:
+            return min(AI_BACKOFF_MAX, ra) + random.uniform(0, AI_BACKOFF_BASE / 2)
+        return random.uniform(0, min(AI_BACKOFF_MAX, AI_BACKOFF_BASE * (2 ** attempt)))  # full jitter
+
+    # ----- تنفيذ النداءات -----
+    async def call(self, fn: Callable[[], Awaitable[Any]], on_queued: OnQueued = None,
+                   on_slot: Optional[Callable[[], Any]] = None) -> Any:
+        """on_slot(): يُستدعى لحظة الحصول على مكان (نهاية انتظار الطابور)."""
+        probe = self._check_breaker()
+        try:
+            async with self.slot(on_queued):
+                if on_slot is not None:
+                    on_slot()
+                attempt = 0
+                while True:
+                    self.calls += 1
+                    try:
+                        result = await fn()
+                    except Exception as e:
+                        self._on_failure(e)
+                        if attempt >= AI_RETRIES or not _is_retryable(e):
+                            raise
+                        self._check_breaker()
+                        delay = self._backoff(e, attempt)
+                        log.warning("LLM call failed (retry in %.1fs): %s", delay, e)
+                        attempt += 1
+                        self.retries += 1
+                        await asyncio.sleep(delay)
+                        continue
+                    self._on_success()
+                    return result
+        finally:
+            if probe:
+                self._probing = False  # لا يبقى القاطع عالقاً إن أُلغي النداء التجريبي
+
+    async def stream(self, make: Callable[[], AsyncIterator[str]], on_queued: OnQueued = None,
+                     on_slot: Optional[Callable[[], Any]] = None) -> AsyncIterator[str]:
+        """مثل call لكن للبث: نعيد المحاولة فقط إن فشل قبل أول قطعة."""
+        probe = self._check_breaker()
+        try:
+            async with self.slot(on_queued):
+                if on_slot is not None:
+                    on_slot()
+                attempt = 0
+                while True:
+                    self.calls += 1
+                    started = False
+                    try:
+                        async with aclosing(make()) as it:
+                            async for d in it:
+                                started = True
+                                yield d
+                    except Exception as e:
+                        self._on_failure(e)
+                        if started or attempt >= AI_RETRIES or not _is_retryable(e):
+                            raise
+                        self._check_breaker()
+                        delay = self._backoff(e, attempt)
+                        log.warning("LLM stream failed (retry in %.1fs): %s", delay, e)
+                        attempt += 1
+                        self.retries += 1
+                        await asyncio.sleep(delay)
+                        continue
+                    self._on_success()
+                    return
+        finally:
+            if probe:
+                self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "queued": len(self._waiters),
+            "peak_queue": self.peak_queue,
+            "calls": self.calls,
+            "retries": self.retries,
+            "rejected": dict(self.rejected),
+            "breaker": self.breaker_state(),
+        }
+
+
+GOVERNOR = Governor()
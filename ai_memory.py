@@ -0,0 +1,176 @@
+# ai_memory.py — ذاكرة محادثة محدودة لـ /ask_ai داخل context.user_data
+# ----------------------------------------------------------
+# كل مستخدم: ملخّص جارٍ + آخر الأدوار حرفياً، بميزانية رموز ثابتة.
+# عند تجاوز الميزانية تُضغط الأدوار الأقدم في الملخّص، فيبقى حجم الطلب
+# ثابتاً مهما طالت المحادثة.
+# السياق يُرسل مع كل سؤال ما دامت الذاكرة غير فارغة؛ إلا سؤالاً مستقلاً بوضوح
+# (is_self_contained: اختبار صارم) فيُجاب بلا سجل ويصلح لكاش الإجابات ودمج الطلبات.
+# AI_MEMORY_IDLE اختياري: ذاكرة خاملة أطول منه تُنسى عند السؤال التالي.
+import os, time, logging
+from typing import Any, Awaitable, Callable, Dict, List, MutableMapping
+
+from ai_cache import normalize_question
+
+AI_MEMORY_TOKENS         = int(os.environ.get("AI_MEMORY_TOKENS", "1500"))  # سقف (ملخّص + أدوار)
+AI_MEMORY_SUMMARY_TOKENS = int(os.environ.get("AI_MEMORY_SUMMARY_TOKENS", "300"))
+AI_MEMORY_IDLE           = float(os.environ.get("AI_MEMORY_IDLE", "0"))      # ث؛ 0 = لا انتهاء
+
+log = logging.getLogger(__name__)
+
+_stats = {"calls": 0, "prompt_tokens": 0, "compactions": 0, "fallbacks": 0, "expired": 0, "contextual": 0}
+
+Summarizer = Callable[[str, List[List[str]]], Awaitable[str]]
+
+
+def estimate_tokens(text: str) -> int:
+    """تقدير تقريبي: ~3 أحرف عربية للرمز + 4 رموز لغلاف كل رسالة."""
+    return len(text or "") // 3 + 4
+
+
+def get_memory(user_data: MutableMapping[str, Any]) -> Dict[str, Any]:
+    mem = user_data.setdefault("ai_mem", {"summary": "", "turns": [], "gen": 0})
+    mem.setdefault("gen", 0)
+    # «at» = آخر سؤال مسجّل بوقت الجدار (يبقى صالحاً بعد إعادة التشغيل)؛ غيابه = ذاكرة قديمة
+    if AI_MEMORY_IDLE > 0 and not is_empty(mem) and time.time() - mem.get("at", 0.0) > AI_MEMORY_IDLE:
+        _clear(mem)
+        _stats["expired"] += 1
+    return mem
+
+
+def _clear(mem: Dict[str, Any]):
+    gen = mem["gen"] + 1
+    mem.clear()
+    mem.update({"summary": "", "turns": [], "gen": gen})  # gen يُبطل أي ضغط جارٍ
+
+
+def reset(user_data: MutableMapping[str, Any]):
+    _clear(get_memory(user_data))
+
+
+def is_empty(mem: Dict[str, Any]) -> bool:
+    return not mem["summary"] and not mem["turns"]
+
+
+# كلمات/عبارات تحيل إلى الحديث السابق (بعد التطبيع: أ→ا، ة→ه، ى→ي)؛ أي منها ⇒ ليس مستقلاً
+_REF_WORDS = frozenset((
+    "هذا", "هذه", "ذلك", "تلك", "هذي", "السابق", "السابقه", "وضح", "وضحها",
+    "اشرحها", "اشرحه", "اكمل", "كمل", "تابع", "طيب", "يعني", "وماذا", "وكيف", "ولماذا",
+    "جوابك", "اجابتك", "كلامك", "شرحك", "قلت", "ذكرت", "نفسه", "نفسها", "مثله", "مثلها",
+))
+_REF_PHRASES = ("اشرح اكثر", "وضح اكثر", "مثال اخر", "ماذا عن", "لم افهم", "ما فهمت", "مافهمت", "سوال اخر مثل")
+# بدايات تكمل كلاماً سابقاً («ولو كان 169؟»، «طيب والثاني؟»)
+_LEAD_WORDS = frozenset(("لو", "ولو", "فلو", "طيب", "يعني", "بس", "ثم", "اذن", "اذا", "واذا", "وهل", "وما", "وش"))
+SELF_CONTAINED_MIN_WORDS = 4
+
+
+def is_self_contained(question: str) -> bool:
+    """سؤال مفهوم بلا أي سياق: طويل بما يكفي، لا يبدأ بأداة وصل، ولا يحيل لما سبق.
+
+    صارم عمداً: ما يفشل فيه يُرسل مع السجل (الخطأ هنا يفقد السياق لا الكاش فقط).
+    """
+    words = normalize_question(question).split()
+    if len(words) < SELF_CONTAINED_MIN_WORDS or words[0] in _LEAD_WORDS or words[0].startswith("و"):
+        return False
+    q = " ".join(words)
+    return not (_REF_WORDS.intersection(words) or any(p in q for p in _REF_PHRASES))
+
+
+def history_tokens(mem: Dict[str, Any]) -> int:
+    summary = estimate_tokens(mem["summary"]) if mem["summary"] else 0
+    return summary + sum(estimate_tokens(c) for _, c in mem["turns"])
+
+
+def build_messages(mem: Dict[str, Any], system_msg: str, question: str, with_history: bool = True) -> List[Dict[str, str]]:
+    """الرسائل المرسلة للموديل: التعليمات + الملخّص + الأدوار الأخيرة + السؤال."""
+    messages = [{"role": "system", "content": system_msg}]
+    if with_history and not is_empty(mem):
+        _stats["contextual"] += 1
+        _enforce_budget(mem)
+        if mem["summary"]:
+            messages.append({"role": "system", "content": "ملخّص المحادثة السابقة مع الطالب:\n" + mem["summary"]})
+        messages.extend({"role": role, "content": content} for role, content in mem["turns"])
+    messages.append({"role": "user", "content": question})
+    _stats["calls"] += 1
+    _stats["prompt_tokens"] += sum(estimate_tokens(m["content"]) for m in messages)
+    return messages
+
+
+def record(mem: Dict[str, Any], question: str, answer: str):
+    mem["turns"].append(["user", question])
+    mem["turns"].append(["assistant", answer])
+    mem["at"] = time.time()
+
+
+def needs_compaction(mem: Dict[str, Any]) -> bool:
+    return history_tokens(mem) > AI_MEMORY_TOKENS
+
+
+def _split_oldest(mem: Dict[str, Any]) -> int:
+    """عدد الأدوار الأقدم التي نضغطها حتى تنزل الأدوار الباقية لنصف الميزانية."""
+    target = AI_MEMORY_TOKENS // 2
+    total = sum(estimate_tokens(c) for _, c in mem["turns"])
+    n = 0
+    while n < len(mem["turns"]) and total > target:
+        total -= estimate_tokens(mem["turns"][n][1])
+        n += 1
+    if n % 2:  # لا نفصل سؤالاً عن إجابته
+        n = min(len(mem["turns"]), n + 1)
+    return n
+
+
+def _extractive(summary: str, turns: List[List[str]]) -> str:
+    """ملخّص احتياطي بلا LLM: أول سطر من كل دور، مقصوص لميزانية الملخّص."""
+    lines = [summary] if summary else []
+    for role, content in turns:
+        first = (content or "").strip().split("\n", 1)[0][:160]
+        lines.append(("س: " if role == "user" else "ج: ") + first)
+    text = "\n".join(lines)
+    limit = AI_MEMORY_SUMMARY_TOKENS * 3
+    return text[-limit:] if len(text) > limit else text
+
+
+def _enforce_budget(mem: Dict[str, Any]):
+    """حدّ صارم وقت بناء الطلب (إن تأخر الضغط أو فشل): نضغط استخراجياً."""
+    if needs_compaction(mem):
+        n = _split_oldest(mem)
+        mem["summary"] = _extractive(mem["summary"], mem["turns"][:n])
+        mem["turns"] = mem["turns"][n:]
+        _stats["fallbacks"] += 1
+
+
+async def compact(mem: Dict[str, Any], summarize: Summarizer):
+    """يضغط الأدوار الأقدم في الملخّص عبر LLM؛ آمن مع أسئلة جديدة أثناء الانتظار."""
+    if not needs_compaction(mem):
+        return
+    gen = mem["gen"]
+    n = _split_oldest(mem)
+    old_summary, oldest = mem["summary"], [list(t) for t in mem["turns"][:n]]
+    try:
+        summary = (await summarize(old_summary, oldest)).strip()
+    except Exception as e:
+        log.warning("memory summarize failed, using extractive fallback: %s", e)
+        summary = ""
+    if mem["gen"] != gen or mem["turns"][:n] != oldest:
+        return  # أُعيد ضبط الذاكرة أو تغيّرت أثناء الانتظار
+    if not summary or estimate_tokens(summary) > AI_MEMORY_SUMMARY_TOKENS * 2:
+        summary = _extractive(old_summary, oldest)
+        _stats["fallbacks"] += 1
+    mem["summary"] = summary
+    mem["turns"] = mem["turns"][n:]
+    _stats["compactions"] += 1
+
+
+def summary_prompt(old_summary: str, turns: List[List[str]]) -> List[Dict[str, str]]:
+    convo = "\n".join(("الطالب: " if r == "user" else "المدرّس: ") + c for r, c in turns)
+    return [
+        {"role": "system", "content": (
+            "لخّص محادثة تدريب على اختبار القدرات في نقاط قصيرة بالعربية: "
+            "ما سأل عنه الطالب، ما شُرح له، وأي صعوبة ظهرت. لا تتجاوز 120 كلمة."
+        )},
+        {"role": "user", "content": (f"الملخّص السابق:\n{old_summary}\n\n" if old_summary else "") + f"المحادثة:\n{convo}"},
+    ]
+
+
+def stats() -> Dict[str, float]:
+    calls = _stats["calls"]
+    return dict(_stats, avg_prompt_tokens=(_stats["prompt_tokens"] / calls) if calls else 0.0)
@@ -0,0 +1,229 @@
+# ai_router.py — توجيه الأسئلة بين الموديلات + طلبات احتياطية (hedging)
+# ----------------------------------------------------------
+# - الأسئلة القصيرة/البسيطة → موديل سريع ورخيص (AI_FAST_MODEL)، والبقية → الموديل المضبوط
+# - إن لم يُجب الأساسي خلال ميزانية p95 (AI_HEDGE_AFTER) نطلق طلباً ثانياً
+#   إلى AI_HEDGE_BASE_URL/AI_HEDGE_MODEL، وأول إجابة تصل تفوز ويُلغى الآخر
+# - الميزانية وعيّنات الزمن تبدأ بعد الحصول على مكان في طابور ai_governor: انتظار الطابور
+#   ضغط عندنا لا بطء عند المزوّد، وطلب ثانٍ للطابور نفسه يضاعف الحمل وقت التشبع.
+# - لا طلب احتياطي إلا إلى وجهة مختلفة (AI_HEDGE_BASE_URL أو AI_HEDGE_MODEL مضبوط)
+# - البث (stream_chat، مسار /ask_ai الافتراضي) يُحتاط فيه على زمن أول قطعة: إن لم تصل
+#   خلال الميزانية يبدأ بث احتياطي، وأول بث تصل قطعته الأولى يكمل ويُغلق الآخر.
+#   عيّنات زمن أول قطعة منفصلة عن زمن الإجابة الكاملة (ميزانية auto لكل منهما).
+import os, asyncio, logging
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+import ai_client
+import ai_governor
+
+AI_MODEL          = os.environ.get("AI_MODEL", "gpt-4o-mini")
+AI_FAST_MODEL     = os.environ.get("AI_FAST_MODEL")              # فارغ = بلا توجيه
+AI_FAST_MAX_CHARS = int(os.environ.get("AI_FAST_MAX_CHARS", "160"))
+AI_HEDGE_AFTER    = os.environ.get("AI_HEDGE_AFTER", "8")          # ث، أو auto (p95 المرصود)، أو 0 للتعطيل
+AI_HEDGE_BASE_URL = os.environ.get("AI_HEDGE_BASE_URL")            # فارغ = نفس المزوّد
+AI_HEDGE_MODEL    = os.environ.get("AI_HEDGE_MODEL")               # فارغ = نفس الموديل
+
+log = logging.getLogger(__name__)
+
+_latencies: Deque[float] = deque(maxlen=500)
+_ttft: Deque[float] = deque(maxlen=500)      # زمن أول قطعة في البث
+_stats = {"fast": 0, "primary": 0, "hedged": 0, "hedge_wins": 0}
+
+
+def is_simple(prompt: str) -> bool:
+    """سؤال قصير في سطر واحد بلا مسألة طويلة."""
+    p = (prompt or "").strip()
+    return len(p) <= AI_FAST_MAX_CHARS and "\n" not in p
+
+
+def choose_model(prompt: str, model: str) -> str:
+    """لا نوجّه إلا إن كان المستخدم على الموديل الافتراضي (لم يختر موديلاً بنفسه)."""
+    if AI_FAST_MODEL and model == AI_MODEL and is_simple(prompt):
+        _stats["fast"] += 1
+        return AI_FAST_MODEL
+    _stats["primary"] += 1
+    return model
+
+
+def _percentile(p: float, samples: Deque[float] = _latencies) -> Optional[float]:
+    if not samples:
+        return None
+    xs = sorted(samples)
+    return xs[min(len(xs) - 1, int(p * len(xs)))]
+
+
+def hedge_after(samples: Deque[float] = _latencies) -> Optional[float]:
+    if not (AI_HEDGE_BASE_URL or AI_HEDGE_MODEL):
+        return None  # نفس المزوّد والموديل: لا فائدة من طلب ثانٍ
+    raw = (AI_HEDGE_AFTER or "").strip().lower()
+    if raw == "auto":
+        return _percentile(0.95, samples) if len(samples) >= 20 else 8.0
+    try:
+        v = float(raw)
+    except ValueError:
+        return None
+    return v if v > 0 else None
+
+
+class _Clock:
+    """لحظة بدء النداء فعلاً (بعد انتظار الطابور)؛ on_slot يضبطها."""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.t0 = 0.0
+
+    def start(self):
+        self.t0 = asyncio.get_running_loop().time()
+        self.started.set()
+
+
+async def _timed(clock: _Clock, coro):
+    result = await coro
+    if clock.started.is_set():
+        _latencies.append(asyncio.get_running_loop().time() - clock.t0)
+    return result
+
+
+async def chat(
+    messages: List[Dict[str, str]],
+    model: str,
+    temperature: float,
+    max_tokens: Optional[int] = None,
+    on_queued: ai_governor.OnQueued = None,
+) -> str:
+    """مثل ai_client.chat مع الطلب الاحتياطي عند تأخر الأساسي."""
+    clock = _Clock()
+    primary = asyncio.ensure_future(_timed(clock, ai_client.chat(
+        messages, model=model, temperature=temperature, max_tokens=max_tokens, on_queued=on_queued,
+        on_slot=clock.start,
+    )))
+    budget = hedge_after()
+    if budget is None or (not AI_HEDGE_BASE_URL and (AI_HEDGE_MODEL or model) == model):
+        return await primary
+
+    pending = {primary}
+    try:
+        # ساعة الميزانية تبدأ حين يحصل الأساسي على مكان
+        started = asyncio.ensure_future(clock.started.wait())
+        try:
+            await asyncio.wait({primary, started}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            started.cancel()
+        if primary.done():
+            return primary.result()
+        done, _ = await asyncio.wait(pending, timeout=budget)
+        if done:
+            return primary.result()
+        # الأساسي تجاوز ميزانية p95 → طلب احتياطي
+        _stats["hedged"] += 1
+        hedge_clock = _Clock()
+        secondary = asyncio.ensure_future(_timed(hedge_clock, ai_client.chat(
+            messages, model=AI_HEDGE_MODEL or model, temperature=temperature, max_tokens=max_tokens,
+            base_url=AI_HEDGE_BASE_URL, on_slot=hedge_clock.start,
+        )))
+        pending.add(secondary)
+        last_err: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    if t is secondary:
+                        _stats["hedge_wins"] += 1
+                    return t.result()
+                last_err = t.exception()
+        raise last_err
+    finally:
+        for t in pending:
+            t.cancel()
+
+
+async def _first(clock: _Clock, it: AsyncIterator[str]) -> Optional[str]:
+    """أول قطعة من البث (None إن انتهى فارغاً) مع تسجيل زمنها."""
+    try:
+        delta = await it.__anext__()
+    except StopAsyncIteration:
+        delta = None
+    if clock.started.is_set():
+        _ttft.append(asyncio.get_running_loop().time() - clock.t0)
+    return delta
+
+
+async def _drop(task: "asyncio.Future", it: AsyncIterator[str]):
+    task.cancel()
+    try:
+        await task
+    except BaseException:
+        pass
+    await it.aclose()
+
+
+async def stream_chat(
+    messages: List[Dict[str, str]],
+    model: str,
+    temperature: float,
+    max_tokens: Optional[int] = None,
+    on_queued: ai_governor.OnQueued = None,
+) -> AsyncIterator[str]:
+    """مثل ai_client.stream_chat مع بثّ احتياطي إن تأخرت القطعة الأولى."""
+    clock = _Clock()
+    primary = ai_client.stream_chat(
+        messages, model=model, temperature=temperature, max_tokens=max_tokens, on_queued=on_queued,
+        on_slot=clock.start,
+    )
+    budget = hedge_after(_ttft)
+    streams = {asyncio.ensure_future(_first(clock, primary)): primary}
+    winner = primary
+    try:
+        first_task = next(iter(streams))
+        if budget is not None and (AI_HEDGE_BASE_URL or (AI_HEDGE_MODEL or model) != model):
+            # ساعة الميزانية تبدأ حين يحصل الأساسي على مكان
+            started = asyncio.ensure_future(clock.started.wait())
+            try:
+                await asyncio.wait({first_task, started}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                started.cancel()
+            if not first_task.done():
+                await asyncio.wait({first_task}, timeout=budget)
+            if not first_task.done():
+                # لا قطعة أولى خلال ميزانية p95 → بث احتياطي
+                _stats["hedged"] += 1
+                hedge_clock = _Clock()
+                secondary = ai_client.stream_chat(
+                    messages, model=AI_HEDGE_MODEL or model, temperature=temperature, max_tokens=max_tokens,
+                    base_url=AI_HEDGE_BASE_URL, on_slot=hedge_clock.start,
+                )
+                streams[asyncio.ensure_future(_first(hedge_clock, secondary))] = secondary
+        pending = set(streams)
+        last_err: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            ok = [t for t in done if t.exception() is None]
+            if ok:
+                first_task = ok[0]
+                break
+            last_err = done.pop().exception()
+        else:
+            raise last_err
+        winner = streams.pop(first_task)
+        if winner is not primary:
+            _stats["hedge_wins"] += 1
+        for t, it in streams.items():
+            await _drop(t, it)
+        streams.clear()
+        first = first_task.result()
+        if first is None:
+            return
+        yield first
+        async with aclosing(winner) as it:
+            async for delta in it:
+                yield delta
+    finally:
+        for t, it in streams.items():
+            await _drop(t, it)
+
+
+def stats() -> Dict[str, object]:
+    return dict(_stats, p50=_percentile(0.5), p95=_percentile(0.95), hedge_after=hedge_after(),
+                ttft_p50=_percentile(0.5, _ttft), ttft_p95=_percentile(0.95, _ttft),
+                stream_hedge_after=hedge_after(_ttft))
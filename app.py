@@ -1,7 +1,7 @@
 # app.py — Qiyas Bot (Webhook/PTB v21) — بدون أي ملفات data
 # ----------------------------------------------------------
-import os, logging, random, re, asyncio
-from collections import deque
+import os, logging, random, re, asyncio, math
+from contextlib import aclosing
 from typing import List, Dict, Any, Optional, Tuple
 
 from telegram import (
@@ -9,10 +9,31 @@ from telegram import (
     InlineKeyboardButton, InlineKeyboardMarkup
 )
 from telegram.constants import ChatAction
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import (
     Application, CommandHandler, MessageHandler,
     CallbackQueryHandler, ContextTypes, filters
 )
+from telegram.request import HTTPXRequest
+
+import ai_client
+import ai_cache
+import ai_governor
+import ai_router
+import ai_memory
+import ai_explain
+from generators import KINDS, build_item, plan
+from question import Question
+import dedup
+import qpool
+import sweeper
+import quizview
+import webhook_reply
+import outbound
+import chat_processor
+from sqlite_persistence import PERSIST_DB, SQLitePersistence, warn_if_ephemeral
+from dedup import RecentSet
+from singleflight import SingleFlight
 
 # ================= إعدادات البيئة =================
 BOT_TOKEN   = os.environ.get("TELEGRAM_BOT_TOKEN") or os.environ.get("BOT_TOKEN")
@@ -33,6 +54,10 @@ if not WEBHOOK_URL:
 AI_MAX_TOKENS          = int(os.environ.get("AI_MAX_TOKENS", "650"))
 AI_TEMPERATURE_DEFAULT = float(os.environ.get("AI_TEMPERATURE", "0.4"))
 AI_STYLE_DEFAULT       = os.environ.get("AI_STYLE", "concise")  # concise | detailed
+AI_STREAM_DEFAULT      = os.environ.get("AI_STREAM", "1") == "1"   # بثّ الإجابة بتعديلات متتالية
+AI_STREAM_EDIT_PRIVATE = float(os.environ.get("AI_STREAM_EDIT_PRIVATE", "1.0"))  # ث بين تعديلين (خاص)
+AI_STREAM_EDIT_GROUP   = float(os.environ.get("AI_STREAM_EDIT_GROUP", "3.0"))    # ث بين تعديلين (مجموعات)
+AI_EXPLAIN_ENABLED     = os.environ.get("AI_EXPLAIN", "1") == "1"   # زر «اشرح أكثر» بعد الخطأ
 
 # ===== ترحيب ثابت (بدون أسماء شخصية) =====
 WELCOME_TEXT = (
@@ -50,6 +75,7 @@ def get_ai_prefs(context):
     prefs.setdefault("model", AI_MODEL)
     prefs.setdefault("temperature", AI_TEMPERATURE_DEFAULT)
     prefs.setdefault("style", AI_STYLE_DEFAULT)  # concise/detailed
+    prefs.setdefault("stream", AI_STREAM_DEFAULT)
     return prefs
 
 def ai_system_prompt(style: str, ei_enabled: bool) -> str:
@@ -96,288 +122,151 @@ def ei_msg_wrong(explain: Optional[str]) -> str:
 #          منع التكرار (ذاكرة قصيرة داخل الجلسة)
 # ======================================================
 SEEN_LIMIT = 400
-def seen_push(context, cat: str, key: str):
-    deq: deque = context.user_data.setdefault(f"seen_{cat}", deque(maxlen=SEEN_LIMIT))
-    deq.append(key)
-def seen_has(context, cat: str, key: str) -> bool:
-    deq: deque = context.user_data.setdefault(f"seen_{cat}", deque(maxlen=SEEN_LIMIT))
-    return key in deq
-
-# ======================================================
-#                 مولِّدات الأسئلة
-# ======================================================
-def _choice4(correct: int | str, near: List[int | str]) -> Tuple[List[str], int]:
-    opts: List[str] = []
-    seen = set()
-    def push(x):
-        sx = str(x)
-        if sx not in seen and len(opts) < 4:
-            opts.append(sx); seen.add(sx)
-    push(correct)
-    for x in near: push(x)
-    while len(opts) < 4:
-        v = random.randint(-50, 200); push(v)
-    random.shuffle(opts)
-    return opts, opts.index(str(correct))
-
-# ---- كمي ----
-def gen_quant() -> Dict[str, Any]:
-    t = random.choice(["arith", "linear", "percent", "pow", "mix"])
-    if t == "arith":
-        a, b = random.randint(-20, 90), random.randint(-20, 90)
-        op = random.choice(["+", "-", "×", "÷"])
-        if op == "+":
-            val = a + b; opts, ans = _choice4(val, [val + random.choice([-3, -2, -1, 1, 2, 3]), val + 10, val - 10])
-            q = f"احسب: {a} + {b} = ؟"
-        elif op == "-":
-            val = a - b; opts, ans = _choice4(val, [val + random.choice([-3, -1, 1, 3]), val + 7, val - 7])
-            q = f"احسب: {a} - {b} = ؟"
-        elif op == "×":
-            a, b = random.randint(2, 20), random.randint(2, 15)
-            val = a * b; opts, ans = _choice4(val, [val + a, val - b, val + 10])
-            q = f"احسب: {a} × {b} = ؟"
-        else:
-            b = random.randint(2, 12); val = random.randint(2, 12); a = b * val
-            opts, ans = _choice4(val, [val + 1, val - 1, val + 2])
-            q = f"احسب: {a} ÷ {b} = ؟"
-        return {"question": q, "options": opts, "answer_index": ans, "explain": "عمليات حسابية أساسية."}
-
-    if t == "linear":
-        a = random.randint(2, 9); x = random.randint(-10, 12); b = random.randint(-10, 12)
-        c = a * x + b
-        q = f"إذا كان {a}س + {b} = {c}، فما قيمة س؟"
-        opts, ans = _choice4(x, [x + 1, x - 1, x + 2])
-        return {"question": q, "options": opts, "answer_index": ans, "explain": f"س = ( {c} - {b} ) ÷ {a} = {x}"}
-
-    if t == "percent":
-        y = random.randint(20, 200); x = random.choice([5, 10, 12, 15, 20, 25, 30, 40, 50])
-        val = round(y * x / 100)
-        q = f"ما {x}% من {y} ؟"
-        opts, ans = _choice4(val, [val + 5, val - 5, val + 10])
-        return {"question": q, "options": opts, "answer_index": ans, "explain": f"{x}% × {y} = {y * x / 100:g}"}
-
-    if t == "pow":
-        base = random.randint(2, 15); exp = random.choice([2, 3]); val = base ** exp
-        q = f"قيمة {base}^{exp} = ؟"
-        near = [val + base, val - base, val + 2]
-        opts, ans = _choice4(val, near)
-        return {"question": q, "options": opts, "answer_index": ans, "explain": f"{base}^{exp} = {val}"}
-
-    v = random.randint(30, 120); t = random.randint(1, 6); d = v * t
-    q = f"سيارة سرعتها {v} كم/س، سارت {t} ساعات. ما المسافة؟"
-    opts, ans = _choice4(d, [d - 10, d + 10, d + v])
-    return {"question": q, "options": opts, "answer_index": ans, "explain": "المسافة = السرعة × الزمن."}
-
-# ---- أدوات اللفظي الآمنة ----
-def _build_four_options(correct: str, wrong_candidates: List[str]) -> Tuple[List[str], int]:
-    seen = set([correct]); opts = [correct]
-    for w in wrong_candidates:
-        if w and w not in seen:
-            opts.append(w); seen.add(w)
-        if len(opts) == 4: break
-    fillers = ["قديم", "حديث", "سريع", "بطيء", "واضح", "غامض", "قوي", "ضعيف", "قريب", "بعيد"]
-    for w in fillers:
-        if len(opts) == 4: break
-        if w not in seen:
-            opts.append(w); seen.add(w)
-    random.shuffle(opts)
-    return opts, opts.index(correct)
-
-# ---- لفظي (قوائم موسّعة) ----
-SYN = [
-    ("يجابه", "يواجه"), ("جلّي", "واضح"), ("ينأى", "يبتعد"), ("يبتكر", "يبدع"),
-    ("محنة", "ابتلاء"), ("ساطع", "لامع"), ("متين", "قوي"), ("ودود", "لطيف"),
-    ("ثابر", "واظب"), ("يعزّز", "يقوّي"), ("يثري", "يغني"), ("رشاقة", "خِفّة"),
-    ("حصيف", "عاقل"), ("طمأنينة", "سكون"), ("حازم", "صارم"), ("يلتزم", "يتقيد"),
-    ("يُجمّل", "يزين"), ("مهارة", "براعة"), ("يستعيد", "يسترجع"), ("موثوق", "جدير بالثقة"),
-    ("جوهر", "لبّ"), ("ملحوظ", "بارز"), ("مُلهم", "مشجّع"), ("يُبرهن", "يثبت")
-]
-ANT = [
-    ("مؤقّت", "دائم"), ("قوي", "ضعيف"), ("وضوح", "غموض"), ("سهل", "صعب"),
-    ("قديم", "حديث"), ("قريب", "بعيد"), ("وفرة", "قلّة"), ("حاضر", "غائب"),
-    ("نجاح", "فشل"), ("يقبل", "يرفض"), ("نظام", "فوضى"), ("انخفاض", "ارتفاع"),
-    ("بارد", "حار"), ("حياة", "موت"), ("نشاط", "خمول"), ("شجاع", "جبان"),
-    ("مفيد", "ضار"), ("نظيف", "متسخ"), ("فرح", "حزن"), ("نادر", "شائع"),
-    ("يمدح", "يذم"), ("اليقين", "الشك"), ("بداية", "نهاية"), ("مباشر", "غير مباشر")
-]
-COMP_SENT = [
-    ("الطالب ____ في الاختبار النهائي.", "تفوق", ["تفوّق", "تأخّر", "تهاون", "انسحب"]),
-    ("كان القرار ____ بعد دراسة مستفيضة.", "صائب", ["صائب", "عشوائي", "مُلتبس", "متسرّع"]),
-    ("يجب _____ الوقت لتحقيق الأهداف.", "استثمار", ["إهدار", "تضييع", "استثمار", "تجميد"]),
-    ("الفكرة ما زالت ____ وتحتاج توضيحًا.", "غامضة", ["واضحة", "غامضة", "قوية", "قديمة"]),
-    ("نجح الفريق بفضل ____ الجهود.", "تكامل", ["تفكك", "تكاسل", "تكامل", "تباعد"]),
-    ("أظهرت التجربة ____ الفرضية.", "صحة", ["سقوط", "صحة", "ضعف", "غموض"]),
-    ("القراءة اليومية ____ المفردات.", "تثري", ["تضعف", "تثري", "تبدد", "تقلل"]),
-    ("بعد النقاش، وصلنا إلى ____ مشتركة.", "رؤية", ["رؤية", "فوضى", "تردد", "خلاف"]),
-    ("الخبر اليقين أفضل من ____ الشائعات.", "غموض", ["وضوح", "غموض", "انتشار", "قدم"]),
-    ("الطالب المجتهد ____ خطته أسبوعيًا.", "يراجع", ["يهمل", "يراجع", "ينسى", "يتجاهل"]),
-    ("من الضروري ____ الأخطاء لتجنّب تكرارها.", "تحليل", ["تحليل", "إنكار", "إهمال", "تجاهل"]),
-    ("النتيجة كانت ____ للتوقعات.", "مطابقة", ["متأخرة", "مخالفة", "مطابقة", "غامضة"]),
-    ("لا تعتمد على ____ دون دليل.", "الانطباع", ["الانطباع", "البرهان", "المثال", "الشرح"]),
-    ("البيانات تُقدَّم بصورة ____ وواضحة.", "منظّمة", ["عشوائية", "منظّمة", "سطحية", "ناقصة"]),
-    ("نحتاج إلى ____ دقيقة قبل الاختبار.", "مراجعة", ["مراجعة", "تسلية", "إهمال", "تشتيت"]),
-]
-
-def gen_verbal() -> Dict[str, Any]:
-    kind = random.choice(["syn", "ant", "analogy", "cloze"])
-    if kind == "syn":
-        a, b = random.choice(SYN)
-        wrongs = [w for _, w in SYN if w != b] + [x for _, x in ANT]
-        opts, idx = _build_four_options(b, wrongs)
-        return {"question": f"مرادف «{a}» هو:", "options": opts, "answer_index": idx, "explain": f"مرادف «{a}» = «{b}»."}
-    if kind == "ant":
-        a, b = random.choice(ANT)
-        wrongs = [w for _, w in ANT if w != b] + [x for _, x in SYN]
-        opts, idx = _build_four_options(b, wrongs)
-        return {"question": f"ضدّ «{a}» هو:", "options": opts, "answer_index": idx, "explain": f"ضدّ «{a}» = «{b}»."}
-    if kind == "analogy":
-        if random.random() < 0.5:
-            a, b = random.choice(SYN); c, d = random.choice(SYN)
-            q = f"{a} : {b} :: {c} : ؟"; target = d
-            pool = [x for _, x in SYN if x != d] + [x for _, x in ANT]
-        else:
-            a, b = random.choice(ANT); c, d = random.choice(ANT)
-            q = f"{a} : {b} :: {c} : ؟"; target = d
-            pool = [x for _, x in ANT if x != d] + [x for _, x in SYN]
-        opts, idx = _build_four_options(target, pool)
-        return {"question": q, "options": opts, "answer_index": idx, "explain": "حافظ على نوع العلاقة يمين التشبيه."}
-    s, correct, opts_full = random.choice(COMP_SENT)
-    opts, idx = _build_four_options(correct, [o for o in opts_full if o != correct])
-    return {"question": s, "options": opts, "answer_index": idx, "explain": f"الكلمة الأنسب: «{correct}»."}
-
-# ---- ذكاء ----
-AR_LETTERS = list("ابتثجحخدذرزسشصضطظعغفقكلمنهوي")
-
-def gen_iq() -> Dict[str, Any]:
-    k = random.choice(["arith_seq", "geom_seq", "alt_seq", "letter_seq", "squares", "fibo", "mix_ops"])
-    if k == "arith_seq":
-        a = random.randint(1, 15); d = random.randint(2, 9)
-        n = [a + i * d for i in range(5)]; ans = n[-1] + d
-        opts, idx = _choice4(ans, [ans + d, ans - d, ans + 2])
-        return {"question": f"أكمل المتتالية: {', '.join(map(str, n))}, ؟", "options": opts, "answer_index": idx, "explain": f"فرق ثابت = {d}"}
-    if k == "geom_seq":
-        a = random.randint(1, 6); r = random.choice([2, 3, 4])
-        n = [a * (r ** i) for i in range(4)]; ans = n[-1] * r
-        opts, idx = _choice4(ans, [ans * r, ans // r if ans % r == 0 else ans - 1, ans + r])
-        return {"question": f"أكمل: {', '.join(map(str, n))}, ؟", "options": opts, "answer_index": idx, "explain": f"متضاعف بنسبة {r}"}
-    if k == "alt_seq":
-        a = random.randint(5, 20); d1 = random.randint(2, 6); d2 = random.randint(7, 12)
-        seq = [a, a + d1, a + d1 + d2, a + 2 * d1 + d2, a + 2 * d1 + 2 * d2]
-        ans = a + 3 * d1 + 2 * d2
-        opts, idx = _choice4(ans, [ans + d1, ans + d2, ans - 1])
-        return {"question": f"نمط متناوب (+{d1}, +{d2}): {', '.join(map(str, seq))}, ؟", "options": opts, "answer_index": idx, "explain": "يزيد مرّة d1 ثم d2 بالتناوب."}
-    if k == "letter_seq":
-        step = random.randint(1, 3)
-        max_start = len(AR_LETTERS) - 1 - 5 * step
-        if max_start < 0:
-            step = 1; max_start = len(AR_LETTERS) - 6
-        start = random.randint(0, max_start)
-        seq = [AR_LETTERS[start + i * step] for i in range(5)]
-        nxt_index = start + 5 * step; nxt = AR_LETTERS[nxt_index]
-        candidates = [i for i in range(len(AR_LETTERS)) if i != nxt_index]
-        wrong_idx = random.sample(candidates, 3)
-        opts = [nxt] + [AR_LETTERS[i] for i in wrong_idx]; random.shuffle(opts)
-        return {"question": f"أكمل: {'، '.join(seq)}, ؟", "options": opts, "answer_index": opts.index(nxt), "explain": f"زيادة ثابتة بالحروف بمقدار {step}."}
-    if k == "squares":
-        s = random.randint(2, 6); seq = [i * i for i in range(s, s + 4)]
-        ans = (s + 4) ** 2
-        opts, idx = _choice4(ans, [ans + (2 * s + 1), ans - (2 * s + 1), ans + 4])
-        return {"question": f"مربعات: {', '.join(map(str, seq))}, ؟", "options": opts, "answer_index": idx, "explain": "أنماط n²."}
-    if k == "fibo":
-        a, b = random.randint(1, 4), random.randint(1, 4)
-        seq = [a, b]
-        for _ in range(3): seq.append(seq[-1] + seq[-2])
-        ans = seq[-1] + seq[-2]
-        opts, idx = _choice4(ans, [ans + seq[-3], ans - 1, ans + 2])
-        return {"question": f"فيبوناتشي: {', '.join(map(str, seq))}, ؟", "options": opts, "answer_index": idx, "explain": "كل حد = مجموع السابقين."}
-    a = random.randint(2, 6); b = random.choice([2, 3]); x = random.randint(2, 9)
-    seq = [x, x + a, (x + a) * b, (x + a) * b + a, ((x + a) * b + a) * b]
-    ans = seq[-1] + a
-    opts, idx = _choice4(ans, [ans + a, ans * b, ans - 1])
-    return {"question": f"نمط (+{a} ثم ×{b}): {', '.join(map(str, seq))}, ؟", "options": opts, "answer_index": idx, "explain": f"يتناوب +{a} ثم ×{b}."}
+def seen_get(context, cat: str) -> RecentSet:
+    seen = context.user_data.get(f"seen_{cat}")
+    if not isinstance(seen, RecentSet):
+        seen = context.user_data[f"seen_{cat}"] = RecentSet(SEEN_LIMIT)
+    return seen
 
 # ======================================================
 #                    محرّك الاختبار
 # ======================================================
+FALLBACK_Q = Question("أكمل: 2، 4، 6، 8، ؟", ["9", "10", "12", "14"], 1, "فرق ثابت +2 → 10")
+
 class QuizSession:
-    def __init__(self, generator, limit: int):
-        self.gen = generator
+    """حالة ثابتة الحجم: البذرة + المؤشر + النتيجة + عدّاد لكل نوع محدود.
+
+    السؤال الحالي يُعاد توليده حتمياً من (seed, idx, attempt, cursors) عبر generators.plan:
+    الأنواع ذات الفضاء المحدود تُسحب بلا إعادة حتى تُستنفد.
+    الأنواع غير المحدودة تُسحب من مخزن جاهز (qpool) إن توفّر، ويُحفظ ذلك السؤال
+    وحده في held حتى تعرض الجلسة المستعادة نفس السؤال.
+    تنبيه: سؤال المخزن لا يُشتق من البذرة، فالحتمية (نفس البذرة ⇒ نفس الأسئلة) مضمونة
+    للأنواع المحدودة فقط؛ لأسئلة quant «mixed» تلزم QPOOL=0.
+    attempt يزيد عند إعادة توليد السؤال الحالي (تكرار)، ويُصفَّر عند الانتقال للتالي.
+    _cur نسخة مؤقتة من السؤال الحالي فقط ولا تُحفظ مع الجلسة.
+    """
+    __slots__ = ("cat", "seed", "total", "idx", "attempt", "correct", "cursors", "held", "_cur")
+
+    def __init__(self, cat: str, limit: int, seed: Optional[int] = None):
+        self.cat = cat
+        self.seed = random.getrandbits(32) if seed is None else seed
         self.total = limit
         self.idx = 0
+        self.attempt = 0
         self.correct = 0
-        self.items: List[Dict[str, Any]] = []
-
-    def _ensure(self):
-        while len(self.items) <= self.idx and len(self.items) < self.total:
-            try:
-                self.items.append(self.gen())
-            except Exception:
-                log.exception("generator failed, falling back")
-                self.items.append({
-                    "question": "أكمل: 2، 4، 6، 8، ؟",
-                    "options": ["9", "10", "12", "14"],
-                    "answer_index": 1,
-                    "explain": "فرق ثابت +2 → 10"
-                })
-
-    def current(self) -> Optional[Dict[str, Any]]:
-        self._ensure()
-        return self.items[self.idx] if self.idx < self.total else None
+        self.cursors: Dict[str, int] = {}
+        self.held: Optional[Tuple[Tuple[int, int], str, Question]] = None
+        self._cur = None
+
+    def __getstate__(self):
+        return (self.cat, self.seed, self.total, self.idx, self.attempt, self.correct, self.cursors, self.held)
+
+    def __setstate__(self, state):
+        self.cat, self.seed, self.total, self.idx, self.attempt, self.correct, self.cursors, self.held = state
+        self._cur = None
+
+    def _draw(self) -> Tuple[str, Question]:
+        key = (self.idx, self.attempt)
+        if self._cur is None or self._cur[0] != key:
+            if self.held is not None and self.held[0] == key:
+                self._cur = self.held
+                return self._cur[1], self._cur[2]
+            self.held = None
+            kind, rng, i = plan(self.cat, self.seed, self.idx, self.attempt, self.cursors)
+            pooled = qpool.pop(self.cat) if i is None else None
+            if pooled is not None:
+                self.held = (key, kind, pooled)
+                q = pooled
+            else:
+                try:
+                    q = build_item(self.cat, kind, rng, i)
+                except Exception:
+                    log.exception("generator failed, falling back")
+                    kind, q = "", FALLBACK_Q
+            self._cur = (key, kind, q)
+        return self._cur[1], self._cur[2]
+
+    def _consume(self):
+        """السؤال الحالي استُهلك (أُجيب أو رُفض كمكرر): يتقدّم مؤشر نوعه إن كان محدوداً."""
+        kind, _ = self._draw()
+        size = KINDS[self.cat].get(kind, (None,))[0]
+        if size is not None:
+            self.cursors[kind] = self.cursors.get(kind, 0) + 1
+
+    def current(self) -> Optional[Question]:
+        if self.idx >= self.total:
+            return None
+        return self._draw()[1]
+
+    def reroll(self):
+        """استبدال السؤال الحالي بآخر (مثلاً لأنه تكرّر)."""
+        self._consume()
+        self.attempt += 1
 
     def check(self, choice: int) -> Dict[str, Any]:
         q = self.current()
         if not q:
             return {"done": True}
-        ok = (choice == q["answer_index"])
+        ok = (choice == q.answer_index)
         if ok:
             self.correct += 1
+        self._consume()
         self.idx += 1
-        return {"ok": ok, "answer_index": q["answer_index"], "explain": q.get("explain")}
+        self.attempt = 0
+        return {"ok": ok, "answer_index": q.answer_index, "explain": q.explain, "question": q}
 
 def fmt_progress(i: int, total: int) -> str:
     blocks = 10
     fill = int((i / total) * blocks)
     return "■" * fill + "□" * (blocks - fill) + f" {i}/{total}"
 
-def q_text(q: Dict[str, Any], idx: int, total: int, label: str) -> Tuple[str, InlineKeyboardMarkup]:
+def q_text(q: Question, idx: int, total: int, label: str) -> Tuple[str, InlineKeyboardMarkup]:
     letters = ["أ", "ب", "ج", "د", "هـ", "و", "ز", "ح"]
-    opts = q["options"]
+    opts = q.options
     kb = [[InlineKeyboardButton(f"{letters[i]}) {opts[i]}", callback_data=f"ans|{i}")]
           for i in range(len(opts))]
-    text = f"🧠 {label}\nالسؤال {idx + 1} من {total}\n{fmt_progress(idx, total)}\n\n{q['question']}"
+    text = f"🧠 {label}\nالسؤال {idx + 1} من {total}\n{fmt_progress(idx, total)}\n\n{q.question}"
     return text, InlineKeyboardMarkup(kb)
 
+SESSION_LIMITS = {"quant": 500, "verbal": 500, "iq": 300}
+
 def session_get(context: ContextTypes.DEFAULT_TYPE, cat: str) -> QuizSession:
     store = context.user_data.setdefault("sessions", {})
     s = store.get(cat)
     if s and isinstance(s, QuizSession):
         return s
-    limit = 500 if cat in ("quant", "verbal") else 300
-    gen = gen_quant if cat == "quant" else gen_verbal if cat == "verbal" else gen_iq
-    s = QuizSession(gen, limit)
+    s = QuizSession(cat, SESSION_LIMITS.get(cat, 300))
     store[cat] = s
     return s
 
-async def send_next(update: Update, context: ContextTypes.DEFAULT_TYPE, cat: str, label: str):
-    s = session_get(context, cat)
-    for _ in range(6):
+def next_unseen(s: QuizSession, seen: RecentSet, tries: int = 6) -> Tuple[int, bool]:
+    """يعيد توليد السؤال الحالي ما دام مكرراً (حتى tries مرة) ⇒ (عدد التكرارات، نفدت المحاولات؟)."""
+    collisions = 0
+    for _ in range(tries):
         q = s.current()
-        if not q: break
-        fingerprint = q["question"]
-        if not seen_has(context, cat, fingerprint):
-            seen_push(context, cat, fingerprint); break
-        s.items[s.idx] = s.gen()
+        if not q or seen.add(q.fp):
+            return collisions, False
+        collisions += 1
+        s.reroll()
+    return collisions, True
+
+def next_view(context: ContextTypes.DEFAULT_TYPE, cat: str, label: str) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """نص السؤال التالي وأزراره، أو (نص النتيجة النهائية، None) إن انتهت الجلسة."""
+    s = session_get(context, cat)
+    collisions, exhausted = next_unseen(s, seen_get(context, cat))
+    if s.current():
+        dedup.record(cat, collisions, exhausted)
     q = s.current()
     if not q:
-        await update.effective_message.reply_text(
-            f"انتهى الاختبار ✅\nالنتيجة: {s.correct}/{s.total}",
-            reply_markup=ReplyKeyboardMarkup(MAIN_BTNS, resize_keyboard=True)
-        )
         context.user_data["sessions"].pop(cat, None)
-        return
-    txt, kb = q_text(q, s.idx, s.total, label)
+        return f"انتهى الاختبار ✅\nالنتيجة: {s.correct}/{s.total}", None
     context.user_data["last_cat"] = cat
-    await update.effective_message.reply_text(txt, reply_markup=kb)
+    return q_text(q, s.idx, s.total, label)
+
+async def send_next(update: Update, context: ContextTypes.DEFAULT_TYPE, cat: str, label: str):
+    txt, kb = next_view(context, cat, label)
+    await update.effective_message.reply_text(
+        txt, reply_markup=kb or ReplyKeyboardMarkup(MAIN_BTNS, resize_keyboard=True))
 
 # ======================================================
 #                     واجهة الاستخدام
@@ -403,14 +292,15 @@ async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "/start أو /welcome — عرض الترحيب والقائمة\n"
         "/quant — كمي\n/verbal — لفظي\n/iq — ذكاء\n/table — جدول ضرب\n"
-        "/ask_ai — سؤال حر (أو زر: اسأل محمد مشرف)\n\n"
+        "/ask_ai — سؤال حر (أو زر: اسأل محمد مشرف)\n/ai_reset — مسح ذاكرة المحادثة\n\n"
         "أوضاع جاهزة:\n"
         "/mode_quick — وضع اختبار سريع (مختصر)\n"
         "/mode_explain — وضع شرح وتدريب (تفصيلي)\n\n"
         "تحكم الذكاء:\n"
         "/ai_prefs — عرض الإعدادات\n/ai_model — تغيير الموديل\n"
-        "/ai_temp — تغيير الحرارة\n/ai_style — concise|detailed\n/ai_diag — فحص الاتصال\n"
-        "/ei_on — تشغيل التعاطف\n/ei_off — إيقاف التعاطف"
+        "/ai_temp — تغيير الحرارة\n/ai_style — concise|detailed\n/ai_stream — on|off بث تدريجي\n/ai_diag — فحص الاتصال\n/stats — إحصاءات التشغيل\n"
+        "/ei_on — تشغيل التعاطف\n/ei_off — إيقاف التعاطف\n"
+        "/inplace_on — الاختبار في رسالة واحدة تُعدَّل\n/inplace_off — رسالة جديدة لكل سؤال"
     )
 
 # ====== جدول الضرب ======
@@ -431,7 +321,79 @@ def clean_number_only(text: str) -> Optional[int]:
     m = re.fullmatch(r"(-?\d+)", t)
     return int(m.group(1)) if m else None
 
+# ====== الذكاء الاصطناعي — الإرسال ======
+async def _reply_chunks(update: Update, answer: str):
+    with outbound.priority(outbound.BULK):  # لا تسبق أجزاءُ AI الطويلة ردودَ الاختبارات
+        for i in range(0, len(answer), 4000):
+            await update.message.reply_text(answer[i:i + 4000])
+
+# ====== الذكاء الاصطناعي — البث التدريجي ======
+STREAM_CURSOR = " ▌"
+
+async def _edit_stream_msg(msg, text: str) -> float:
+    """يعدّل رسالة البث؛ يعيد مهلة الانتظار المطلوبة من تلغرام (0 إن نجح)."""
+    try:
+        await msg.edit_text(text)
+    except RetryAfter as e:
+        return float(e.retry_after)
+    except BadRequest as e:
+        if "not modified" not in str(e):
+            raise
+    return 0.0
+
+async def _reply_streaming(update: Update, deltas) -> str:
+    """يرسل رسالة عند أول قطعة ثم يعدّلها على دفعات بحسب حدود تلغرام للتعديل."""
+    loop = asyncio.get_running_loop()
+    private = update.effective_chat is None or update.effective_chat.type == "private"
+    interval = AI_STREAM_EDIT_PRIVATE if private else AI_STREAM_EDIT_GROUP
+    msg = None
+    buf = ""      # الإجابة كاملة حتى الآن
+    offset = 0    # بداية جزء الرسالة الحالية داخل buf (كل رسالة ≤ 4000 حرف)
+    shown = ""    # آخر نص ظاهر في الرسالة الحالية
+    next_edit = 0.0
+
+    async with aclosing(deltas):
+        async for d in deltas:
+            buf += d
+            if msg is None:
+                if not buf.strip():
+                    continue
+                shown = buf[offset:offset + 4000]
+                msg = await update.message.reply_text(shown + STREAM_CURSOR)
+                next_edit = loop.time() + interval
+                continue
+            # تجاوزنا حد الرسالة: ثبّت الحالية وابدأ رسالة جديدة
+            while len(buf) - offset > 4000:
+                full = buf[offset:offset + 4000]
+                if full != shown:
+                    await _edit_stream_msg(msg, full)
+                offset += 4000
+                shown = buf[offset:offset + 4000]
+                msg = await update.message.reply_text(shown + STREAM_CURSOR)
+                next_edit = loop.time() + interval
+            if loop.time() >= next_edit and buf[offset:] != shown:
+                shown = buf[offset:]
+                wait = await _edit_stream_msg(msg, shown + STREAM_CURSOR)
+                next_edit = loop.time() + max(interval, wait)
+
+    if msg is not None:
+        final = buf[offset:].strip() or "…"
+        wait = await _edit_stream_msg(msg, final)
+        if wait:
+            await asyncio.sleep(wait)
+            await _edit_stream_msg(msg, final)
+    return buf.strip()
+
 # ====== الذكاء الاصطناعي — اللب ======
+AI_FLIGHTS = SingleFlight()
+
+async def _summarize_memory(old_summary: str, turns: List[List[str]]) -> str:
+    return await ai_client.chat(
+        ai_memory.summary_prompt(old_summary, turns),
+        model=ai_router.AI_FAST_MODEL or AI_MODEL, temperature=0.2,
+        max_tokens=ai_memory.AI_MEMORY_SUMMARY_TOKENS,
+    )
+
 async def _ask_ai_core(update: Update, context: ContextTypes.DEFAULT_TYPE, q: Optional[str]):
     if not q:
         await update.message.reply_text("اكتب سؤالك بعد الأمر:\n/ask_ai كيف أذاكر القدرات؟")
@@ -444,32 +406,90 @@ async def _ask_ai_core(update: Update, context: ContextTypes.DEFAULT_TYPE, q: Op
     ei_enabled = get_ei(context)
     system_msg = ai_system_prompt(prefs["style"], ei_enabled)
 
+    if not ai_client.available():
+        await update.message.reply_text("❌ مكتبة openai غير مثبتة. أضف إلى requirements.txt:\nopenai>=1.35.0")
+        return
+
+    # ذاكرة المحادثة تُرسل دائماً؛ الكاش ودمج الطلبات فقط لسؤال بلا ذاكرة أو مستقل بوضوح
+    # (ويُجاب حينها بلا سجل حتى تصلح إجابته لغيره)
+    mem = ai_memory.get_memory(context.user_data)
+    shared = ai_memory.is_empty(mem) or ai_memory.is_self_contained(q)
+
+    # الأسئلة المتكررة تُجاب من الكاش بلا نداء LLM (ولا تُسجَّل دوراً في الذاكرة)
+    key = ai_cache.cache_key(q, prefs["model"], prefs["style"], ei_enabled)
+    cached = await ai_cache.answers.get(key) if shared else None
+    if cached:
+        await _reply_chunks(update, cached)
+        return
+
+    async def _on_queued(position: int):
+        await update.message.reply_text(f"⏳ الخدمة مزدحمة الآن — ترتيبك في الانتظار: {position}")
+
     try:
+        # الانضمام لنداء جارٍ مجاني؛ نداء جديد يُحسب من معدّل المستخدم
+        joining = shared and AI_FLIGHTS.in_flight(key)
+        if not joining:
+            ai_governor.GOVERNOR.check_user(update.effective_user.id if update.effective_user else update.effective_chat.id)
         await update.effective_chat.send_action(ChatAction.TYPING)
-        try:
-            from openai import OpenAI
-        except ModuleNotFoundError:
-            await update.message.reply_text("❌ مكتبة openai غير مثبتة. أضف إلى requirements.txt:\nopenai>=1.35.0")
-            return
-
-        client = OpenAI(api_key=AI_API_KEY, base_url=AI_BASE_URL) if AI_BASE_URL else OpenAI(api_key=AI_API_KEY)
-
-        def _call():
-            return client.chat.completions.create(
-                model=prefs["model"],
-                temperature=prefs["temperature"],
-                max_tokens=AI_MAX_TOKENS,
-                messages=[
-                    {"role": "system", "content": system_msg},
-                    {"role": "user", "content": q}
-                ],
-            )
-
-        resp = await asyncio.wait_for(asyncio.to_thread(_call), timeout=25)
-        answer = (resp.choices[0].message.content or "").strip() or "لم أستطع توليد إجابة الآن."
-        for i in range(0, len(answer), 4000):
-            await update.message.reply_text(answer[i:i + 4000])
-
+        messages = ai_memory.build_messages(mem, system_msg, q, with_history=not shared)
+        model = ai_router.choose_model(q, prefs["model"])
+        led = False  # القرار الفعلي قائد/منضم يحدث داخل do() لا عند فحص in_flight أعلاه
+        # طلبات متطابقة متزامنة (سؤال معلّم يُعاد توجيهه في مجموعة) تتشارك نداءً واحداً
+        if prefs["stream"] and not joining:
+            async def _lead_stream():
+                nonlocal led
+                led = True
+                deltas = ai_router.stream_chat(
+                    messages, model=model, temperature=prefs["temperature"], max_tokens=AI_MAX_TOKENS,
+                    on_queued=_on_queued,
+                )
+                with outbound.priority(outbound.BULK):
+                    answer = await _reply_streaming(update, deltas)
+                if shared:
+                    await ai_cache.answers.put(key, answer)
+                return answer
+
+            answer = await (AI_FLIGHTS.do(key, _lead_stream) if shared else _lead_stream())
+            if not led:
+                # بدأ طلب مطابق بثّه أثناء send_action فانضممنا إليه: لم يُرسل لنا شيء بعد
+                await _reply_chunks(update, answer or "لم أستطع توليد إجابة الآن.")
+                if not answer:
+                    return
+            elif not answer:
+                await update.message.reply_text("لم أستطع توليد إجابة الآن.")
+                return
+        else:
+            async def _fetch():
+                nonlocal led
+                led = True
+                answer = await ai_router.chat(
+                    messages, model=model, temperature=prefs["temperature"], max_tokens=AI_MAX_TOKENS,
+                    on_queued=_on_queued,
+                )
+                if shared:
+                    await ai_cache.answers.put(key, answer)
+                return answer
+
+            if shared:
+                answer = await AI_FLIGHTS.do(key, _fetch, timeout=ai_client.AI_TIMEOUT)
+            else:
+                answer = await _fetch()
+            await _reply_chunks(update, answer or "لم أستطع توليد إجابة الآن.")
+            if not answer:
+                return
+
+        # الإجابة المشتركة من نداء طلب آخر لا تُسجَّل؛ الذاكرة لما أجاب عنه نداؤنا فقط
+        if led:
+            ai_memory.record(mem, q, answer)
+            if ai_memory.needs_compaction(mem):
+                context.application.create_task(ai_memory.compact(mem, _summarize_memory))
+
+    except ai_governor.UserRateLimited as e:
+        await update.message.reply_text(f"⏳ أرسلت أسئلة كثيرة بسرعة. انتظر {math.ceil(e.retry_after)} ث ثم أعد المحاولة.")
+    except ai_governor.QueueFull:
+        await update.message.reply_text("🚦 الخدمة مزدحمة جداً الآن. أعد المحاولة بعد قليل.")
+    except ai_governor.CircuitOpen as e:
+        await update.message.reply_text(f"🛠️ خدمة الذكاء متعطّلة مؤقتاً. حاول بعد {max(1, math.ceil(e.retry_after))} ث.")
     except asyncio.TimeoutError:
         await update.message.reply_text("⏱️ انتهت المهلة. جرّب سؤالاً أقصر أو أعد المحاولة.")
     except Exception as e:
@@ -588,6 +608,14 @@ async def cmd_ei_off(update: Update, context: ContextTypes.DEFAULT_TYPE):
     set_ei(context, False)
     await update.message.reply_text("تم إيقاف الذكاء العاطفي ⛔️")
 
+async def cmd_inplace_on(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    quizview.set_inplace(context, True)
+    await update.message.reply_text("تم تفعيل عرض الاختبار في رسالة واحدة ✅")
+
+async def cmd_inplace_off(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    quizview.set_inplace(context, False)
+    await update.message.reply_text("كل سؤال سيصل في رسالة جديدة ⛔️")
+
 # ====== استلام الإجابة من الأزرار ======
 async def cb_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -618,10 +646,59 @@ async def cb_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if get_ei(context):
             msg += "\n" + ei_msg_wrong(res.get("explain"))
 
-    await query.edit_message_text(msg)
+    kb = None
+    if not res["ok"] and AI_EXPLAIN_ENABLED and AI_API_KEY and ai_client.available():
+        kb = explain_button(context, res["question"])
     label = "قدرات كمي" if cat == "quant" else "قدرات لفظي" if cat == "verbal" else "أسئلة الذكاء"
+    if quizview.inplace(context):
+        # النتيجة + السؤال التالي في تعديل واحد (زر الشرح تحت خيارات السؤال الجديد)
+        txt, next_kb = next_view(context, cat, label)
+        await quizview.show(query, msg, txt, next_kb, kb)
+        return
+    await query.edit_message_text(msg, reply_markup=kb)
     await send_next(update, context, cat, label)
 
+# ====== «اشرح أكثر» بالذكاء الاصطناعي ======
+EXPLAIN_KEEP = 5  # آخر أسئلة خاطئة نحتفظ بها لزر الشرح
+
+def explain_button(context: ContextTypes.DEFAULT_TYPE, q: Question) -> InlineKeyboardMarkup:
+    store: Dict[str, Question] = context.user_data.setdefault("explain_q", {})
+    n = context.user_data.get("explain_n", 0) + 1
+    context.user_data["explain_n"] = n
+    store[str(n)] = q
+    while len(store) > EXPLAIN_KEEP:
+        store.pop(next(iter(store)))
+    return InlineKeyboardMarkup([[InlineKeyboardButton("💡 اشرح أكثر", callback_data=f"explain|{n}")]])
+
+async def cb_explain(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    token = (query.data or "").split("|", 1)[-1]
+    item = context.user_data.get("explain_q", {}).get(token)
+    if not item:
+        await query.answer("انتهت صلاحية هذا السؤال.")
+        return
+    await query.answer("⏳ جارٍ تجهيز الشرح…")
+    try:
+        # في وضع التعديل في المكان الرسالة تحمل السؤال التالي: نحذف زر الشرح فقط
+        await query.edit_message_reply_markup(quizview.without_prefix(query.message.reply_markup, "explain|"))
+    except BadRequest:
+        pass
+    user_id = update.effective_user.id if update.effective_user else update.effective_chat.id
+    try:
+        text = await ai_explain.explain(
+            item,
+            on_miss=lambda: ai_governor.GOVERNOR.check_user(user_id),
+        )
+    except ai_governor.UserRateLimited as e:
+        await query.message.reply_text(f"⏳ طلبات كثيرة بسرعة. انتظر {math.ceil(e.retry_after)} ث.")
+        return
+    except Exception as e:
+        log.warning("explain failed: %s", e)
+        await query.message.reply_text("تعذّر تجهيز الشرح الآن. حاول لاحقًا.")
+        return
+    context.user_data.get("explain_q", {}).pop(token, None)
+    await query.message.reply_text(f"💡 شرح مفصّل:\n{item.question}\n\n{text}"[:4096])
+
 # ====== ذكاء اصطناعي: أمر /ask_ai ======
 async def ask_ai(update: Update, context: ContextTypes.DEFAULT_TYPE):
     txt = (update.message.text or "")
@@ -667,6 +744,19 @@ async def cmd_ai_model(update: Update, context: ContextTypes.DEFAULT_TYPE):
     prefs["model"] = args[1].strip()
     await update.message.reply_text(f"تم ضبط الموديل على: {prefs['model']}")
 
+async def cmd_ai_stream(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    args = (update.message.text or "").split()
+    if len(args) < 2 or args[1] not in ("on", "off"):
+        await update.message.reply_text("استخدم: /ai_stream on أو /ai_stream off")
+        return
+    prefs = get_ai_prefs(context)
+    prefs["stream"] = args[1] == "on"
+    await update.message.reply_text(f"البث التدريجي للإجابات: {'مفعّل' if prefs['stream'] else 'متوقف'}")
+
+async def cmd_ai_reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    ai_memory.reset(context.user_data)
+    await update.message.reply_text("🧹 تم مسح ذاكرة المحادثة. السؤال التالي يبدأ من جديد.")
+
 async def cmd_ai_prefs(update: Update, context: ContextTypes.DEFAULT_TYPE):
     prefs = get_ai_prefs(context)
     await update.message.reply_text(
@@ -675,13 +765,12 @@ async def cmd_ai_prefs(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"- الحرارة: {prefs['temperature']}\n"
         f"- الأسلوب: {prefs['style']} (concise|detailed)\n"
         f"- الذكاء العاطفي: {'مفعّل' if get_ei(context) else 'متوقف'}\n"
+        f"- البث التدريجي: {'مفعّل' if prefs['stream'] else 'متوقف'} (/ai_stream on|off)\n"
         f"- AI_BASE_URL: {AI_BASE_URL or 'افتراضي OpenAI'}"
     )
 
 async def cmd_ai_diag(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    try:
-        from openai import OpenAI
-    except ModuleNotFoundError:
+    if not ai_client.available():
         await update.message.reply_text("❌ مكتبة openai غير مثبتة. أضف إلى requirements.txt:\nopenai>=1.35.0")
         return
     if not AI_API_KEY:
@@ -689,20 +778,67 @@ async def cmd_ai_diag(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     prefs = get_ai_prefs(context)
     try:
-        client = OpenAI(api_key=AI_API_KEY, base_url=AI_BASE_URL) if AI_BASE_URL else OpenAI(api_key=AI_API_KEY)
-        def _call():
-            return client.chat.completions.create(
-                model=prefs["model"], temperature=0.0, max_tokens=20,
-                messages=[{"role": "user", "content": "أجب بكلمة واحدة: نعم"}],
-            )
-        r = await asyncio.wait_for(asyncio.to_thread(_call), timeout=15)
-        txt = (r.choices[0].message.content or "").strip()
+        txt = await ai_client.chat(
+            [{"role": "user", "content": "أجب بكلمة واحدة: نعم"}],
+            model=prefs["model"], temperature=0.0, max_tokens=20, timeout=15,
+        )
         await update.message.reply_text(f"✅ الاتصال ناجح. ردّ النموذج: {txt}")
     except Exception as e:
         await update.message.reply_text(
             f"❌ فشل الاتصال:\n{e}\nتحقّق من AI_BASE_URL/AI_API_KEY/AI_MODEL وإصدار مكتبة openai."
         )
 
+# ====== إحصاءات التشغيل ======
+async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    c = ai_cache.answers.stats()
+    f = AI_FLIGHTS.stats()
+    g = ai_governor.GOVERNOR.stats()
+    r = ai_router.stats()
+    m = ai_memory.stats()
+    x = ai_explain.stats()
+    sw = sweeper.SWEEPER.stats()
+    wr = webhook_reply.REPLY.stats()
+    ob = outbound.SCHEDULER.stats()
+    up = chat_processor.PROCESSOR.stats()
+    ms = lambda v: f"{v:.1f}ث" if v is not None else "—"
+    await update.message.reply_text(
+        "📊 إحصاءات التشغيل:\n"
+        f"- كاش الإجابات: {c['size']} عنصر • إصابات {c['hits']} (+{c['disk_hits']} من القرص) "
+        f"• إخفاقات {c['misses']} • نسبة الإصابة {c['hit_rate']:.0%}\n"
+        f"- دمج الطلبات المتطابقة: نداءات {f['leaders']} • مشتركة {f['shared']} • جارية {f['in_flight']}\n"
+        f"- نداءات LLM: نشطة {g['active']} • منتظرة {g['queued']} (الذروة {g['peak_queue']}) "
+        f"• محاولات {g['calls']} • إعادات {g['retries']} • القاطع {g['breaker']}\n"
+        f"- مرفوضة: معدّل المستخدم {g['rejected']['user']} • طابور {g['rejected']['queue']} • قاطع {g['rejected']['breaker']}\n"
+        f"- التوجيه: سريع {r['fast']} • أساسي {r['primary']} • احتياطي {r['hedged']} (فاز {r['hedge_wins']}) "
+        f"• زمن p50 {ms(r['p50'])} • p95 {ms(r['p95'])} • ميزانية الاحتياط {ms(r['hedge_after'])} "
+        f"• أول قطعة p50 {ms(r['ttft_p50'])} • p95 {ms(r['ttft_p95'])} • ميزانية البث {ms(r['stream_hedge_after'])}\n"
+        f"- ذاكرة المحادثة: متوسط رموز الطلب {m['avg_prompt_tokens']:.0f} على {m['calls']} نداء "
+        f"• ضغط {m['compactions']} • احتياطي {m['fallbacks']} • بسياق {m['contextual']} • انتهت بالخمول {m['expired']}\n"
+        f"- «اشرح أكثر»: دفعات {x['batches']} لـ {x['items']} سؤال • من الكاش {x['hits']} "
+        f"• جاهزة مسبقاً {x['pregen_hits']} من {x['pregen']}\n"
+        f"- الجلسات: مستخدمون {sw['users']} • جلسات حية {sw['live_sessions']} "
+        f"• الحجم {sw['bytes'] / 2**20:.1f} من {sw['budget'] / 2**20:.0f} م.ب "
+        f"• أُخليت (خمول {sw['evicted_ttl']} • ميزانية {sw['evicted_budget']}) • نُقلت للتخزين {sw['spilled']}\n"
+        f"- ردود الأزرار داخل الـ webhook: {wr['inline']} • عبر الشبكة {wr['fallback']} "
+        f"• النسبة {wr['inline_rate']:.0%}\n"
+        f"- الإرسال: في الطابور {ob['queued']} (الذروة {ob['peak_depth']}) • فوري {ob['immediate']} "
+        f"• مدموج {ob['coalesced']} • RetryAfter {ob['retry_after']} "
+        f"• انتظار p95 اختبار {ms(ob['wait']['quiz']['p95'])} / عادي {ms(ob['wait']['normal']['p95'])} "
+        f"/ AI {ms(ob['wait']['bulk']['p95'])}\n"
+        f"- التحديثات: قيد المعالجة {up['active']}/{up['concurrency']} (الذروة {up['peak_active']}) "
+        f"• محادثات معلّقة {up['chats']} • أطول طابور محادثة {up['max_chat_queue']} (الذروة {up['peak_chat_queue']}) "
+        f"• مُسقطة {up['shed']} • انتظار p95 {ms(up['wait_p95'])}"
+        + "".join(
+            f"\n- مخزن «{name}»: جاهز {p['ready']} • سُحب {p['served']} • فارغ {p['misses']} • دفعات {p['refills']}"
+            for name, p in qpool.stats().items()
+        )
+        + "".join(
+            f"\n- تكرار «{cat}»: أُرسل {d['served']} • أُعيد توليد {d['regen_rate']:.0%} "
+            f"• مكرر بعد نفاد المحاولات {d['exhausted_rate']:.1%}"
+            for cat, d in dedup.stats().items()
+        )
+    )
+
 # ====== مُعالج أخطاء عام ======
 async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE):
     log.exception("Exception in handler", exc_info=context.error)
@@ -713,8 +849,41 @@ async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE):
         pass
 
 # ================= تشغيل (Webhook فقط) =================
-def build() -> Application:
-    app = Application.builder().token(BOT_TOKEN).build()
+async def _post_init(app: Application):
+    sweeper.SWEEPER.start()
+
+async def _post_shutdown(app: Application):
+    await sweeper.SWEEPER.stop()
+    await qpool.stop()
+    await ai_client.aclose()
+
+def build(request=None) -> Application:
+    """request: ناقل تلغرام بديل (BaseRequest) — يستخدمه bench_ai.py بلا شبكة."""
+    builder = Application.builder().token(BOT_TOKEN).post_init(_post_init).post_shutdown(_post_shutdown)
+    if webhook_reply.WEBHOOK_INLINE_REPLY:
+        # answerCallbackQuery يُعاد في استجابة الـ webhook بدل رحلة شبكة مستقلة
+        inner = request if request is not None else HTTPXRequest(connection_pool_size=256)
+        builder = builder.request(webhook_reply.InlineReplyRequest(inner))
+        if request is not None:
+            builder = builder.get_updates_request(request)
+    elif request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    if PERSIST_DB:
+        warn_if_ephemeral(PERSIST_DB)
+        builder = builder.persistence(SQLitePersistence(PERSIST_DB))
+    if outbound.OUTBOUND_SCHEDULER:
+        builder = builder.rate_limiter(outbound.SCHEDULER)
+    if chat_processor.UPDATE_CONCURRENCY > 1:
+        # محادثات مختلفة بالتوازي، وتحديثات المحادثة الواحدة بالترتيب (حالة الاختبار في user_data)
+        builder = builder.concurrent_updates(chat_processor.PROCESSOR)
+    app = builder.build()
+    n = ai_explain.load_pregenerated()
+    if n:
+        log.info("Loaded %d pre-generated explanations", n)
+    # ختم نشاط المستخدم قبل كل المعالجات (إخلاء الجلسات الخاملة)
+    sweeper.SWEEPER.install(app)
+    if webhook_reply.WEBHOOK_INLINE_REPLY:
+        webhook_reply.REPLY.install(app)
     # ترحيب
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("welcome", start))
@@ -731,16 +900,23 @@ def build() -> Application:
     # تحكّم EI
     app.add_handler(CommandHandler("ei_on", cmd_ei_on))
     app.add_handler(CommandHandler("ei_off", cmd_ei_off))
+    # عرض الاختبار: رسالة واحدة تُعدَّل أو رسالة لكل سؤال
+    app.add_handler(CommandHandler("inplace_on", cmd_inplace_on))
+    app.add_handler(CommandHandler("inplace_off", cmd_inplace_off))
     # سؤال حر
     app.add_handler(CommandHandler("ask_ai", ask_ai))
+    app.add_handler(CommandHandler("ai_reset", cmd_ai_reset))
     # تحكم وتشخيص AI
     app.add_handler(CommandHandler("ai_style", cmd_ai_style))
     app.add_handler(CommandHandler("ai_temp", cmd_ai_temp))
     app.add_handler(CommandHandler("ai_model", cmd_ai_model))
+    app.add_handler(CommandHandler("ai_stream", cmd_ai_stream))
     app.add_handler(CommandHandler("ai_prefs", cmd_ai_prefs))
     app.add_handler(CommandHandler("ai_diag", cmd_ai_diag))
+    app.add_handler(CommandHandler("stats", cmd_stats))
     # أزرار الإجابات
     app.add_handler(CallbackQueryHandler(cb_answer, pattern=r"^ans\|"))
+    app.add_handler(CallbackQueryHandler(cb_explain, pattern=r"^explain\|"))
     # رسائل نصية عامة
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
     # لاقط أخطاء
@@ -750,6 +926,16 @@ def build() -> Application:
 def main():
     app = build()
     log.info("Webhook on %s", WEBHOOK_URL)
+    if webhook_reply.WEBHOOK_INLINE_REPLY:
+        asyncio.run(webhook_reply.serve(
+            app,
+            listen="0.0.0.0",
+            port=PORT,
+            url_path=BOT_TOKEN,
+            webhook_url=f"{WEBHOOK_URL}/{BOT_TOKEN}",
+            drop_pending_updates=True,
+        ))
+        return
     app.run_webhook(
         listen="0.0.0.0",
         port=PORT,
@@ -1,31 +1,22 @@
 # ask_qiyas_ai.py
-# — يعمل بدون tenacity — يستخدم إعادة محاولة بسيطة
+# — يعمل بدون tenacity — إعادة المحاولة والتراجع عبر ai_governor
 
 import os
+import math
 import logging
-import asyncio
-from typing import Optional
 
 from telegram import Update
 from telegram.ext import ContextTypes
-from openai import OpenAI
+
+import ai_client
+import ai_governor
+import ai_router
 
 # ===== الإعدادات من المتغيرات البيئية =====
 AI_API_KEY = os.getenv("AI_API_KEY")
 AI_MODEL   = os.getenv("AI_MODEL", "gpt-4o-mini")
 
 logger = logging.getLogger(__name__)
-_client: Optional[OpenAI] = None
-
-
-def _get_client() -> Optional[OpenAI]:
-    """تهيئة عميل OpenAI مرة واحدة."""
-    global _client
-    if not AI_API_KEY:
-        return None
-    if _client is None:
-        _client = OpenAI(api_key=AI_API_KEY)
-    return _client
 
 
 async def ask_qiyas_ai_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -52,11 +43,16 @@ async def ask_qiyas_ai_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         return
 
     try:
+        ai_governor.GOVERNOR.check_user(update.effective_user.id if update.effective_user else update.effective_chat.id)
         answer = await _ask_llm(question)
         if not answer:
             answer = "لم أستطع توليد إجابة الآن. حاول لاحقًا."
         # حد التلغرام 4096 حرف للرسالة الواحدة
         await update.effective_message.reply_text(answer[:4096])
+    except ai_governor.UserRateLimited as e:
+        await update.effective_message.reply_text(f"⏳ أسئلة كثيرة بسرعة. انتظر {math.ceil(e.retry_after)} ث.")
+    except ai_governor.GovernorError:
+        await update.effective_message.reply_text("🚦 الخدمة مزدحمة أو متوقفة مؤقتاً. حاول لاحقًا.")
     except Exception as e:
         logger.exception("ask_ai error: %s", e)
         await update.effective_message.reply_text("حدث خطأ أثناء الإجابة. حاول لاحقًا.")
@@ -64,37 +60,22 @@ async def ask_qiyas_ai_handler(update: Update, context: ContextTypes.DEFAULT_TYP
 
 async def _ask_llm(prompt: str) -> str:
     """
-    نداء LLM مع محاولات بسيطة (3 محاولات بتأخيرات 0s/1.5s/3s).
+    نداء LLM عبر طبقة القبول (سقف عام + تراجع عشوائي يحترم Retry-After + قاطع دائرة)،
+    مع توجيه الأسئلة القصيرة للموديل السريع وطلب احتياطي عند تأخر الأساسي.
     """
-    client = _get_client()
-    if not client:
+    if not AI_API_KEY or not ai_client.available():
         return "المفتاح غير مهيأ."
 
-    delays = [0.0, 1.5, 3.0]
-    last_err: Optional[Exception] = None
-
-    for delay in delays:
-        if delay:
-            await asyncio.sleep(delay)
-        try:
-            resp = client.chat.completions.create(
-                model=AI_MODEL,
-                temperature=0.3,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "أنت مساعد قياس ذكي بالعربية: موجز، دقيق، ويشرح الخطوات عند الحاجة."
-                        ),
-                    },
-                    {"role": "user", "content": prompt.strip()},
-                ],
-            )
-            content = (resp.choices[0].message.content or "").strip()
-            return content
-        except Exception as e:
-            last_err = e
-            logger.warning("LLM call failed (will retry): %s", e)
-
-    # إذا فشلت كل المحاولات
-    raise last_err if last_err else RuntimeError("LLM call failed")
+    return await ai_router.chat(
+        [
+            {
+                "role": "system",
+                "content": (
+                    "أنت مساعد قياس ذكي بالعربية: موجز، دقيق، ويشرح الخطوات عند الحاجة."
+                ),
+            },
+            {"role": "user", "content": prompt.strip()},
+        ],
+        model=ai_router.choose_model(prompt, AI_MODEL),
+        temperature=0.3,
+    )
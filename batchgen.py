@@ -0,0 +1,371 @@
+# batchgen.py — توليد الأسئلة على دفعات: generate(kind, n)
+# ----------------------------------------------------------
+# تُسحب معاملات n سؤالاً دفعة واحدة بـ NumPy (مصفوفات بدل نداءات random لكل سؤال)،
+# وتُبنى الخيارات بعمليات مصفوفات، ثم تُنسَّق النصوص في حلقة واحدة.
+# الصفوف النادرة التي تتكرر فيها الخيارات تمرّ على distractors.numeric_options.
+# بلا NumPy: نفس الواجهة عبر المولِّدات العادية سؤالاً سؤالاً.
+import random
+from typing import Callable, Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ModuleNotFoundError:  # اختياري: نرجع للتوليد الفردي
+    np = None
+
+import generators
+from distractors import numeric_options, offsets_for
+from question import Question
+
+
+def available() -> bool:
+    return np is not None
+
+
+# ===== أدوات مشتركة =====
+def _fmt(seq) -> str:
+    return ", ".join(map(str, seq))
+
+
+def _assemble(g, texts: List[str], correct, near, explains: Optional[Sequence[Optional[str]]] = None,
+              minval: Optional[int] = None, offsets: Optional[Sequence[int]] = None) -> List[Question]:
+    """يضع الإجابة في موضع عشوائي بين ثلاث مشتّتات (near: مصفوفة n×3)."""
+    n = len(texts)
+    correct = np.asarray(correct, dtype=np.int64)
+    near = np.asarray(near, dtype=np.int64).reshape(n, 3)
+    near = np.take_along_axis(near, np.argsort(g.random((n, 3)), axis=1), axis=1)
+    s = np.sort(near, axis=1)
+    bad = (s[:, 0] == s[:, 1]) | (s[:, 1] == s[:, 2]) | (near == correct[:, None]).any(axis=1)
+    if minval is not None:
+        bad |= (near < minval).any(axis=1)
+    pos = g.integers(0, 4, n)
+    col = np.arange(4)[None, :]
+    src = np.clip(col - (col > pos[:, None]), 0, 2)
+    mat = np.where(col == pos[:, None], correct[:, None], np.take_along_axis(near, src, axis=1))
+    rows = mat.tolist()
+    pos = pos.tolist()
+    if bad.any():
+        rng = random.Random(int(g.integers(1 << 62)))
+        vals = correct.tolist()
+        for i in np.flatnonzero(bad).tolist():
+            rows[i], pos[i] = numeric_options(vals[i], rng=rng, offsets=offsets, minval=minval)
+    if explains is None:
+        explains = [None] * n
+    return [Question(t, r, p, e) for t, r, p, e in zip(texts, rows, pos, explains)]
+
+
+def _offset_near(g, correct, offsets: Optional[Sequence[int]] = None):
+    """ثلاث إزاحات مختلفة لكل صف من جدول رتبته (أو offsets إن أُعطيت)."""
+    correct = np.asarray(correct, dtype=np.int64)
+    n = len(correct)
+    near = np.empty((n, 3), dtype=np.int64)
+    if offsets is not None:
+        groups = [(np.ones(n, dtype=bool), tuple(offsets))]
+    else:
+        bands = {}
+        for i, v in enumerate(correct.tolist()):
+            bands.setdefault(offsets_for(v), []).append(i)
+        groups = []
+        for table, idx in bands.items():
+            mask = np.zeros(n, dtype=bool)
+            mask[idx] = True
+            groups.append((mask, table))
+    for mask, table in groups:
+        m = int(mask.sum())
+        t = np.asarray(table, dtype=np.int64)
+        i = g.integers(0, len(t), m)
+        j = g.integers(0, len(t) - 1, m); j += j >= i
+        k = g.integers(0, len(t) - 2, m)
+        lo, hi = np.minimum(i, j), np.maximum(i, j)
+        k += k >= lo; k += k >= hi
+        near[mask] = correct[mask][:, None] + t[np.stack([i, j, k], axis=1)]
+    return near
+
+
+def _split(g, n: int, k: int):
+    """يوزّع n صفاً على k نوع بالتساوي عشوائياً: مصفوفة مؤشرات لكل نوع."""
+    which = g.integers(0, k, n)
+    return [np.flatnonzero(which == c) for c in range(k)]
+
+
+# ===== كمي (gen_quant) =====
+def _quant(g, n: int) -> List[Question]:
+    out: List[Question] = []
+    arith, linear, percent, pw, mix = _split(g, n, 5)
+
+    m = len(arith)
+    if m:
+        op = g.integers(0, 4, m)
+        a = g.integers(-20, 91, m); b = g.integers(-20, 91, m)
+        ma = g.integers(2, 21, m); mb = g.integers(2, 16, m)
+        db = g.integers(2, 13, m); dv = g.integers(2, 13, m)
+        jit = np.where(op == 0, g.choice([-3, -2, -1, 1, 2, 3], m), g.choice([-3, -1, 1, 3], m))
+        val = np.select([op == 0, op == 1, op == 2], [a + b, a - b, ma * mb], dv)
+        near = np.select(
+            [op[:, None] == 0, op[:, None] == 1, op[:, None] == 2],
+            [np.stack([val + jit, val + 10, val - 10], 1), np.stack([val + jit, val + 7, val - 7], 1),
+             np.stack([val + ma, val - mb, val + 10], 1)],
+            np.stack([val + 1, val - 1, val + 2], 1))
+        texts = []
+        for o, x, y, p, q, d, v in zip(op.tolist(), a.tolist(), b.tolist(), ma.tolist(), mb.tolist(), db.tolist(), dv.tolist()):
+            if o == 0:   texts.append(f"احسب: {x} + {y} = ؟")
+            elif o == 1: texts.append(f"احسب: {x} - {y} = ؟")
+            elif o == 2: texts.append(f"احسب: {p} × {q} = ؟")
+            else:        texts.append(f"احسب: {d * v} ÷ {d} = ؟")
+        out += _assemble(g, texts, val, near, ["عمليات حسابية أساسية."] * m)
+
+    m = len(linear)
+    if m:
+        a = g.integers(2, 10, m); x = g.integers(-10, 13, m); b = g.integers(-10, 13, m)
+        c = a * x + b
+        texts = [f"إذا كان {p}س + {q} = {r}، فما قيمة س؟" for p, q, r in zip(a.tolist(), b.tolist(), c.tolist())]
+        expl = [f"س = ( {r} - {q} ) ÷ {p} = {s}" for p, q, r, s in zip(a.tolist(), b.tolist(), c.tolist(), x.tolist())]
+        out += _assemble(g, texts, x, np.stack([x + 1, x - 1, x + 2], 1), expl)
+
+    m = len(percent)
+    if m:
+        x = g.choice([5, 10, 12, 15, 20, 25, 30, 40, 50], m); step = 100 // np.gcd(x, 100)
+        y = step * g.integers(-(-20 // step), 200 // step + 1)
+        val = y * x // 100
+        texts = [f"ما {p}% من {q} ؟" for p, q in zip(x.tolist(), y.tolist())]
+        expl = [f"{p}% × {q} = {v}" for p, q, v in zip(x.tolist(), y.tolist(), val.tolist())]
+        out += _assemble(g, texts, val, np.stack([val + 5, val - 5, val + 10], 1), expl)
+
+    m = len(pw)
+    if m:
+        base = g.integers(2, 16, m); exp = g.choice([2, 3], m); val = base ** exp
+        texts = [f"قيمة {p}^{e} = ؟" for p, e in zip(base.tolist(), exp.tolist())]
+        expl = [f"{p}^{e} = {v}" for p, e, v in zip(base.tolist(), exp.tolist(), val.tolist())]
+        out += _assemble(g, texts, val, np.stack([val + base, val - base, val + 2], 1), expl)
+
+    m = len(mix)
+    if m:
+        v = g.integers(30, 121, m); t = g.integers(1, 7, m); d = v * t
+        texts = [f"سيارة سرعتها {p} كم/س، سارت {q} ساعات. ما المسافة؟" for p, q in zip(v.tolist(), t.tolist())]
+        out += _assemble(g, texts, d, np.stack([d - 10, d + 10, d + v], 1), ["المسافة = السرعة × الزمن."] * m)
+    return out
+
+
+# ===== ذكاء (أنواع gen_iq) =====
+def _draw_dims(g, m: int, dims):
+    return [np.asarray(d, dtype=np.int64)[g.integers(0, len(d), m)] for d in dims]
+
+
+def _iq_arith_seq(g, m):
+    a, d = _draw_dims(g, m, generators.ARITH_SEQ)
+    seq = a[:, None] + np.arange(5)[None, :] * d[:, None]; ans = seq[:, -1] + d
+    texts = [f"أكمل المتتالية: {_fmt(s)}, ؟" for s in seq.tolist()]
+    return _assemble(g, texts, ans, np.stack([ans + d, ans - d, ans + 2], 1), [f"فرق ثابت = {x}" for x in d.tolist()])
+
+
+def _iq_geom_seq(g, m):
+    a, r = _draw_dims(g, m, generators.GEOM_SEQ)
+    seq = a[:, None] * r[:, None] ** np.arange(4)[None, :]; ans = seq[:, -1] * r
+    alt = np.where(ans % r == 0, ans // r, ans - 1)
+    texts = [f"أكمل: {_fmt(s)}, ؟" for s in seq.tolist()]
+    return _assemble(g, texts, ans, np.stack([ans * r, alt, ans + r], 1), [f"متضاعف بنسبة {x}" for x in r.tolist()])
+
+
+def _iq_alt_seq(g, m):
+    a, d1, d2 = _draw_dims(g, m, generators.ALT_SEQ)
+    seq = np.stack([a, a + d1, a + d1 + d2, a + 2 * d1 + d2, a + 2 * d1 + 2 * d2], 1)
+    ans = a + 3 * d1 + 2 * d2
+    texts = [f"نمط متناوب (+{p}, +{q}): {_fmt(s)}, ؟" for p, q, s in zip(d1.tolist(), d2.tolist(), seq.tolist())]
+    return _assemble(g, texts, ans, np.stack([ans + d1, ans + d2, ans - 1], 1), ["يزيد مرّة d1 ثم d2 بالتناوب."] * m)
+
+
+def _iq_letter_seq(g, m):
+    L = generators.AR_LETTERS
+    pick = g.integers(0, len(generators.LETTER_SEQ), m)
+    params = np.asarray(generators.LETTER_SEQ, dtype=np.int64)[pick]
+    step, start = params[:, 0], params[:, 1]
+    nxt = start + 5 * step
+    # ثلاثة حروف مختلفة ≠ التالي: ثلاث قرعات على 27 ثم تخطّي موضع nxt
+    n = len(L) - 1
+    i = g.integers(0, n, m); j = g.integers(0, n - 1, m); j += j >= i
+    k = g.integers(0, n - 2, m)
+    lo, hi = np.minimum(i, j), np.maximum(i, j); k += k >= lo; k += k >= hi
+    wrong = np.stack([i, j, k], 1); wrong += wrong >= nxt[:, None]
+    pos = g.integers(0, 4, m)
+    out = []
+    for st, sp, nx, w, p in zip(step.tolist(), start.tolist(), nxt.tolist(), wrong.tolist(), pos.tolist()):
+        opts = [L[x] for x in w]
+        opts.insert(p, L[nx])
+        seq = "، ".join(L[sp + t * st] for t in range(5))
+        out.append(Question(f"أكمل: {seq}, ؟", opts, p, f"زيادة ثابتة بالحروف بمقدار {st}."))
+    return out
+
+
+def _iq_squares(g, m):
+    (s,) = _draw_dims(g, m, generators.SQUARES)
+    seq = (s[:, None] + np.arange(4)[None, :]) ** 2; ans = (s + 4) ** 2
+    texts = [f"مربعات: {_fmt(x)}, ؟" for x in seq.tolist()]
+    return _assemble(g, texts, ans, np.stack([ans + (2 * s + 1), ans - (2 * s + 1), ans + 4], 1), ["أنماط n²."] * m)
+
+
+def _iq_fibo(g, m):
+    a, b = _draw_dims(g, m, generators.FIBO)
+    c = a + b; d = b + c; e = c + d; ans = d + e
+    seq = np.stack([a, b, c, d, e], 1)
+    texts = [f"فيبوناتشي: {_fmt(x)}, ؟" for x in seq.tolist()]
+    return _assemble(g, texts, ans, np.stack([ans + c, ans - 1, ans + 2], 1), ["كل حد = مجموع السابقين."] * m)
+
+
+def _iq_mix_ops(g, m):
+    a, b, x = _draw_dims(g, m, generators.MIX_OPS)
+    s1 = x + a; s2 = s1 * b; s3 = s2 + a; s4 = s3 * b; ans = s4 + a
+    seq = np.stack([x, s1, s2, s3, s4], 1)
+    texts = [f"نمط (+{p} ثم ×{q}): {_fmt(s)}, ؟" for p, q, s in zip(a.tolist(), b.tolist(), seq.tolist())]
+    expl = [f"يتناوب +{p} ثم ×{q}." for p, q in zip(a.tolist(), b.tolist())]
+    return _assemble(g, texts, ans, np.stack([ans + a, ans * b, ans - 1], 1), expl)
+
+
+IQ_BATCH = {
+    "arith_seq": _iq_arith_seq, "geom_seq": _iq_geom_seq, "alt_seq": _iq_alt_seq,
+    "letter_seq": _iq_letter_seq, "squares": _iq_squares, "fibo": _iq_fibo, "mix_ops": _iq_mix_ops,
+}
+
+
+def _iq(g, n: int) -> List[Question]:
+    out: List[Question] = []
+    for fn, rows in zip(IQ_BATCH.values(), _split(g, n, len(IQ_BATCH))):
+        if len(rows):
+            out += fn(g, len(rows))
+    return out
+
+
+# ===== qiyas_200 (GENERATORS) =====
+_DIVS = np.arange(2, 13) if np is not None else None
+_PERCENTS = (10, 12, 20, 25, 30, 33, 40, 50)  # = qiyas_200.PERCENTS (لا نستورد telegram هنا)
+
+
+def _pick_true(g, mask):
+    """لكل صف: عمود عشوائي منتظم من الخانات True (كل صف فيه واحدة على الأقل)."""
+    r = (g.random(len(mask)) * mask.sum(1)).astype(np.int64)
+    return np.argmax(mask.cumsum(1) > r[:, None], axis=1)
+
+
+def _q200_arith(g, m):
+    a = g.integers(2, 16, m); b = g.integers(2, 13, m); c = g.integers(1, 11, m)
+    kind = g.integers(0, 4, m)
+    c2 = g.integers(2, 13, m); a2 = g.integers(2, 13, m)
+    b2 = _pick_true(g, (a2 * c2)[:, None] % _DIVS == 0) + _DIVS[0]  # قاسم لـ a×c في 2..12
+    val = np.select([kind == 0, kind == 1, kind == 2], [(a + b) * c, a * b + c, a * b - c], (a2 * c2) // b2)
+    texts = []
+    for k, x, y, z, x2, y2, z2 in zip(kind.tolist(), a.tolist(), b.tolist(), c.tolist(), a2.tolist(), b2.tolist(), c2.tolist()):
+        if k == 0:   texts.append(f"كم يساوي ({x} + {y}) × {z}؟")
+        elif k == 1: texts.append(f"كم يساوي {x} × {y} + {z}؟")
+        elif k == 2: texts.append(f"كم يساوي {x} × {y} − {z}؟")
+        else:        texts.append(f"كم يساوي ({x2} × {z2}) ÷ {y2}؟")
+    return _assemble(g, texts, val, _offset_near(g, val))
+
+
+def _q200_percent(g, m):
+    base = g.choice([80, 100, 120, 160, 200, 240, 300, 400, 500, 800], m)
+    pct = np.asarray(_PERCENTS)
+    p = pct[_pick_true(g, (base[:, None] * pct) % 100 == 0)]
+    val = base * p // 100
+    texts = [f"كم يساوي {x}% من {y}؟" for x, y in zip(p.tolist(), base.tolist())]
+    return _assemble(g, texts, val, _offset_near(g, val))
+
+
+def _q200_series(g, m):
+    start = g.integers(1, 21, m); step = g.integers(2, 10, m); n = g.integers(4, 7, m)
+    val = start + n * step
+    texts = [f"ما العدد التالي في المتتالية: {_fmt(s + i * d for i in range(k))} ؟"
+             for s, d, k in zip(start.tolist(), step.tolist(), n.tolist())]
+    return _assemble(g, texts, val, _offset_near(g, val))
+
+
+def _q200_area_rect(g, m):
+    L = g.integers(5, 31, m); W = g.integers(3, 21, m); val = L * W
+    texts = [f"مساحة مستطيل طوله {x} وعرضه {y} تساوي؟" for x, y in zip(L.tolist(), W.tolist())]
+    return _assemble(g, texts, val, _offset_near(g, val))
+
+
+def _q200_gcd(g, m):
+    a = g.integers(12, 141, m); b = g.integers(12, 141, m); val = np.gcd(a, b)
+    texts = [f"ما القاسم المشترك الأكبر للعددين {x} و {y}؟" for x, y in zip(a.tolist(), b.tolist())]
+    spreads = [-3, -2, -1, 1, 2, 3]
+    return _assemble(g, texts, val, _offset_near(g, val, spreads), minval=1, offsets=spreads)
+
+
+def _q200_lcm(g, m):
+    a = g.integers(4, 25, m); b = g.integers(4, 25, m); val = np.lcm(a, b)
+    texts = [f"ما المضاعف المشترك الأصغر للعددين {x} و {y}؟" for x, y in zip(a.tolist(), b.tolist())]
+    return _assemble(g, texts, val, _offset_near(g, val))
+
+
+def _q200_avg(g, m):
+    n = g.integers(3, 8, m)
+    nums = g.integers(5, 46, (m, 7))
+    mask = np.arange(7)[None, :] < n[:, None]
+    nums = np.where(mask, nums, 0)
+    rem = nums.sum(1) % n
+    last = n - 1
+    nums[np.arange(m), last] += np.where(rem != 0, n - rem, 0)
+    val = nums.sum(1) // n
+    texts = [f"ما متوسط الأعداد: {_fmt(row[:k])} ؟" for row, k in zip(nums.tolist(), n.tolist())]
+    return _assemble(g, texts, val, _offset_near(g, val))
+
+
+def _q200_speed_time(g, m):
+    v = g.choice([36, 40, 50, 60, 72, 80, 90, 100], m); t = g.choice([2, 3, 4, 5, 6], m); val = v * t
+    texts = [f"سيارة سرعتها {x} كم/س لمدّة {y} ساعات. كم كيلومتراً تقطع؟" for x, y in zip(v.tolist(), t.tolist())]
+    return _assemble(g, texts, val, _offset_near(g, val))
+
+
+def _q200_proportion(g, m):
+    pairs = np.asarray([(2, 3), (3, 4), (3, 5), (4, 5), (5, 6), (7, 8)], dtype=np.int64)[g.integers(0, 6, m)]
+    a, b = pairs[:, 0], pairs[:, 1]
+    rhs = g.choice([12, 15, 18, 20, 24, 30, 36, 40], m)
+    for _ in range(10):  # نفس قاعدة المولِّد الفردي: أقرب rhs تجعل القسمة صحيحة
+        rhs = np.where((rhs * a) % b == 0, rhs, rhs + 1)
+    val = (rhs * a) // b
+    texts = [f"إذا كانت النسبة {x}:{y} = س:{z} فما قيمة س؟" for x, y, z in zip(a.tolist(), b.tolist(), rhs.tolist())]
+    return _assemble(g, texts, val, _offset_near(g, val))
+
+
+Q200_BATCH = [
+    _q200_arith, _q200_percent, _q200_series, _q200_area_rect,
+    _q200_gcd, _q200_lcm, _q200_avg, _q200_speed_time, _q200_proportion,
+]
+
+
+def _q200(g, n: int) -> List[Question]:
+    out: List[Question] = []
+    for fn, rows in zip(Q200_BATCH, _split(g, n, len(Q200_BATCH))):
+        if len(rows):
+            out += fn(g, len(rows))
+    return out
+
+
+# ===== الواجهة =====
+BATCH: Dict[str, Callable] = {"quant": _quant, "iq": _iq, "qiyas200": _q200,
+                              **{k: fn for k, fn in IQ_BATCH.items()}}
+
+
+def _scalar(kind: str) -> Callable[[random.Random], Question]:
+    if kind == "quant":
+        return generators.gen_quant
+    if kind == "iq":
+        return generators.gen_iq
+    if kind == "qiyas200":
+        import qiyas_200  # يستورد telegram؛ لا نحتاجه إلا بلا NumPy
+        return lambda rng: rng.choice(qiyas_200.GENERATORS)(rng)
+    return generators.IQ_KINDS[kind][1]
+
+
+def generate(kind: str, n: int, seed: Optional[int] = None) -> List[Question]:
+    """n سؤالاً من النوع kind (quant | iq | qiyas200 | أحد أنواع الذكاء)، بترتيب عشوائي."""
+    if kind not in BATCH:
+        raise KeyError(kind)
+    if n <= 0:
+        return []
+    if np is None:
+        rng = random.Random(seed)
+        fn = _scalar(kind)
+        return [fn(rng) for _ in range(n)]
+    g = np.random.default_rng(seed)
+    out = BATCH[kind](g, n)
+    order = g.permutation(len(out)).tolist()  # الأنواع تُبنى متتالية؛ نخلطها
+    return [out[i] for i in order]
@@ -0,0 +1,201 @@
+# bench_ai.py — اختبار حمل لمسار الذكاء الاصطناعي (/ask_ai) بلا تكلفة
+# ----------------------------------------------------------
+# يشغّل mock_llm محلياً (أو يستخدم --base-url جاهزاً)، ويبني البوت عبر build()
+# بناقل تلغرام وهمي في الذاكرة، ثم يدفع N تحديث /ask_ai متزامن عبر المعالجات
+# الحقيقية ويطبع الإنتاجية وزمن p50/p95/p99 (أول رد + اكتمال) وإحصاءات
+# الكاش والحاكم والخادم الوهمي.
+#
+# الاستخدام:
+#   python bench_ai.py -n 200 --users 100 --distinct 20 --latency 0.8 --rate-429 0.05
+#   python bench_ai.py -n 200 --handler qiyas --no-stream --json out.json
+import os, sys, json, time, random, asyncio, argparse, logging, itertools
+from typing import Any, Dict, List, Optional, Tuple
+
+# app يتطلب هذه المتغيرات عند الاستيراد؛ قيم وهمية ما لم تُضبط
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:bench")
+os.environ.setdefault("WEBHOOK_URL", "http://bench.invalid")
+os.environ.setdefault("AI_API_KEY", "mock")
+os.environ.setdefault("PERSIST_DB", "")  # بلا ملف حالة
+os.environ.setdefault("OUTBOUND_SCHEDULER", "0")  # نقيس زمن AI لا حدود تلغرام
+
+from telegram import Update
+from telegram.ext import CommandHandler
+from telegram.request import BaseRequest, RequestData
+
+import ai_client
+import ai_cache
+import ai_governor
+import ai_router
+import app as bot_app
+import ask_qiyas_ai
+from mock_llm import MockLLM
+
+log = logging.getLogger("bench-ai")
+
+
+class BenchRequest(BaseRequest):
+    """ناقل تلغرام في الذاكرة: يجيب كل طريقة بنجاح ويسجّل زمن أول رد لكل محادثة."""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self.calls: Dict[str, int] = {}
+        self.first_reply: Dict[int, float] = {}
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None, pool_timeout=None
+                         ) -> Tuple[int, bytes]:
+        name = url.rsplit("/", 1)[-1]
+        self.calls[name] = self.calls.get(name, 0) + 1
+        params = request_data.parameters if request_data else {}
+        if name == "getMe":
+            result: Any = {"id": 123456, "is_bot": True, "first_name": "Bench", "username": "bench_bot",
+                           "can_join_groups": True, "can_read_all_group_messages": False,
+                           "supports_inline_queries": False}
+        elif name in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id", 0))
+            if name == "sendMessage":
+                self.first_reply.setdefault(chat_id, time.perf_counter())
+            result = {"message_id": params.get("message_id") or next(self._ids), "date": int(time.time()),
+                      "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", "")}
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode("utf-8")
+
+
+def _update(bot, seq: int, user_id: int, command: str, question: str) -> Update:
+    """محادثة مستقلة لكل تحديث (لقياس زمنه)، والمستخدم يتكرر (معدّله وذاكرته)."""
+    text = f"/{command} {question}"
+    return Update.de_json({
+        "update_id": seq,
+        "message": {
+            "message_id": seq, "date": int(time.time()), "text": text,
+            "chat": {"id": seq, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"},
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command) + 1}],
+        },
+    }, bot)
+
+
+def _pct(xs: List[float], p: float) -> Optional[float]:
+    if not xs:
+        return None
+    xs = sorted(xs)
+    return round(xs[min(len(xs) - 1, int(p * len(xs)))], 4)
+
+
+def _summary(xs: List[float]) -> Dict[str, Optional[float]]:
+    return {"p50": _pct(xs, 0.5), "p95": _pct(xs, 0.95), "p99": _pct(xs, 0.99),
+            "max": round(max(xs), 4) if xs else None}
+
+
+async def _run(args) -> Dict[str, Any]:
+    mock = None
+    base_url = args.base_url
+    if not base_url:
+        mock = MockLLM(args.latency, args.sigma, args.error_rate, args.rate_429, args.retry_after,
+                       args.tokens_per_sec, args.answer_words, args.seed)
+        base_url = await mock.start()
+    ai_client.AI_BASE_URL = base_url
+    bot_app.AI_BASE_URL = base_url
+    bot_app.AI_STREAM_DEFAULT = args.stream
+
+    transport = BenchRequest()
+    application = bot_app.build(request=transport)
+    command = "ask_ai"
+    if args.handler == "qiyas":
+        command = "ask_qiyas"
+        application.add_handler(CommandHandler(command, ask_qiyas_ai.ask_qiyas_ai_handler), group=-1)
+
+    rng = random.Random(args.seed)
+    questions = [f"سؤال تجريبي رقم {i}: كيف أحل مسائل النسبة؟" for i in range(args.distinct)]
+    done: Dict[int, float] = {}
+    errors = 0
+
+    async with application:
+        updates = [_update(application.bot, i + 1, i % args.users + 1, command, rng.choice(questions))
+                   for i in range(args.n)]
+        sem = asyncio.Semaphore(args.concurrency) if args.concurrency else None
+        t0 = time.perf_counter()
+        starts: Dict[int, float] = {}
+
+        async def push(u: Update):
+            nonlocal errors
+            async def go():
+                starts[u.effective_chat.id] = time.perf_counter()
+                if args.via_processor:  # نفس مسار الإنتاج (يحترم concurrent_updates)
+                    await application.update_processor.process_update(u, application.process_update(u))
+                else:
+                    await application.process_update(u)
+                done[u.effective_chat.id] = time.perf_counter()
+            try:
+                if sem is None:
+                    await go()
+                else:
+                    async with sem:
+                        await go()
+            except Exception:
+                errors += 1
+                log.exception("update failed")
+
+        await asyncio.gather(*(push(u) for u in updates))
+        wall = time.perf_counter() - t0
+
+    first = [transport.first_reply[c] - starts[c] for c in starts if c in transport.first_reply]
+    total = [done[c] - starts[c] for c in done]
+    report = {
+        "n": args.n, "handler": args.handler, "stream": args.stream, "wall_s": round(wall, 3),
+        "throughput_rps": round(args.n / wall, 2) if wall else None,
+        "first_reply_s": _summary(first), "complete_s": _summary(total), "errors": errors,
+        "telegram_calls": transport.calls,
+        "cache": ai_cache.answers.stats(), "flights": bot_app.AI_FLIGHTS.stats(),
+        "governor": ai_governor.GOVERNOR.stats(), "router": ai_router.stats(),
+    }
+    if mock is not None:
+        report["mock"] = mock.stats
+        await mock.stop()
+    return report
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="اختبار حمل لمسار /ask_ai ضد خادم LLM وهمي")
+    ap.add_argument("-n", type=int, default=100, help="عدد التحديثات")
+    ap.add_argument("--users", type=int, default=100, help="عدد المستخدمين المختلفين")
+    ap.add_argument("--distinct", type=int, default=20, help="عدد الأسئلة المختلفة (تكرارها يختبر الكاش)")
+    ap.add_argument("--concurrency", type=int, default=0, help="سقف التحديثات المتزامنة (0 = الكل)")
+    ap.add_argument("--handler", choices=["core", "qiyas"], default="core",
+                    help="core = _ask_ai_core عبر build()، qiyas = ask_qiyas_ai_handler")
+    ap.add_argument("--stream", dest="stream", action="store_true", default=bot_app.AI_STREAM_DEFAULT)
+    ap.add_argument("--no-stream", dest="stream", action="store_false")
+    ap.add_argument("--via-processor", action="store_true", help="عبر update_processor مثل الإنتاج")
+    ap.add_argument("--base-url", default=None, help="خادم جاهز بدل تشغيل mock داخلي")
+    ap.add_argument("--latency", type=float, default=0.5)
+    ap.add_argument("--sigma", type=float, default=0.4)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--retry-after", type=float, default=1.0)
+    ap.add_argument("--tokens-per-sec", type=float, default=200.0)
+    ap.add_argument("--answer-words", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", default=None, help="اكتب التقرير في ملف JSON")
+    args = ap.parse_args(argv)
+    args.users = max(1, args.users)
+    args.distinct = max(1, args.distinct)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s | %(levelname)s | %(message)s")
+    report = asyncio.run(_run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    print(text)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            f.write(text)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
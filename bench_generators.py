@@ -0,0 +1,255 @@
+# bench_generators.py — قياس سرعة وجودة مولِّدات الأسئلة
+# ----------------------------------------------------------
+# لكل مولِّد (gen_quant / gen_verbal / gen_iq / كل _gen_* في qiyas_200 / _make_question،
+# ومع --batch دفعات batchgen): أسئلة/ثانية، الذاكرة لكل سؤال (tracemalloc)،
+# نسبة الأسئلة المختلفة في N سحبة، توزيع موضع الإجابة الصحيحة، ومرات امتداد
+# بحث المشتّتات العددية خارج جدول الإزاحات (بديل حلقات إعادة المحاولة القديمة في _mk_opts).
+# ثم يحاكي جلسات كاملة عبر app.next_unseen (منطق send_next) ويقيس إعادة التوليد بسبب التكرار
+# (بلا qpool؛ ويفشل التشغيل إن سقط أي سؤال إلى FALLBACK_Q).
+#
+# الاستخدام:
+#   python bench_generators.py                         # 10k سحبة لكل مولِّد
+#   python bench_generators.py --json out.json         # تقرير آلي
+#   python bench_generators.py --baseline prev.json    # يفشل (exit 1) عند تراجع عن إصدار سابق
+#   python bench_generators.py --only gen_iq --draws 50000 --batch
+import os, sys, json, time, random, logging, argparse, tracemalloc
+from typing import Any, Callable, Dict, List
+
+# app يتطلب هذه المتغيرات عند الاستيراد؛ قيم وهمية ما لم تُضبط
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:bench")
+os.environ.setdefault("WEBHOOK_URL", "http://bench.invalid")
+os.environ.setdefault("AI_API_KEY", "mock")
+os.environ.setdefault("PERSIST_DB", "")
+os.environ.setdefault("QPOOL", "0")  # المحاكاة متزامنة: نقيس المولِّدات لا مخزن qpool
+
+import app as bot_app
+import batchgen
+import distractors
+import generators
+import qiyas_200
+from dedup import RecentSet
+from question import Question
+
+Gen = Callable[[random.Random], Question]
+
+
+def _make_question(rng: random.Random) -> Question:
+    return qiyas_200._make_question()  # يستخدم random العام؛ البذرة تُضبط في _measure
+
+
+TARGETS: Dict[str, Gen] = {
+    "gen_quant": generators.gen_quant,
+    "gen_verbal": generators.gen_verbal,
+    "gen_iq": generators.gen_iq,
+    **{f"qiyas_200.{fn.__name__}": fn for fn in qiyas_200.GENERATORS},
+    "qiyas_200._make_question": _make_question,
+}
+
+# مقاييس تُقارن مع --baseline: (الحقل، الاتجاه الجيد، سماحية نسبية أو مطلقة)
+_CHECKS = (
+    ("qps", "higher", "rel"),
+    ("distinct_rate", "higher", "abs"),
+    ("position_max_dev", "lower", "abs"),
+    ("extended_rate", "lower", "abs"),
+    ("retained_bytes_per_q", "lower", "rel"),
+)
+
+
+def _quality(qs: List[Question]) -> Dict[str, Any]:
+    n = len(qs)
+    width = max(len(q.options) for q in qs)
+    pos = [0] * width
+    bad = 0
+    for q in qs:
+        pos[q.answer_index] += 1
+        if len(set(q.options)) != len(q.options):
+            bad += 1
+    share = [round(c / n, 4) for c in pos]
+    return {
+        "distinct": len({q.fp for q in qs}),
+        "distinct_rate": round(len({q.fp for q in qs}) / n, 4),
+        "answer_positions": share,
+        "position_max_dev": round(max(abs(s - 1 / width) for s in share), 4),
+        "duplicate_option_rows": bad,
+    }
+
+
+def _memory(make: Callable[[int], List[Question]], n: int) -> Dict[str, Any]:
+    """retained: ما يبقى محجوزاً لكل سؤال محتفظ به؛ peak: أعلى ذروة عابرة أثناء التوليد."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        blocks0 = sys.getallocatedblocks()
+        kept = make(n)
+        blocks = sys.getallocatedblocks() - blocks0
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return {
+        "retained_bytes_per_q": round((current - before) / n, 1),
+        "retained_blocks_per_q": round(blocks / n, 2),
+        "peak_bytes_per_q": round((peak - before) / n, 1),
+    }
+
+
+def _measure(fn: Gen, draws: int, seed: int, mem_draws: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    random.seed(seed)
+    for _ in range(min(200, draws)):  # تسخين (تهيئة الجداول الكسولة)
+        fn(rng)
+    d0 = distractors.stats()
+    rng = random.Random(seed)
+    random.seed(seed)
+    t0 = time.perf_counter()
+    qs = [fn(rng) for _ in range(draws)]
+    wall = time.perf_counter() - t0
+    d1 = distractors.stats()
+    numeric = d1["numeric"] - d0["numeric"]
+    extended = d1["extended"] - d0["extended"]
+    out = {"draws": draws, "wall_s": round(wall, 4), "qps": round(draws / wall, 1),
+           "us_per_q": round(wall / draws * 1e6, 2),
+           "numeric_option_calls": numeric, "extended": extended,
+           "extended_rate": round(extended / numeric, 4) if numeric else 0.0}
+    out.update(_quality(qs))
+    r = random.Random(seed + 1)
+    out.update(_memory(lambda n: [fn(r) for _ in range(n)], mem_draws))
+    return out
+
+
+def _measure_batch(kind: str, draws: int, seed: int, mem_draws: int) -> Dict[str, Any]:
+    batchgen.generate(kind, 256, seed)  # تسخين
+    d0 = distractors.stats()
+    t0 = time.perf_counter()
+    qs = batchgen.generate(kind, draws, seed)
+    wall = time.perf_counter() - t0
+    d1 = distractors.stats()
+    numeric = d1["numeric"] - d0["numeric"]
+    extended = d1["extended"] - d0["extended"]
+    out = {"draws": draws, "wall_s": round(wall, 4), "qps": round(draws / wall, 1),
+           "us_per_q": round(wall / draws * 1e6, 2), "numpy": batchgen.available(),
+           # في الدفعات: numeric = صفوف احتاجت المسار العددي الفردي (خيارات متصادمة)
+           "numeric_option_calls": numeric, "extended": extended,
+           "extended_rate": round(extended / numeric, 4) if numeric else 0.0}
+    out.update(_quality(qs))
+    out.update(_memory(lambda n: batchgen.generate(kind, n, seed + 1), mem_draws))
+    return out
+
+
+class _FallbackCounter(logging.Handler):
+    """يعدّ مرات سقوط QuizSession إلى FALLBACK_Q (خطأ مولِّد) أثناء المحاكاة."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord):
+        if record.getMessage().startswith("generator failed"):
+            self.count += 1
+
+
+def _sessions(cat: str, sessions: int, seed: int) -> Dict[str, Any]:
+    """مستخدم واحد يكمل sessions جلسة متتالية بنفس مجموعة «آخر ما رآه» كما في send_next."""
+    fallbacks = _FallbackCounter()
+    bot_app.log.addHandler(fallbacks)
+    try:
+        out = _run_sessions(cat, sessions, seed)
+    finally:
+        bot_app.log.removeHandler(fallbacks)
+    out["fallbacks"] = fallbacks.count
+    return out
+
+
+def _run_sessions(cat: str, sessions: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    seen = RecentSet(bot_app.SEEN_LIMIT)
+    limit = bot_app.SESSION_LIMITS.get(cat, 300)
+    served = collisions = exhausted = 0
+    t0 = time.perf_counter()
+    for _ in range(sessions):
+        s = bot_app.QuizSession(cat, limit, seed=rng.getrandbits(32))
+        while s.current():
+            c, ex = bot_app.next_unseen(s, seen)
+            served += 1
+            collisions += c
+            exhausted += ex
+            s.check(0)
+    wall = time.perf_counter() - t0
+    return {"sessions": sessions, "served": served, "collisions": collisions, "exhausted": exhausted,
+            "regen_rate": round(collisions / served, 4) if served else 0.0,
+            "exhausted_rate": round(exhausted / served, 4) if served else 0.0,
+            "us_per_served": round(wall / served * 1e6, 2) if served else None}
+
+
+def _compare(report: Dict[str, Any], base: Dict[str, Any], rel_tol: float, abs_tol: float) -> List[str]:
+    problems = []
+    for section in ("generators", "batch"):
+        for name, cur in report.get(section, {}).items():
+            old = base.get(section, {}).get(name)
+            if not old:
+                continue
+            for field, better, mode in _CHECKS:
+                a, b = old.get(field), cur.get(field)
+                if a is None or b is None:
+                    continue
+                delta = (b - a) if better == "higher" else (a - b)
+                limit = rel_tol * abs(a) if mode == "rel" else abs_tol
+                if delta < -limit:
+                    problems.append(f"{section}/{name}: {field} {a} → {b}")
+    for cat, cur in report.get("sessions", {}).items():
+        old = base.get("sessions", {}).get(cat)
+        if old and cur["regen_rate"] - old["regen_rate"] > abs_tol:
+            problems.append(f"sessions/{cat}: regen_rate {old['regen_rate']} → {cur['regen_rate']}")
+    return problems
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="قياس سرعة وجودة مولِّدات الأسئلة")
+    ap.add_argument("--draws", type=int, default=10_000, help="عدد السحبات لكل مولِّد")
+    ap.add_argument("--mem-draws", type=int, default=1000, help="سحبات قياس الذاكرة (tracemalloc بطيء)")
+    ap.add_argument("--sessions", type=int, default=5, help="جلسات محاكاة لكل فئة (0 = تخطٍّ)")
+    ap.add_argument("--batch", action="store_true", help="قِس batchgen.generate أيضاً")
+    ap.add_argument("--only", action="append", default=[], help="اسم مولِّد (يتكرر)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", default=None, help="اكتب التقرير في ملف JSON")
+    ap.add_argument("--baseline", default=None, help="تقرير JSON سابق للمقارنة")
+    ap.add_argument("--rel-tol", type=float, default=0.25, help="سماحية نسبية (السرعة/الذاكرة)")
+    ap.add_argument("--abs-tol", type=float, default=0.02, help="سماحية مطلقة (النسب)")
+    args = ap.parse_args(argv)
+    draws = max(1, args.draws)
+    mem_draws = max(1, min(args.mem_draws, draws))
+
+    names = args.only or list(TARGETS)
+    unknown = [n for n in names if n not in TARGETS and n not in batchgen.BATCH]
+    if unknown:
+        ap.error(f"مولِّد غير معروف: {', '.join(unknown)} (المتاح: {', '.join(TARGETS)})")
+
+    report: Dict[str, Any] = {"python": sys.version.split()[0], "seed": args.seed, "generators": {}}
+    for name in names:
+        if name in TARGETS:
+            report["generators"][name] = _measure(TARGETS[name], draws, args.seed, mem_draws)
+    if args.batch:
+        kinds = [n for n in names if n in batchgen.BATCH] or list(batchgen.BATCH)
+        report["batch"] = {k: _measure_batch(k, draws, args.seed, mem_draws) for k in kinds}
+    if args.sessions > 0 and not args.only:
+        report["sessions"] = {cat: _sessions(cat, args.sessions, args.seed) for cat in generators.KINDS}
+        # أرقام مبنية على سؤال الطوارئ لا تقيس المولِّدات: التشغيل كله غير صالح
+        broken = [f"sessions/{cat}: {r['fallbacks']} مرة FALLBACK_Q (generator failed)"
+                  for cat, r in report["sessions"].items() if r["fallbacks"]]
+        if broken:
+            report["errors"] = broken
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = _compare(report, json.load(f), args.rel_tol, args.abs_tol)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            f.write(text)
+    return 1 if report.get("regressions") or report.get("errors") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
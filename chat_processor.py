@@ -0,0 +1,118 @@
+# chat_processor.py — معالجة متوازية للتحديثات مع ترتيب مضمون داخل كل محادثة
+# ----------------------------------------------------------
+# افتراضي PTB يعالج تحديثاً واحداً في كل مرة: نداء _ask_ai_core بطيء (حتى 25 ث) يؤخّر
+# ضغطات الاختبار لكل المستخدمين. concurrent_updates العادي يكسر حالة QuizSession/q200
+# (ضغطتان سريعتان من نفس المستخدم تتسابقان على user_data).
+#
+# ChatOrderedProcessor:
+# - قفل لكل محادثة (أو مستخدم إن لم تكن هناك محادثة): تحديثات المحادثة الواحدة بالتتابع
+#   وبترتيب وصولها (asyncio.Lock عادل)، والمحادثات المختلفة بالتوازي.
+# - سقف عام UPDATE_CONCURRENCY لما يُعالج فعلاً؛ يُطلب بعد قفل المحادثة حتى لا تحجز
+#   تحديثات منتظرة خلف محادثة مشغولة أماكن غيرها.
+# - ضغط عكسي: أكثر من UPDATE_PENDING_MAX تحديث معلّق ينتظر (سيمافور PTB)، وما زاد عن
+#   UPDATE_CHAT_PENDING لمحادثة واحدة يُسقط (ضغطات متكررة من مستخدم عالق).
+import os, time, asyncio, logging
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+UPDATE_CONCURRENCY  = int(os.environ.get("UPDATE_CONCURRENCY", "32"))     # تحديثات تُعالج معاً
+UPDATE_CHAT_PENDING = int(os.environ.get("UPDATE_CHAT_PENDING", "20"))    # حد طابور المحادثة الواحدة
+UPDATE_PENDING_MAX  = int(os.environ.get("UPDATE_PENDING_MAX", "2000"))   # كل المعلّق (قيد المعالجة + منتظر)
+
+log = logging.getLogger(__name__)
+
+
+def _percentile(xs: Deque[float], p: float) -> Optional[float]:
+    if not xs:
+        return None
+    s = sorted(xs)
+    return s[min(len(s) - 1, int(p * len(s)))]
+
+
+class ChatOrderedProcessor(BaseUpdateProcessor):
+    def __init__(self, concurrency: int = UPDATE_CONCURRENCY, chat_pending: int = UPDATE_CHAT_PENDING,
+                 pending_max: int = UPDATE_PENDING_MAX):
+        super().__init__(max(pending_max, concurrency, 2))  # >1 ⇒ PTB ينشئ مهمة لكل تحديث
+        self.concurrency = concurrency
+        self.chat_pending = chat_pending
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._queued: Dict[Hashable, int] = {}   # محادثة ← تحديثاتها المعلّقة (بما فيها الجاري)
+        self._waits: Deque[float] = deque(maxlen=500)
+        self.active = 0
+        self.processed = 0
+        self.shed = 0
+        self.peak_active = 0
+        self.peak_chat_queue = 0
+
+    @staticmethod
+    def _key(update: object) -> Optional[Hashable]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return ("user", update.effective_user.id)
+        return None
+
+    async def initialize(self) -> None:
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def _run(self, coroutine: Awaitable[Any], t0: float):
+        async with self._slots:
+            self._waits.append(time.monotonic() - t0)
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            try:
+                await coroutine
+            finally:
+                self.active -= 1
+                self.processed += 1
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        t0 = time.monotonic()
+        key = self._key(update)
+        if key is None:
+            await self._run(coroutine, t0)
+            return
+        n = self._queued.get(key, 0)
+        if n >= self.chat_pending:
+            self.shed += 1
+            coroutine.close()
+            log.warning("Dropped update %s: chat %s already has %d pending",
+                        getattr(update, "update_id", "?"), key, n)
+            return
+        self._queued[key] = n + 1
+        self.peak_chat_queue = max(self.peak_chat_queue, n + 1)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        try:
+            async with lock:
+                await self._run(coroutine, t0)
+        finally:
+            left = self._queued[key] - 1
+            if left:
+                self._queued[key] = left
+            else:  # لا أحد يحمل القفل أو ينتظره
+                del self._queued[key]
+                del self._locks[key]
+
+    def stats(self) -> Dict[str, Any]:
+        lengths = sorted(self._queued.values())
+        return {"active": self.active, "concurrency": self.concurrency, "peak_active": self.peak_active,
+                "chats": len(lengths), "queued": sum(lengths),
+                "max_chat_queue": lengths[-1] if lengths else 0,
+                "chats_waiting": sum(1 for n in lengths if n > 1),
+                "peak_chat_queue": self.peak_chat_queue,
+                "processed": self.processed, "shed": self.shed,
+                "wait_p50": _percentile(self._waits, 0.5), "wait_p95": _percentile(self._waits, 0.95)}
+
+
+PROCESSOR = ChatOrderedProcessor()
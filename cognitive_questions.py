@@ -1,49 +1,66 @@
 # cognitive_questions.py — أزرار آمنة بـ CallbackQuery
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-import random
+
+import qbank
+import quizview
+from question import Question
 
 # أمثلة — يمكنك تكبير القائمة لاحقًا
 QUESTIONS = [
-    {"q": "ما هو حاصل ضرب 7 × 8؟", "options": ["54", "56", "63", "49"], "answer_idx": 1},
-    {"q": "إذا كان لديك 5 تفاحات وأكلت 2، فكم تبقى؟", "options": ["2", "3", "4", "5"], "answer_idx": 1},
-    {"q": "ما هو اليوم الذي يأتي بعد الأربعاء؟", "options": ["الثلاثاء", "الخميس", "الجمعة", "السبت"], "answer_idx": 1},
-    {"q": "أي من هذه الحيوانات يبيض؟", "options": ["القطة", "الكلب", "الدجاجة", "البقرة"], "answer_idx": 2},
-    {"q": "ما هو لون السماء في يوم صافٍ؟", "options": ["أخضر", "أحمر", "أزرق", "أصفر"], "answer_idx": 2},
+    Question("ما هو حاصل ضرب 7 × 8؟", ["54", "56", "63", "49"], 1),
+    Question("إذا كان لديك 5 تفاحات وأكلت 2، فكم تبقى؟", ["2", "3", "4", "5"], 1),
+    Question("ما هو اليوم الذي يأتي بعد الأربعاء؟", ["الثلاثاء", "الخميس", "الجمعة", "السبت"], 1),
+    Question("أي من هذه الحيوانات يبيض؟", ["القطة", "الكلب", "الدجاجة", "البقرة"], 2),
+    Question("ما هو لون السماء في يوم صافٍ؟", ["أخضر", "أحمر", "أزرق", "أصفر"], 2),
 ]
 
+QUIZ_LEN = 5
+_bank = None
+
+
+def _get_bank() -> qbank.QBank:
+    """بنك الفئة: ملف QBANK_PATH المشترك إن احتواها، وإلا القائمة أعلاه."""
+    global _bank
+    if _bank is None:
+        _bank = qbank.bank_for("cognitive", QUESTIONS)
+    return _bank
+
 def _ensure_quiz(context: ContextTypes.DEFAULT_TYPE) -> dict:
-    if "cog_quiz" not in context.user_data:
-        context.user_data["cog_quiz"] = {
+    bank = _get_bank()
+    q = context.user_data.get("cog_quiz")
+    if q is None or q.get("bank") != bank.tag:
+        # الجلسة تحفظ أرقام البنود فقط؛ بنك مختلف (أعيد بناؤه) ⇒ جلسة جديدة
+        q = context.user_data["cog_quiz"] = {
             "score": 0,
             "idx": 0,
-            "qs": random.sample(QUESTIONS, min(5, len(QUESTIONS))),
+            "ids": bank.sample("cognitive", QUIZ_LEN),
+            "bank": bank.tag,
         }
-    return context.user_data["cog_quiz"]
+    return q
 
 async def start_cognitive_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     context.user_data.pop("cog_quiz", None)
     _ensure_quiz(context)
     await _send_cog_question(update, context)
 
-async def _send_cog_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+def _next_view(context: ContextTypes.DEFAULT_TYPE):
+    """(نص السؤال التالي، أزراره) أو (النتيجة النهائية، None) مع إنهاء الجلسة."""
     q = _ensure_quiz(context)
-    if q["idx"] >= len(q["qs"]):
-        await update.effective_message.reply_text(
-            f"انتهى الاختبار! نتيجتك: {q['score']} من {len(q['qs'])}."
-        )
+    if q["idx"] >= len(q["ids"]):
         context.user_data.pop("cog_quiz", None)
-        return
+        return f"انتهى الاختبار! نتيجتك: {q['score']} من {len(q['ids'])}.", None
 
-    cur = q["qs"][q["idx"]]
+    cur = _get_bank().get(q["ids"][q["idx"]])
     buttons = [
         [InlineKeyboardButton(opt, callback_data=f"cog|{i}")]
-        for i, opt in enumerate(cur["options"])
+        for i, opt in enumerate(cur.options)
     ]
-    await update.effective_message.reply_text(
-        f"السؤال {q['idx']+1}: {cur['q']}",
-        reply_markup=InlineKeyboardMarkup(buttons),
-    )
+    return f"السؤال {q['idx']+1}: {cur.question}", InlineKeyboardMarkup(buttons)
+
+async def _send_cog_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    text, kb = _next_view(context)
+    await update.effective_message.reply_text(text, reply_markup=kb)
 
 async def handle_cognitive_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     q = _ensure_quiz(context)
@@ -51,24 +68,28 @@ async def handle_cognitive_callback(update: Update, context: ContextTypes.DEFAUL
     await query.answer()
 
     # إذا فُقدت الحالة بعد إعادة تشغيل البوت
-    if q["idx"] >= len(q["qs"]):
+    if q["idx"] >= len(q["ids"]):
         await query.edit_message_text("الجلسة انتهت. ارسل «اختبر قدراتك (500 سؤال)» للبدء من جديد.")
         context.user_data.pop("cog_quiz", None)
         return
 
-    cur = q["qs"][q["idx"]]
+    cur = _get_bank().get(q["ids"][q["idx"]])
     try:
         chosen = int(query.data.split("|", 1)[1])
     except Exception:
         chosen = -1
 
-    if chosen == cur["answer_idx"]:
+    if chosen == cur.answer_index:
         q["score"] += 1
-        await query.edit_message_text(f"✔️ إجابة صحيحة! نتيجتك الآن: {q['score']}")
+        feedback = f"✔️ إجابة صحيحة! نتيجتك الآن: {q['score']}"
     else:
-        correct = cur["options"][cur["answer_idx"]]
-        await query.edit_message_text(f"❌ إجابة خاطئة. الصحيحة: {correct}. نتيجتك الآن: {q['score']}")
+        correct = cur.answer
+        feedback = f"❌ إجابة خاطئة. الصحيحة: {correct}. نتيجتك الآن: {q['score']}"
 
     q["idx"] += 1
+    if quizview.inplace(context):
+        await quizview.show(query, feedback, *_next_view(context))
+        return
+    await query.edit_message_text(feedback)
     # أرسل السؤال التالي برسالة جديدة
     await _send_cog_question(update, context)
@@ -0,0 +1,70 @@
+# dedup.py — منع تكرار الأسئلة الأخيرة: حلقة ثابتة الحجم + مجموعة بصمات 64-بت
+# ----------------------------------------------------------
+# العضوية والإخراج O(1)، والمخزَّن أعداد صحيحة (Question.fp) لا نصوص عربية.
+# العدّادات لكل فئة تُظهر متى يقترب فضاء أسئلة الفئة من النفاد.
+from array import array
+from typing import Dict, Set
+
+
+class RecentSet:
+    """آخر maxlen بصمة: الأقدم يخرج عند الامتلاء."""
+    __slots__ = ("maxlen", "_ring", "_pos", "_count", "_set")
+
+    def __init__(self, maxlen: int):
+        self.maxlen = maxlen
+        self._ring = array("Q", bytes(8 * maxlen))
+        self._pos = 0
+        self._count = 0
+        self._set: Set[int] = set()
+
+    def __contains__(self, fp: int) -> bool:
+        return fp in self._set
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, fp: int) -> bool:
+        """يضيف البصمة؛ يعيد False إن كانت موجودة أصلاً (تكرار)."""
+        if fp in self._set:
+            return False
+        if self._count == self.maxlen:
+            self._set.discard(self._ring[self._pos])
+        else:
+            self._count += 1
+        self._ring[self._pos] = fp
+        self._set.add(fp)
+        self._pos = (self._pos + 1) % self.maxlen
+        return True
+
+    def __getstate__(self):
+        return (self.maxlen, self._ring.tobytes(), self._pos, self._count)
+
+    def __setstate__(self, state):
+        self.maxlen, raw, self._pos, self._count = state
+        self._ring = array("Q")
+        self._ring.frombytes(raw)
+        # الخانات الفارغة أصفار؛ نعيد بناء المجموعة من المملوء فقط
+        if self._count < self.maxlen:
+            self._set = set(self._ring[:self._count])
+        else:
+            self._set = set(self._ring)
+
+
+# ===== مقاييس =====
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def record(cat: str, collisions: int, exhausted: bool):
+    """collisions: أسئلة مكررة أعيد توليدها قبل الإرسال؛ exhausted: أُرسل مكرر بعد نفاد المحاولات."""
+    st = _stats.setdefault(cat, {"served": 0, "collisions": 0, "exhausted": 0})
+    st["served"] += 1
+    st["collisions"] += collisions
+    st["exhausted"] += int(exhausted)
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    out = {}
+    for cat, st in _stats.items():
+        served = st["served"] or 1
+        out[cat] = dict(st, regen_rate=st["collisions"] / served, exhausted_rate=st["exhausted"] / served)
+    return out
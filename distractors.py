@@ -0,0 +1,165 @@
+# distractors.py — محرّك الخيارات الخاطئة: جداول محسوبة عند الاستيراد + سحب محدود الزمن
+# ----------------------------------------------------------
+# - كلمات: لكل إجابة صحيحة قائمة مشتّتات جاهزة من نفس صنف الكلمة (فعل/معرّف/عبارة/اسم)
+#   بعد استبعاد ما يطابقها بعد حذف التشكيل (تفوق/تفوّق)، وتُسحب ثلاثة مختلفة بثلاث قرعات.
+# - أعداد: جداول إزاحات قريبة بحسب رتبة العدد (آحاد/عشرات/مئات…)، تُمشى من موضع
+#   عشوائي مرة واحدة على الأكثر — لا حلقات رفض بلا نهاية.
+import re, random
+from random import Random
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+_HARAKAT = re.compile(r"[\u064B-\u0652\u0670\u0640]")  # تشكيل + ألف خنجرية + تطويل
+
+FILLERS = ("قديم", "حديث", "سريع", "بطيء", "واضح", "غامض", "قوي", "ضعيف", "قريب", "بعيد")
+
+
+def fold(word: str) -> str:
+    """شكل المقارنة: بلا تشكيل ولا تطويل ولا مسافات زائدة."""
+    return _HARAKAT.sub("", word or "").strip()
+
+
+def word_class(word: str) -> str:
+    w = fold(word)
+    if " " in w:
+        return "phrase"
+    if w.startswith("ال"):
+        return "definite"
+    if w.startswith("ي") and len(w) >= 4:
+        return "verb"   # مضارع: يواجه، يبتعد، يسترجع…
+    return "noun"
+
+
+def three_distinct(rng: Random, n: int) -> Tuple[int, int, int]:
+    """ثلاثة مؤشرات مختلفة من range(n) بثلاث قرعات بالضبط (n ≥ 3)."""
+    i = rng.randrange(n)
+    j = rng.randrange(n - 1)
+    j += j >= i
+    k = rng.randrange(n - 2)
+    lo, hi = (i, j) if i < j else (j, i)
+    k += k >= lo
+    k += k >= hi
+    return i, j, k
+
+
+def _dedup(words: Iterable[str], exclude: Iterable[str] = ()) -> Tuple[str, ...]:
+    seen = {fold(w) for w in exclude}
+    out = []
+    for w in words:
+        f = fold(w)
+        if w and f not in seen:
+            seen.add(f)
+            out.append(w)
+    return tuple(out)
+
+
+class WordDistractors:
+    """مشتّتات محسوبة مسبقاً لكل إجابة في قاموس كلمات ثابت."""
+
+    def __init__(self, words: Iterable[str]):
+        self.words = _dedup(words)
+        self._same: Dict[str, Tuple[str, ...]] = {}
+        self._any: Dict[str, Tuple[str, ...]] = {}
+        for w in self.words:
+            self._prepare(w)
+
+    def _prepare(self, correct: str):
+        pool = _dedup(self.words + FILLERS, exclude=[correct])
+        cls = word_class(correct)
+        self._any[correct] = pool
+        self._same[correct] = tuple(x for x in pool if word_class(x) == cls)
+
+    def pool(self, correct: str) -> Tuple[str, ...]:
+        """المشتّتات المعقولة: نفس الصنف إن كفت (٣ فأكثر)، وإلا الكل."""
+        if correct not in self._any:
+            self._prepare(correct)  # إجابة من خارج القاموس (نادراً)
+        same = self._same[correct]
+        return same if len(same) >= 3 else self._any[correct]
+
+    def options(self, correct: str, rng: Random = random) -> Tuple[List[str], int]:
+        return pick_options(correct, self.pool(correct), rng)
+
+
+def fixed_pool(correct: str, candidates: Sequence[str]) -> Tuple[str, ...]:
+    """مشتّتات سؤال بعينه (جمل الإكمال)، مكمّلة بالحشو إن نقصت عن ثلاثة."""
+    pool = _dedup(candidates, exclude=[correct])
+    if len(pool) < 3:
+        pool = _dedup(pool + FILLERS, exclude=[correct])
+    return pool
+
+
+def pick_options(correct: str, pool: Sequence[str], rng: Random = random) -> Tuple[List[str], int]:
+    """الإجابة + ثلاث مشتّتات مختلفة من pool، في موضع عشوائي."""
+    i, j, k = three_distinct(rng, len(pool))
+    opts = [pool[i], pool[j], pool[k]]
+    pos = rng.randrange(4)
+    opts.insert(pos, correct)
+    return opts, pos
+
+
+# ===== أعداد =====
+# numeric: عدد الاستدعاءات؛ extended: مرات لم يكفِ near + جدول الإزاحات فامتد البحث للخارج
+_stats: Dict[str, int] = {"numeric": 0, "extended": 0}
+
+
+def stats() -> Dict[str, int]:
+    return dict(_stats)
+
+
+# إزاحات قريبة لكل رتبة؛ كل جدول فيه ٦ إزاحات موجبة على الأقل حتى يكفي مع minval
+_OFFSETS: Tuple[Tuple[int, Tuple[int, ...]], ...] = (
+    (10,     (-3, -2, -1, 1, 2, 3, 4, 5, 6)),
+    (100,    (-10, -5, -3, -2, -1, 1, 2, 3, 5, 10)),
+    (1000,   (-100, -50, -20, -10, -5, 5, 10, 20, 50, 100)),
+    (10**9,  (-1000, -500, -100, -50, -10, 10, 50, 100, 500, 1000)),
+)
+
+
+def offsets_for(value: int) -> Tuple[int, ...]:
+    mag = abs(value)
+    for limit, table in _OFFSETS:
+        if mag < limit:
+            return table
+    return _OFFSETS[-1][1]
+
+
+def numeric_distractors(correct: int, near: Iterable[int] = (), rng: Random = random,
+                        offsets: Optional[Sequence[int]] = None, minval: Optional[int] = None) -> List[int]:
+    """ثلاثة أعداد مختلفة عن correct: أولاً near (خاصة بالمسألة) ثم إزاحات بنفس الرتبة.
+
+    زمن محدود: مرور واحد على near، ومرور واحد على جدول الإزاحات من موضع عشوائي،
+    ثم (إن بقي نقص بسبب minval) إزاحات موجبة أكبر من كل ما سبق.
+    """
+    correct = int(correct)
+    _stats["numeric"] += 1
+    out: List[int] = []
+    taken = {correct}
+
+    def push(v: int):
+        if len(out) < 3 and v not in taken and (minval is None or v >= minval):
+            taken.add(v)
+            out.append(v)
+
+    for v in near:
+        push(int(v))
+    table = tuple(offsets) if offsets else offsets_for(correct)
+    start = rng.randrange(len(table))
+    for k in range(len(table)):
+        if len(out) == 3:
+            break
+        push(correct + table[(start + k) % len(table)])
+    step = max(max(abs(t) for t in table), (minval - correct) if minval is not None else 0)
+    if len(out) < 3:
+        _stats["extended"] += 1
+    while len(out) < 3:  # يكتمل خلال len(near) + 3 دورة على الأكثر
+        step += 1
+        push(correct + step)
+    return out
+
+
+def numeric_options(correct: int, near: Iterable[int] = (), rng: Random = random,
+                    offsets: Optional[Sequence[int]] = None, minval: Optional[int] = None) -> Tuple[List[int], int]:
+    opts = numeric_distractors(correct, near, rng, offsets, minval)
+    rng.shuffle(opts)
+    pos = rng.randrange(4)
+    opts.insert(pos, int(correct))
+    return opts, pos
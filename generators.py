@@ -0,0 +1,324 @@
+# generators.py — مولِّدات أسئلة القدرات (كمي/لفظي/ذكاء) — بلا تيليجرام ولا متغيرات بيئة
+# ----------------------------------------------------------
+# مفصولة عن app.py حتى تستوردها أدوات سطر الأوامر (توليد الشروح مسبقاً، القياس…)
+# كل مولِّد يقبل rng (random.Random): نفس البذرة ← نفس السؤال حرفياً، فالجلسة
+# تحفظ البذرة والمؤشر فقط وتعيد توليد أي سؤال عند الطلب.
+# الأنواع ذات الفضاء المحدود (مرادف/ضد/إكمال، متتاليات الذكاء) تُسحب بلا إعادة
+# عبر تبديل كسول (draw) فلا يتكرر سؤال حتى يُستنفد فضاء نوعه.
+import math, random, zlib
+from random import Random
+from typing import Callable, Dict, List, Optional, Tuple
+
+from question import Question
+from distractors import WordDistractors, fixed_pool, numeric_options, pick_options
+
+# ======================================================
+#                 مولِّدات الأسئلة
+# ======================================================
+def _choice4(correct: int | str, near: List[int | str], rng: Random = random) -> Tuple[List[str], int]:
+    opts, idx = numeric_options(int(correct), near, rng)
+    return [str(o) for o in opts], idx
+
+# ---- كمي ----
+def gen_quant(rng: Random = random) -> Question:
+    t = rng.choice(["arith", "linear", "percent", "pow", "mix"])
+    if t == "arith":
+        a, b = rng.randint(-20, 90), rng.randint(-20, 90)
+        op = rng.choice(["+", "-", "×", "÷"])
+        if op == "+":
+            val = a + b; opts, ans = _choice4(val, [val + rng.choice([-3, -2, -1, 1, 2, 3]), val + 10, val - 10], rng)
+            q = f"احسب: {a} + {b} = ؟"
+        elif op == "-":
+            val = a - b; opts, ans = _choice4(val, [val + rng.choice([-3, -1, 1, 3]), val + 7, val - 7], rng)
+            q = f"احسب: {a} - {b} = ؟"
+        elif op == "×":
+            a, b = rng.randint(2, 20), rng.randint(2, 15)
+            val = a * b; opts, ans = _choice4(val, [val + a, val - b, val + 10], rng)
+            q = f"احسب: {a} × {b} = ؟"
+        else:
+            b = rng.randint(2, 12); val = rng.randint(2, 12); a = b * val
+            opts, ans = _choice4(val, [val + 1, val - 1, val + 2], rng)
+            q = f"احسب: {a} ÷ {b} = ؟"
+        return Question(q, opts, ans, "عمليات حسابية أساسية.")
+
+    if t == "linear":
+        a = rng.randint(2, 9); x = rng.randint(-10, 12); b = rng.randint(-10, 12)
+        c = a * x + b
+        q = f"إذا كان {a}س + {b} = {c}، فما قيمة س؟"
+        opts, ans = _choice4(x, [x + 1, x - 1, x + 2], rng)
+        return Question(q, opts, ans, f"س = ( {c} - {b} ) ÷ {a} = {x}")
+
+    if t == "percent":
+        # y من مضاعفات 100/gcd(x, 100) حتى تكون النسبة عدداً صحيحاً (لا تقريب يصادم المشتّتات)
+        x = rng.choice([5, 10, 12, 15, 20, 25, 30, 40, 50]); step = 100 // math.gcd(x, 100)
+        y = step * rng.randint(-(-20 // step), 200 // step)
+        val = y * x // 100
+        q = f"ما {x}% من {y} ؟"
+        opts, ans = _choice4(val, [val + 5, val - 5, val + 10], rng)
+        return Question(q, opts, ans, f"{x}% × {y} = {val}")
+
+    if t == "pow":
+        base = rng.randint(2, 15); exp = rng.choice([2, 3]); val = base ** exp
+        q = f"قيمة {base}^{exp} = ؟"
+        near = [val + base, val - base, val + 2]
+        opts, ans = _choice4(val, near, rng)
+        return Question(q, opts, ans, f"{base}^{exp} = {val}")
+
+    v = rng.randint(30, 120); t = rng.randint(1, 6); d = v * t
+    q = f"سيارة سرعتها {v} كم/س، سارت {t} ساعات. ما المسافة؟"
+    opts, ans = _choice4(d, [d - 10, d + 10, d + v], rng)
+    return Question(q, opts, ans, "المسافة = السرعة × الزمن.")
+
+# ---- لفظي (قوائم موسّعة) ----
+SYN = [
+    ("يجابه", "يواجه"), ("جلّي", "واضح"), ("ينأى", "يبتعد"), ("يبتكر", "يبدع"),
+    ("محنة", "ابتلاء"), ("ساطع", "لامع"), ("متين", "قوي"), ("ودود", "لطيف"),
+    ("ثابر", "واظب"), ("يعزّز", "يقوّي"), ("يثري", "يغني"), ("رشاقة", "خِفّة"),
+    ("حصيف", "عاقل"), ("طمأنينة", "سكون"), ("حازم", "صارم"), ("يلتزم", "يتقيد"),
+    ("يُجمّل", "يزين"), ("مهارة", "براعة"), ("يستعيد", "يسترجع"), ("موثوق", "جدير بالثقة"),
+    ("جوهر", "لبّ"), ("ملحوظ", "بارز"), ("مُلهم", "مشجّع"), ("يُبرهن", "يثبت")
+]
+ANT = [
+    ("مؤقّت", "دائم"), ("قوي", "ضعيف"), ("وضوح", "غموض"), ("سهل", "صعب"),
+    ("قديم", "حديث"), ("قريب", "بعيد"), ("وفرة", "قلّة"), ("حاضر", "غائب"),
+    ("نجاح", "فشل"), ("يقبل", "يرفض"), ("نظام", "فوضى"), ("انخفاض", "ارتفاع"),
+    ("بارد", "حار"), ("حياة", "موت"), ("نشاط", "خمول"), ("شجاع", "جبان"),
+    ("مفيد", "ضار"), ("نظيف", "متسخ"), ("فرح", "حزن"), ("نادر", "شائع"),
+    ("يمدح", "يذم"), ("اليقين", "الشك"), ("بداية", "نهاية"), ("مباشر", "غير مباشر")
+]
+COMP_SENT = [
+    ("الطالب ____ في الاختبار النهائي.", "تفوق", ["تفوّق", "تأخّر", "تهاون", "انسحب"]),
+    ("كان القرار ____ بعد دراسة مستفيضة.", "صائب", ["صائب", "عشوائي", "مُلتبس", "متسرّع"]),
+    ("يجب _____ الوقت لتحقيق الأهداف.", "استثمار", ["إهدار", "تضييع", "استثمار", "تجميد"]),
+    ("الفكرة ما زالت ____ وتحتاج توضيحًا.", "غامضة", ["واضحة", "غامضة", "قوية", "قديمة"]),
+    ("نجح الفريق بفضل ____ الجهود.", "تكامل", ["تفكك", "تكاسل", "تكامل", "تباعد"]),
+    ("أظهرت التجربة ____ الفرضية.", "صحة", ["سقوط", "صحة", "ضعف", "غموض"]),
+    ("القراءة اليومية ____ المفردات.", "تثري", ["تضعف", "تثري", "تبدد", "تقلل"]),
+    ("بعد النقاش، وصلنا إلى ____ مشتركة.", "رؤية", ["رؤية", "فوضى", "تردد", "خلاف"]),
+    ("الخبر اليقين أفضل من ____ الشائعات.", "غموض", ["وضوح", "غموض", "انتشار", "قدم"]),
+    ("الطالب المجتهد ____ خطته أسبوعيًا.", "يراجع", ["يهمل", "يراجع", "ينسى", "يتجاهل"]),
+    ("من الضروري ____ الأخطاء لتجنّب تكرارها.", "تحليل", ["تحليل", "إنكار", "إهمال", "تجاهل"]),
+    ("النتيجة كانت ____ للتوقعات.", "مطابقة", ["متأخرة", "مخالفة", "مطابقة", "غامضة"]),
+    ("لا تعتمد على ____ دون دليل.", "الانطباع", ["الانطباع", "البرهان", "المثال", "الشرح"]),
+    ("البيانات تُقدَّم بصورة ____ وواضحة.", "منظّمة", ["عشوائية", "منظّمة", "سطحية", "ناقصة"]),
+    ("نحتاج إلى ____ دقيقة قبل الاختبار.", "مراجعة", ["مراجعة", "تسلية", "إهمال", "تشتيت"]),
+]
+
+# مشتّتات محسوبة عند الاستيراد: كل إجابات المرادف/الضد قاموس واحد، ولكل جملة إكمال خياراتها
+WORDS = WordDistractors([b for _, b in SYN] + [b for _, b in ANT])
+CLOZE_POOLS = [fixed_pool(correct, opts) for _, correct, opts in COMP_SENT]
+
+def _syn_q(a: str) -> str:
+    return f"مرادف «{a}» هو:"
+
+def _ant_q(a: str) -> str:
+    return f"ضدّ «{a}» هو:"
+
+def verbal_space():
+    """كل أسئلة المرادف/الضد/الإكمال الممكنة: (النوع، نص السؤال، الإجابة الصحيحة)."""
+    for a, b in SYN:
+        yield "syn", _syn_q(a), b
+    for a, b in ANT:
+        yield "ant", _ant_q(a), b
+    for s, correct, _ in COMP_SENT:
+        yield "cloze", s, correct
+
+# كل نوع: دالة (rng, i=None) — i يحدد السؤال داخل فضاء النوع (بلا تكرار)،
+# و None يعني سحباً عشوائياً كالسابق. KINDS أدناه تعلن حجم كل فضاء.
+def _pick(seq, rng: Random, i: Optional[int]):
+    return seq[rng.randrange(len(seq)) if i is None else i]
+
+def _params(rng: Random, i: Optional[int], *dims) -> tuple:
+    """معاملات النوع: سحب عشوائي من كل بُعد، أو فكّ i بأساس مختلط."""
+    if i is None:
+        return tuple(rng.choice(d) for d in dims)
+    out = []
+    for d in reversed(dims):
+        i, r = divmod(i, len(d))
+        out.append(d[r])
+    return tuple(reversed(out))
+
+def _space(*dims) -> int:
+    return math.prod(len(d) for d in dims)
+
+def _v_syn(rng: Random = random, i: Optional[int] = None) -> Question:
+    a, b = _pick(SYN, rng, i)
+    opts, idx = WORDS.options(b, rng)
+    return Question(_syn_q(a), opts, idx, f"مرادف «{a}» = «{b}».")
+
+def _v_ant(rng: Random = random, i: Optional[int] = None) -> Question:
+    a, b = _pick(ANT, rng, i)
+    opts, idx = WORDS.options(b, rng)
+    return Question(_ant_q(a), opts, idx, f"ضدّ «{a}» = «{b}».")
+
+def _v_analogy(rng: Random = random, i: Optional[int] = None) -> Question:
+    # الفضاء: كل أزواج (مرادف، مرادف) ثم كل أزواج (ضد، ضد)
+    if i is None:
+        table = SYN if rng.random() < 0.5 else ANT
+        (a, b), (c, d) = rng.choice(table), rng.choice(table)
+    else:
+        table = SYN if i < len(SYN) ** 2 else ANT
+        if table is ANT:
+            i -= len(SYN) ** 2
+        (a, b), (c, d) = _params(rng, i, table, table)
+    q = f"{a} : {b} :: {c} : ؟"
+    opts, idx = WORDS.options(d, rng)
+    return Question(q, opts, idx, "حافظ على نوع العلاقة يمين التشبيه.")
+
+def _v_cloze(rng: Random = random, i: Optional[int] = None) -> Question:
+    i = rng.randrange(len(COMP_SENT)) if i is None else i
+    s, correct, _ = COMP_SENT[i]
+    opts, idx = pick_options(correct, CLOZE_POOLS[i], rng)
+    return Question(s, opts, idx, f"الكلمة الأنسب: «{correct}».")
+
+def gen_verbal(rng: Random = random) -> Question:
+    kind = rng.choice(list(VERBAL_KINDS))
+    return VERBAL_KINDS[kind][1](rng)
+
+# ---- ذكاء ----
+AR_LETTERS = list("ابتثجحخدذرزسشصضطظعغفقكلمنهوي")
+
+ARITH_SEQ = (range(1, 16), range(2, 10))                 # a, d
+GEOM_SEQ  = (range(1, 7), (2, 3, 4))                     # a, r
+ALT_SEQ   = (range(5, 21), range(2, 7), range(7, 13))    # a, d1, d2
+LETTER_SEQ = [(step, start) for step in (1, 2, 3) for start in range(len(AR_LETTERS) - 5 * step)]
+SQUARES   = (range(2, 7),)                               # s
+FIBO      = (range(1, 5), range(1, 5))                   # a, b
+MIX_OPS   = (range(2, 7), (2, 3), range(2, 10))          # a, b, x
+
+def _iq_arith_seq(rng: Random = random, i: Optional[int] = None) -> Question:
+    a, d = _params(rng, i, *ARITH_SEQ)
+    n = [a + k * d for k in range(5)]; ans = n[-1] + d
+    opts, idx = _choice4(ans, [ans + d, ans - d, ans + 2], rng)
+    return Question(f"أكمل المتتالية: {', '.join(map(str, n))}, ؟", opts, idx, f"فرق ثابت = {d}")
+
+def _iq_geom_seq(rng: Random = random, i: Optional[int] = None) -> Question:
+    a, r = _params(rng, i, *GEOM_SEQ)
+    n = [a * (r ** k) for k in range(4)]; ans = n[-1] * r
+    opts, idx = _choice4(ans, [ans * r, ans // r if ans % r == 0 else ans - 1, ans + r], rng)
+    return Question(f"أكمل: {', '.join(map(str, n))}, ؟", opts, idx, f"متضاعف بنسبة {r}")
+
+def _iq_alt_seq(rng: Random = random, i: Optional[int] = None) -> Question:
+    a, d1, d2 = _params(rng, i, *ALT_SEQ)
+    seq = [a, a + d1, a + d1 + d2, a + 2 * d1 + d2, a + 2 * d1 + 2 * d2]
+    ans = a + 3 * d1 + 2 * d2
+    opts, idx = _choice4(ans, [ans + d1, ans + d2, ans - 1], rng)
+    return Question(f"نمط متناوب (+{d1}, +{d2}): {', '.join(map(str, seq))}, ؟", opts, idx, "يزيد مرّة d1 ثم d2 بالتناوب.")
+
+def _iq_letter_seq(rng: Random = random, i: Optional[int] = None) -> Question:
+    step, start = _pick(LETTER_SEQ, rng, i)
+    seq = [AR_LETTERS[start + k * step] for k in range(5)]
+    nxt_index = start + 5 * step; nxt = AR_LETTERS[nxt_index]
+    candidates = [k for k in range(len(AR_LETTERS)) if k != nxt_index]
+    wrong_idx = rng.sample(candidates, 3)
+    opts = [nxt] + [AR_LETTERS[k] for k in wrong_idx]; rng.shuffle(opts)
+    return Question(f"أكمل: {'، '.join(seq)}, ؟", opts, opts.index(nxt), f"زيادة ثابتة بالحروف بمقدار {step}.")
+
+def _iq_squares(rng: Random = random, i: Optional[int] = None) -> Question:
+    (s,) = _params(rng, i, *SQUARES)
+    seq = [k * k for k in range(s, s + 4)]
+    ans = (s + 4) ** 2
+    opts, idx = _choice4(ans, [ans + (2 * s + 1), ans - (2 * s + 1), ans + 4], rng)
+    return Question(f"مربعات: {', '.join(map(str, seq))}, ؟", opts, idx, "أنماط n².")
+
+def _iq_fibo(rng: Random = random, i: Optional[int] = None) -> Question:
+    a, b = _params(rng, i, *FIBO)
+    seq = [a, b]
+    for _ in range(3): seq.append(seq[-1] + seq[-2])
+    ans = seq[-1] + seq[-2]
+    opts, idx = _choice4(ans, [ans + seq[-3], ans - 1, ans + 2], rng)
+    return Question(f"فيبوناتشي: {', '.join(map(str, seq))}, ؟", opts, idx, "كل حد = مجموع السابقين.")
+
+def _iq_mix_ops(rng: Random = random, i: Optional[int] = None) -> Question:
+    a, b, x = _params(rng, i, *MIX_OPS)
+    seq = [x, x + a, (x + a) * b, (x + a) * b + a, ((x + a) * b + a) * b]
+    ans = seq[-1] + a
+    opts, idx = _choice4(ans, [ans + a, ans * b, ans - 1], rng)
+    return Question(f"نمط (+{a} ثم ×{b}): {', '.join(map(str, seq))}, ؟", opts, idx, f"يتناوب +{a} ثم ×{b}.")
+
+def gen_iq(rng: Random = random) -> Question:
+    kind = rng.choice(list(IQ_KINDS))
+    return IQ_KINDS[kind][1](rng)
+
+# ======================================================
+#        فضاءات الأنواع + سحب بلا إعادة داخل الجلسة
+# ======================================================
+Kind = Tuple[Optional[int], Callable[..., Question]]  # (حجم الفضاء أو None = غير محدود، المولِّد)
+
+QUANT_KINDS: Dict[str, Kind] = {
+    "mixed": (None, lambda rng=random, i=None: gen_quant(rng)),
+}
+VERBAL_KINDS: Dict[str, Kind] = {
+    "syn":     (len(SYN), _v_syn),
+    "ant":     (len(ANT), _v_ant),
+    "analogy": (len(SYN) ** 2 + len(ANT) ** 2, _v_analogy),
+    "cloze":   (len(COMP_SENT), _v_cloze),
+}
+IQ_KINDS: Dict[str, Kind] = {
+    "arith_seq":  (_space(*ARITH_SEQ), _iq_arith_seq),
+    "geom_seq":   (_space(*GEOM_SEQ), _iq_geom_seq),
+    "alt_seq":    (_space(*ALT_SEQ), _iq_alt_seq),
+    "letter_seq": (len(LETTER_SEQ), _iq_letter_seq),
+    "squares":    (_space(*SQUARES), _iq_squares),
+    "fibo":       (_space(*FIBO), _iq_fibo),
+    "mix_ops":    (_space(*MIX_OPS), _iq_mix_ops),
+}
+KINDS: Dict[str, Dict[str, Kind]] = {"quant": QUANT_KINDS, "verbal": VERBAL_KINDS, "iq": IQ_KINDS}
+
+_M64 = (1 << 64) - 1
+
+def _mix64(x: int) -> int:
+    """splitmix64: خلط سريع لبت 64."""
+    x = (x + 0x9E3779B97F4A7C15) & _M64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _M64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _M64
+    return x ^ (x >> 31)
+
+def lazy_perm(i: int, n: int, key: int) -> int:
+    """العنصر رقم i من تبديل عشوائي لـ range(n) يحدده key — بلا تخزين.
+
+    شبكة Feistel بأربع جولات على أصغر مجال 2^k ≥ n، مع cycle-walking لما يتجاوز n.
+    """
+    if n <= 1:
+        return 0
+    bits = max(2, (n - 1).bit_length())
+    bits += bits & 1
+    half = bits // 2
+    mask = (1 << half) - 1
+    x = i
+    while True:
+        left, right = x >> half, x & mask
+        for rnd in range(4):
+            left, right = right, left ^ (_mix64(right ^ (key + rnd * 0x632BE59BD9B4E019) & _M64) & mask)
+        x = (left << half) | right
+        if x < n:
+            return x
+
+def kind_key(seed: int, kind: str) -> int:
+    return _mix64((seed << 32) ^ zlib.crc32(kind.encode("utf-8")))
+
+def plan(cat: str, seed: int, idx: int, attempt: int, cursors: Dict[str, int]) -> Tuple[str, Random, Optional[int]]:
+    """(النوع، rng، رقم العنصر داخل فضائه أو None للسحب العشوائي) لسؤال الجلسة الحالي.
+
+    نوع عشوائي من الأنواع غير المستنفدة، ثم العنصر التالي من تبديل فضائه.
+    cursors: كم سُحب من كل نوع محدود حتى الآن (يزيده المستدعي عند استهلاك السؤال).
+    بعد استنفاد الأنواع المحدودة يبقى غير المحدود؛ وإن لم يوجد نعود للسحب العشوائي.
+    """
+    kinds = KINDS[cat]
+    rng = Random((seed << 40) | (idx << 12) | (attempt & 0xFFF))
+    live = [k for k, (size, _) in kinds.items() if size is None or cursors.get(k, 0) < size]
+    if not live:
+        return rng.choice(list(kinds)), rng, None
+    kind = rng.choice(live)
+    size = kinds[kind][0]
+    if size is None:
+        return kind, rng, None
+    return kind, rng, lazy_perm(cursors.get(kind, 0), size, kind_key(seed, kind))
+
+def build_item(cat: str, kind: str, rng: Random, i: Optional[int]) -> Question:
+    fn = KINDS[cat][kind][1]
+    return fn(rng) if i is None else fn(rng, i)
+
+def draw(cat: str, seed: int, idx: int, attempt: int, cursors: Dict[str, int]) -> Tuple[str, Question]:
+    kind, rng, i = plan(cat, seed, idx, attempt, cursors)
+    return kind, build_item(cat, kind, rng, i)
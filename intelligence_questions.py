@@ -1,71 +1,92 @@
 # intelligence_questions.py — مثل السابق لكن بمُعرّف "iq|"
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-import random
+
+import qbank
+import quizview
+from question import Question
 
 QUESTIONS = [
-    {"q": "ما هو الشيء الذي كلما أخذت منه كبر؟", "options": ["الحفرة", "البئر", "الجبل", "البحر"], "answer_idx": 0},
-    {"q": "ما هو الشيء الذي يمشي ويقف وليس له أرجل؟", "options": ["الساعة", "النهر", "السيارة", "القطار"], "answer_idx": 0},
-    {"q": "له عين واحدة ولا يرى؟", "options": ["الإبرة", "العمود", "القلم", "المسمار"], "answer_idx": 0},
-    {"q": "ما هو الشيء الذي يرتفع ولا ينزل؟", "options": ["الدخان", "العمر", "البالون", "الصاروخ"], "answer_idx": 1},
-    {"q": "ما الذي يتكلم جميع لغات العالم؟", "options": ["صدى الصوت", "اللسان", "القاموس", "الترجمة"], "answer_idx": 0},
+    Question("ما هو الشيء الذي كلما أخذت منه كبر؟", ["الحفرة", "البئر", "الجبل", "البحر"], 0),
+    Question("ما هو الشيء الذي يمشي ويقف وليس له أرجل؟", ["الساعة", "النهر", "السيارة", "القطار"], 0),
+    Question("له عين واحدة ولا يرى؟", ["الإبرة", "العمود", "القلم", "المسمار"], 0),
+    Question("ما هو الشيء الذي يرتفع ولا ينزل؟", ["الدخان", "العمر", "البالون", "الصاروخ"], 1),
+    Question("ما الذي يتكلم جميع لغات العالم؟", ["صدى الصوت", "اللسان", "القاموس", "الترجمة"], 0),
 ]
 
+QUIZ_LEN = 5
+_bank = None
+
+
+def _get_bank() -> qbank.QBank:
+    """بنك الفئة: ملف QBANK_PATH المشترك إن احتواها، وإلا القائمة أعلاه."""
+    global _bank
+    if _bank is None:
+        _bank = qbank.bank_for("intelligence", QUESTIONS)
+    return _bank
+
 def _ensure_quiz(context: ContextTypes.DEFAULT_TYPE) -> dict:
-    if "iq_quiz" not in context.user_data:
-        context.user_data["iq_quiz"] = {
+    bank = _get_bank()
+    q = context.user_data.get("iq_quiz")
+    if q is None or q.get("bank") != bank.tag:
+        # الجلسة تحفظ أرقام البنود فقط؛ بنك مختلف (أعيد بناؤه) ⇒ جلسة جديدة
+        q = context.user_data["iq_quiz"] = {
             "score": 0,
             "idx": 0,
-            "qs": random.sample(QUESTIONS, min(5, len(QUESTIONS))),
+            "ids": bank.sample("intelligence", QUIZ_LEN),
+            "bank": bank.tag,
         }
-    return context.user_data["iq_quiz"]
+    return q
 
 async def start_intelligence_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     context.user_data.pop("iq_quiz", None)
     _ensure_quiz(context)
     await _send_iq_question(update, context)
 
-async def _send_iq_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+def _next_view(context: ContextTypes.DEFAULT_TYPE):
+    """(نص السؤال التالي، أزراره) أو (النتيجة النهائية، None) مع إنهاء الجلسة."""
     q = _ensure_quiz(context)
-    if q["idx"] >= len(q["qs"]):
-        await update.effective_message.reply_text(
-            f"انتهى اختبار الذكاء! نتيجتك: {q['score']} من {len(q['qs'])}."
-        )
+    if q["idx"] >= len(q["ids"]):
         context.user_data.pop("iq_quiz", None)
-        return
+        return f"انتهى اختبار الذكاء! نتيجتك: {q['score']} من {len(q['ids'])}.", None
 
-    cur = q["qs"][q["idx"]]
+    cur = _get_bank().get(q["ids"][q["idx"]])
     buttons = [
         [InlineKeyboardButton(opt, callback_data=f"iq|{i}")]
-        for i, opt in enumerate(cur["options"])
+        for i, opt in enumerate(cur.options)
     ]
-    await update.effective_message.reply_text(
-        f"سؤال الذكاء {q['idx']+1}: {cur['q']}",
-        reply_markup=InlineKeyboardMarkup(buttons),
-    )
+    return f"سؤال الذكاء {q['idx']+1}: {cur.question}", InlineKeyboardMarkup(buttons)
+
+async def _send_iq_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    text, kb = _next_view(context)
+    await update.effective_message.reply_text(text, reply_markup=kb)
 
 async def handle_intelligence_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     q = _ensure_quiz(context)
     query = update.callback_query
     await query.answer()
 
-    if q["idx"] >= len(q["qs"]):
+    if q["idx"] >= len(q["ids"]):
         await query.edit_message_text("الجلسة انتهت. ارسل «أسئلة الذكاء (300 سؤال)» للبدء من جديد.")
         context.user_data.pop("iq_quiz", None)
         return
 
-    cur = q["qs"][q["idx"]]
+    cur = _get_bank().get(q["ids"][q["idx"]])
     try:
         chosen = int(query.data.split("|", 1)[1])
     except Exception:
         chosen = -1
 
-    if chosen == cur["answer_idx"]:
+    if chosen == cur.answer_index:
         q["score"] += 1
-        await query.edit_message_text(f"✔️ إجابة صحيحة! نتيجتك الآن: {q['score']}")
+        feedback = f"✔️ إجابة صحيحة! نتيجتك الآن: {q['score']}"
     else:
-        correct = cur["options"][cur["answer_idx"]]
-        await query.edit_message_text(f"❌ إجابة خاطئة. الصحيحة: {correct}. نتيجتك الآن: {q['score']}")
+        correct = cur.answer
+        feedback = f"❌ إجابة خاطئة. الصحيحة: {correct}. نتيجتك الآن: {q['score']}"
 
     q["idx"] += 1
+    if quizview.inplace(context):
+        await quizview.show(query, feedback, *_next_view(context))
+        return
+    await query.edit_message_text(feedback)
     await _send_iq_question(update, context)
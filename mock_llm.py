@@ -0,0 +1,201 @@
+# mock_llm.py — خادم محلي وهمي متوافق مع OpenAI (/v1/chat/completions) لاختبار الحمل
+# ----------------------------------------------------------
+# بلا أي تكلفة: زمن استجابة بتوزيع log-normal قابل للضبط، بثّ SSE،
+# نسبة أخطاء 500 وحقن 429 مع Retry-After. يحفظ الاتصالات (keep-alive)
+# ويعدّها، فنقيس أثر تجمّع الاتصالات والكاش والتراجع قبل كل نشر.
+#
+# الاستخدام:
+#   python mock_llm.py --port 8088 --latency 0.8 --sigma 0.5 --error-rate 0.02 --rate-429 0.05
+#   ثم: AI_BASE_URL=http://127.0.0.1:8088/v1 AI_API_KEY=mock python app.py
+import re, sys, json, math, time, random, asyncio, argparse, logging
+from typing import Any, Dict, Optional, Tuple
+
+log = logging.getLogger("mock-llm")
+
+_ITEM_RE = re.compile(r"\[\[(\d+)\]\]")
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+class MockLLM:
+    def __init__(self, latency: float = 0.5, sigma: float = 0.4, error_rate: float = 0.0,
+                 rate_429: float = 0.0, retry_after: float = 1.0, tokens_per_sec: float = 60.0,
+                 answer_words: int = 60, seed: Optional[int] = None):
+        self.latency = latency            # الوسيط (ث) لزمن أول بايت
+        self.sigma = sigma                # انتشار log-normal (ذيل p95/p99)
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.tokens_per_sec = tokens_per_sec
+        self.answer_words = answer_words
+        self.rng = random.Random(seed)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.stats: Dict[str, Any] = {"connections": 0, "requests": 0, "streams": 0, "status": {}}
+
+    # ----- دورة الحياة -----
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._server = await asyncio.start_server(self._handle_conn, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}/v1"
+        return self.url
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    # ----- HTTP/1.1 بسيط مع keep-alive -----
+    async def _handle_conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats["connections"] += 1
+        try:
+            while True:
+                req = await self._read_request(reader)
+                if req is None:
+                    break
+                method, path, headers, body = req
+                self.stats["requests"] += 1
+                keep = headers.get("connection", "").lower() != "close"
+                await self._dispatch(writer, method, path, body)
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass  # إيقاف الخادم واتصال keep-alive ما زال مفتوحاً
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        method, path, _ = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+        body = await reader.readexactly(int(headers.get("content-length", "0") or 0))
+        return method, path, headers, body
+
+    def _count(self, status: int):
+        self.stats["status"][status] = self.stats["status"].get(status, 0) + 1
+
+    async def _send(self, writer, status: int, payload: Any, extra: Optional[Dict[str, str]] = None):
+        self._count(status)
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        hdrs = {"Content-Type": "application/json", "Content-Length": str(len(body))}
+        hdrs.update(extra or {})
+        head = f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in hdrs.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+    async def _dispatch(self, writer, method: str, path: str, body: bytes):
+        if method == "GET" and path.rstrip("/").endswith("/stats"):
+            await self._send(writer, 200, self.stats)
+            return
+        if method != "POST" or not path.rstrip("/").endswith("/chat/completions"):
+            await self._send(writer, 404, {"error": {"message": "not found"}})
+            return
+        try:
+            req = json.loads(body or b"{}")
+        except ValueError:
+            await self._send(writer, 400, {"error": {"message": "bad json"}})
+            return
+
+        # الأخطاء المحقونة تُقرَّر قبل الانتظار (كما يفعل مزوّد يرفض فوراً)
+        roll = self.rng.random()
+        if roll < self.rate_429:
+            await self._send(writer, 429, {"error": {"message": "Rate limit reached", "type": "rate_limit"}},
+                             {"Retry-After": f"{self.retry_after:g}"})
+            return
+        await asyncio.sleep(self._ttft())
+        if roll < self.rate_429 + self.error_rate:
+            await self._send(writer, 500, {"error": {"message": "mock upstream failure", "type": "server_error"}})
+            return
+
+        text = self._answer(req)
+        if req.get("stream"):
+            await self._stream(writer, req, text)
+        else:
+            await asyncio.sleep(len(text.split()) / self.tokens_per_sec)
+            await self._send(writer, 200, self._completion(req, text))
+
+    def _ttft(self) -> float:
+        if self.latency <= 0:
+            return 0.0
+        return self.latency * math.exp(self.rng.gauss(0, self.sigma))
+
+    def _answer(self, req: Dict[str, Any]) -> str:
+        msgs = req.get("messages") or []
+        last = next((m.get("content", "") for m in reversed(msgs) if m.get("role") == "user"), "")
+        words = " ".join(["شرح"] * max(1, self.answer_words))
+        items = _ITEM_RE.findall(last)
+        if items:  # طلب دفعة «اشرح أكثر»: بند لكل علامة
+            return "\n".join(f"[[{n}]]\n{words}" for n in items)
+        return f"إجابة تجريبية عن: {last[:60]}\n{words}"
+
+    def _completion(self, req, text: str) -> Dict[str, Any]:
+        return {
+            "id": f"mock-{self.stats['requests']}", "object": "chat.completion", "created": int(time.time()),
+            "model": req.get("model", "mock"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(text.split()), "total_tokens": len(text.split())},
+        }
+
+    async def _stream(self, writer, req, text: str):
+        self._count(200)
+        self.stats["streams"] += 1
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+
+        async def chunk(obj: Any):
+            data = ("data: " + (obj if isinstance(obj, str) else json.dumps(obj, ensure_ascii=False)) + "\n\n").encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+
+        base = {"id": f"mock-{self.stats['requests']}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": req.get("model", "mock")}
+        delay = 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0
+        for word in text.split(" "):
+            await chunk(dict(base, choices=[{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]))
+            if delay:
+                await asyncio.sleep(delay)
+        await chunk(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        await chunk("[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="خادم LLM وهمي متوافق مع OpenAI")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8088)
+    ap.add_argument("--latency", type=float, default=0.5, help="وسيط زمن أول بايت (ث)")
+    ap.add_argument("--sigma", type=float, default=0.4, help="انتشار log-normal")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--retry-after", type=float, default=1.0)
+    ap.add_argument("--tokens-per-sec", type=float, default=60.0)
+    ap.add_argument("--answer-words", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+
+    async def run():
+        mock = MockLLM(args.latency, args.sigma, args.error_rate, args.rate_429, args.retry_after,
+                       args.tokens_per_sec, args.answer_words, args.seed)
+        url = await mock.start(args.host, args.port)
+        log.info("mock LLM on %s", url)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+# outbound.py — جدولة الرسائل الصادرة إلى تلغرام (حدود عامة/لكل محادثة/لكل مجموعة)
+# ----------------------------------------------------------
+# لا شيء كان يشكّل الإرسال: أجزاء إجابات AI (4000 حرف) تُرسل متلاحقة، ونتيجة الاختبار
+# والسؤال التالي فورية، فتحت الضغط نصطدم بـ 429 وتضيف إعادات PTB ثوانيَ.
+# OutboundScheduler هو rate_limiter لـ PTB (يمر به كل نداء للبوت):
+# - دلاء رموز: عامة OUTBOUND_GLOBAL_RATE/ث، لكل محادثة خاصة OUTBOUND_CHAT_RATE/ث،
+#   لكل مجموعة OUTBOUND_GROUP_PER_MIN/دقيقة.
+# - أولويات: QUIZ (تعديلات ورسائل بأزرار إجابة) ← NORMAL ← BULK (أجزاء/بث AI عبر priority()).
+#   الأعلى أولوية يُمنح أولاً ما دامت محادثته ضمن حدها؛ محادثة مقيّدة لا تحجب غيرها.
+# - دمج التعديلات: تعديل جديد لنفس الرسالة وهو ما زال في الطابور يحل محل القديم في مكانه،
+#   ويعيد للمستدعي القديم نتيجة الجديد.
+# - RetryAfter: توقف المحادثة (أو الكل إن لم تكن هناك محادثة) المدة المطلوبة ثم إعادة.
+# - answerCallbackQuery وغير الرسائل (getMe، setWebhook، sendChatAction…) لا تُقيّد.
+import os, time, asyncio, logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from ai_governor import TokenBucket
+
+OUTBOUND_SCHEDULER    = os.environ.get("OUTBOUND_SCHEDULER", "1") == "1"
+OUTBOUND_GLOBAL_RATE  = float(os.environ.get("OUTBOUND_GLOBAL_RATE", "30"))   # رسالة/ث لكل البوت
+OUTBOUND_CHAT_RATE    = float(os.environ.get("OUTBOUND_CHAT_RATE", "1"))      # رسالة/ث لكل محادثة خاصة
+OUTBOUND_CHAT_BURST   = float(os.environ.get("OUTBOUND_CHAT_BURST", "3"))     # نتيجة + سؤال تالٍ بلا انتظار
+OUTBOUND_GROUP_PER_MIN = float(os.environ.get("OUTBOUND_GROUP_PER_MIN", "20"))
+OUTBOUND_RETRIES      = int(os.environ.get("OUTBOUND_RETRIES", "3"))          # إعادات بعد RetryAfter
+
+QUIZ, NORMAL, BULK = 0, 1, 2
+PRIORITY_NAMES = ("quiz", "normal", "bulk")
+
+_LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
+_UNLIMITED = ("sendChatAction",)
+_COALESCE = ("editMessageText", "editMessageReplyMarkup", "editMessageCaption")
+
+_priority: ContextVar[Optional[int]] = ContextVar("outbound_priority", default=None)
+
+log = logging.getLogger(__name__)
+
+
+@contextmanager
+def priority(level: int):
+    """كل ما يُرسل داخل الكتلة بهذه الأولوية (مثلاً BULK لأجزاء إجابات AI)."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _percentile(xs: Deque[float], p: float) -> Optional[float]:
+    if not xs:
+        return None
+    s = sorted(xs)
+    return s[min(len(s) - 1, int(p * len(s)))]
+
+
+class _Entry:
+    __slots__ = ("prio", "chat", "group", "key", "enqueued", "grant", "followers")
+
+    def __init__(self, prio: int, chat: Any, group: bool, key: Optional[Tuple]):
+        self.prio = prio
+        self.chat = chat
+        self.group = group
+        self.key = key
+        self.enqueued = time.monotonic()
+        self.grant: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.followers: List[asyncio.Future] = []   # مستدعون دُمجت تعديلاتهم في هذا
+
+
+class OutboundScheduler(BaseRateLimiter):
+    def __init__(self, global_rate: float = OUTBOUND_GLOBAL_RATE, chat_rate: float = OUTBOUND_CHAT_RATE,
+                 chat_burst: float = OUTBOUND_CHAT_BURST, group_per_min: float = OUTBOUND_GROUP_PER_MIN,
+                 retries: int = OUTBOUND_RETRIES):
+        self.global_ = TokenBucket(global_rate, max(1.0, global_rate))
+        self.chats = TokenBucket(chat_rate, chat_burst)
+        self.groups = TokenBucket(group_per_min / 60, group_per_min)
+        self.retries = retries
+        self._queues: Tuple[Deque[_Entry], ...] = (deque(), deque(), deque())
+        self._by_key: Dict[Tuple, _Entry] = {}
+        self._paused: Dict[Any, float] = {}     # محادثة ← حتى (monotonic)؛ None = الكل
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._waits: Tuple[Deque[float], ...] = tuple(deque(maxlen=500) for _ in PRIORITY_NAMES)
+        self.sent = [0, 0, 0]
+        self.immediate = 0
+        self.coalesced = 0
+        self.retry_after = 0
+        self.peak_depth = 0
+
+    # ===== دورة الحياة (يستدعيها Application عبر البوت) =====
+    async def initialize(self) -> None:
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for q in self._queues:  # ما بقي يُرسل بلا تقييد بدل أن يضيع
+            while q:
+                e = q.popleft()
+                if not e.grant.done():
+                    e.grant.set_result(None)
+        self._by_key.clear()
+
+    # ===== التصنيف =====
+    @staticmethod
+    def _classify(endpoint: str, data: Dict[str, Any], rate_limit_args: Any) -> Optional[int]:
+        if endpoint in _UNLIMITED or not endpoint.startswith(_LIMITED_PREFIXES):
+            return None
+        if isinstance(rate_limit_args, int):
+            return min(BULK, max(QUIZ, rate_limit_args))
+        level = _priority.get()
+        if level is not None:
+            return level
+        if endpoint.startswith("edit") or isinstance(data.get("reply_markup"), InlineKeyboardMarkup):
+            return QUIZ
+        return NORMAL
+
+    def _ready_in(self, chat: Any, group: bool, now: float) -> float:
+        wait = self._paused.get(chat, 0.0) - now
+        if chat is None:
+            return max(0.0, wait)
+        bucket = self.groups if group else self.chats
+        return max(0.0, wait, bucket.peek(chat))
+
+    def _take(self, chat: Any, group: bool):
+        self.global_.take(None)
+        if chat is not None:
+            (self.groups if group else self.chats).take(chat)
+
+    def _depth(self) -> int:
+        return sum(len(q) for q in self._queues)
+
+    # ===== المُوزِّع =====
+    def _pick(self, now: float) -> Tuple[Optional[_Entry], Optional[float]]:
+        soonest: Optional[float] = None
+        for q in self._queues:
+            for e in q:
+                w = self._ready_in(e.chat, e.group, now)
+                if w == 0:
+                    return e, None
+                soonest = w if soonest is None else min(soonest, w)
+        return None, soonest
+
+    def _dispatch(self) -> Optional[float]:
+        """يمنح كل ما يمكن الآن؛ يعيد الثواني حتى فرصة المنح التالية (None = الطابور فارغ)."""
+        while self._depth():
+            now = time.monotonic()
+            stop = max(self._paused.get(None, 0.0) - now, self.global_.peek(None))
+            if stop > 0:
+                return stop
+            e, wait = self._pick(now)
+            if e is None:
+                return wait
+            self._queues[e.prio].remove(e)
+            if e.key is not None and self._by_key.get(e.key) is e:
+                del self._by_key[e.key]
+            self._take(e.chat, e.group)
+            self._waits[e.prio].append(now - e.enqueued)
+            if not e.grant.done():
+                e.grant.set_result(None)
+        return None
+
+    async def _run(self):
+        while True:
+            try:
+                delay = self._dispatch()
+            except Exception:
+                log.exception("outbound dispatch failed")
+                delay = 1.0
+            self._wake.clear()
+            if delay is None:
+                await self._wake.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            now = time.monotonic()
+            for chat in [c for c, t in self._paused.items() if t <= now]:
+                del self._paused[chat]
+
+    # ===== الطابور =====
+    def _enqueue(self, e: _Entry) -> Optional[_Entry]:
+        """يضيف e؛ إن وُجد تعديل أقدم لنفس الرسالة يأخذ e مكانه ويُعاد القديم (صار تابعاً)."""
+        old = self._by_key.get(e.key) if e.key is not None else None
+        if old is not None and not old.grant.done():
+            q = self._queues[old.prio]
+            if e.prio >= old.prio:  # مكان القديم في طابوره (لا يتأخر التعديل بسبب الدمج)
+                q[q.index(old)] = e
+                e.prio = old.prio
+                e.enqueued = old.enqueued
+            else:
+                q.remove(old)
+                self._queues[e.prio].append(e)
+            e.followers = old.followers
+            self._by_key[e.key] = e
+            self.coalesced += 1
+            return old
+        self._queues[e.prio].append(e)
+        if e.key is not None:
+            self._by_key[e.key] = e
+        self.peak_depth = max(self.peak_depth, self._depth())
+        self._wake.set()
+        return None
+
+    async def _turn(self, prio: int, chat: Any, group: bool, key: Optional[Tuple]
+                    ) -> Tuple[Optional[asyncio.Future], List[asyncio.Future]]:
+        """ينتظر دور الإرسال. يعيد (Future نتيجة التعديل الأحدث إن دُمج هذا فيه، مستدعين دُمجوا في هذا)."""
+        if self._wake is None:  # قبل initialize (أو بعد shutdown): بلا جدولة
+            return None, []
+        now = time.monotonic()
+        if not self._depth() and max(self._paused.get(None, 0.0) - now, self.global_.peek(None)) <= 0 \
+                and self._ready_in(chat, group, now) == 0:
+            self._take(chat, group)
+            self._waits[prio].append(0.0)
+            self.immediate += 1
+            return None, []
+        e = _Entry(prio, chat, group, key)
+        old = self._enqueue(e)
+        if old is not None:
+            fut = asyncio.get_running_loop().create_future()
+            e.followers.append(fut)
+            old.grant.set_result(fut)  # يوقظ المستدعي القديم ليتبع الجديد
+        try:
+            return await e.grant, e.followers
+        except asyncio.CancelledError:
+            self._drop(e)
+            raise
+
+    def _drop(self, e: _Entry):
+        q = self._queues[e.prio]
+        if e in q:
+            q.remove(e)
+        if e.key is not None and self._by_key.get(e.key) is e:
+            del self._by_key[e.key]
+        for f in e.followers:
+            f.cancel()
+
+    # ===== نقطة دخول PTB =====
+    async def process_request(self, callback: Callable, args: Any, kwargs: Dict[str, Any], endpoint: str,
+                              data: Dict[str, Any], rate_limit_args: Any):
+        prio = self._classify(endpoint, data, rate_limit_args)
+        if prio is None:
+            return await callback(*args, **kwargs)
+        chat = data.get("chat_id")
+        group = isinstance(chat, str) or (isinstance(chat, int) and chat < 0)
+        key = None
+        if endpoint in _COALESCE and chat is not None and data.get("message_id") is not None:
+            key = (endpoint, chat, data["message_id"])
+
+        followers: List[asyncio.Future] = []
+        for attempt in range(self.retries + 1):
+            follow, joined = await self._turn(prio, chat, group, key)
+            if follow is not None:  # دُمج في تعديل أحدث: نتيجته هي نتيجتنا
+                try:
+                    result = await follow
+                except BaseException as exc:
+                    self._settle(followers, exc=exc)
+                    raise
+                self._settle(followers, result=result)
+                return result
+            followers += joined
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                self.retry_after += 1
+                until = time.monotonic() + float(exc.retry_after)
+                self._paused[chat] = max(self._paused.get(chat, 0.0), until)
+                log.warning("Telegram RetryAfter %.0fs for chat %s (%s)", float(exc.retry_after), chat, endpoint)
+                if attempt == self.retries:
+                    self._settle(followers, exc=exc)
+                    raise
+                continue
+            except BaseException as exc:
+                self._settle(followers, exc=exc)
+                raise
+            self.sent[prio] += 1
+            self._settle(followers, result=result)
+            return result
+
+    @staticmethod
+    def _settle(followers: List[asyncio.Future], result: Any = None, exc: Optional[BaseException] = None):
+        for f in followers:
+            if f.done():
+                continue
+            if isinstance(exc, asyncio.CancelledError):
+                f.cancel()
+            elif exc is not None:
+                f.set_exception(exc)
+            else:
+                f.set_result(result)
+
+    # ===== مقاييس =====
+    def stats(self) -> Dict[str, Any]:
+        depth = {name: len(q) for name, q in zip(PRIORITY_NAMES, self._queues)}
+        waits = {name: {"p50": _percentile(w, 0.5), "p95": _percentile(w, 0.95)}
+                 for name, w in zip(PRIORITY_NAMES, self._waits)}
+        return {"depth": depth, "queued": sum(depth.values()), "peak_depth": self.peak_depth,
+                "sent": dict(zip(PRIORITY_NAMES, self.sent)), "immediate": self.immediate,
+                "coalesced": self.coalesced, "retry_after": self.retry_after,
+                "paused_chats": len(self._paused), "wait": waits}
+
+
+SCHEDULER = OutboundScheduler()
@@ -0,0 +1,101 @@
+# pregen_explanations.py — توليد شروح مفصّلة مسبقاً لفضاء الأسئلة اللفظية المحدود
+# ----------------------------------------------------------
+# أسئلة المرادف/الضد/الإكمال في gen_verbal مأخوذة من جداول ثابتة (SYN/ANT/COMP_SENT)،
+# فنعدّدها كلها ونولّد شرح كل منها مرة واحدة عبر LLM، ونكتبها في ملف صغير
+# يحمّله البوت عند الإقلاع (شرح فوري بلا تكلفة).
+#
+# تزايدي: لا يُولَّد إلا ما ليس في الملف؛ والمداخل المحذوفة من الجداول تُزال.
+#
+# الاستخدام:
+#   python pregen_explanations.py                       # يكتب verbal_explanations.json
+#   python pregen_explanations.py --base-url http://127.0.0.1:8088/v1   # ضد خادم محلي وهمي
+#   python pregen_explanations.py --dry-run             # يعرض عدد الناقص فقط
+import os, sys, json, argparse, asyncio, logging
+from typing import Dict, List, Tuple
+
+import ai_client
+import ai_explain
+from generators import verbal_space
+
+log = logging.getLogger("pregen")
+
+
+def _write_atomic(path: str, items: Dict[str, str], model: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "model": model, "items": dict(sorted(items.items()))},
+                  f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+async def _run(args) -> int:
+    wanted: Dict[str, Tuple[str, str]] = {}
+    for _, question, answer in verbal_space():
+        wanted[ai_explain.static_key(question, answer)] = (question, answer)
+
+    items: Dict[str, str] = {}
+    if os.path.exists(args.out):
+        items = ai_explain.read_pregenerated(args.out)
+    stale = [k for k in items if k not in wanted]
+    if not args.keep_stale:
+        for k in stale:
+            del items[k]
+    todo = [k for k in wanted if k not in items]
+    print(f"space={len(wanted)} done={len(wanted) - len(todo)} todo={len(todo)} stale={len(stale)}")
+    if args.dry_run or not todo:
+        if stale and not args.keep_stale and not args.dry_run:
+            _write_atomic(args.out, items, args.model)
+        return 0
+
+    batches: List[List[str]] = [todo[i:i + args.batch] for i in range(0, len(todo), args.batch)]
+    sem = asyncio.Semaphore(args.concurrency)
+    failed = 0
+
+    async def one(keys: List[str]):
+        nonlocal failed
+        prompts = [ai_explain.static_prompt(*wanted[k]) for k in keys]
+        async with sem:
+            try:
+                text = await ai_client.chat(
+                    ai_explain.batch_messages(prompts), model=args.model, temperature=0.2,
+                    max_tokens=ai_explain.AI_EXPLAIN_TOKENS * len(prompts), base_url=args.base_url,
+                )
+            except Exception as e:
+                log.warning("batch failed: %s", e)
+                failed += len(keys)
+                return
+        for k, body in zip(keys, ai_explain.split_batch_answer(text, len(keys))):
+            if body:
+                items[k] = body
+            else:
+                failed += 1
+        _write_atomic(args.out, items, args.model)  # نحفظ التقدّم بعد كل دفعة
+
+    await asyncio.gather(*(one(b) for b in batches))
+    await ai_client.aclose()
+    print(f"written={len(items)} failed={failed} -> {args.out}")
+    return 1 if failed else 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="توليد شروح مسبقة لأسئلة المرادف/الضد/الإكمال")
+    ap.add_argument("--out", default=ai_explain.AI_EXPLAIN_FILE)
+    ap.add_argument("--model", default=ai_explain.AI_EXPLAIN_MODEL)
+    ap.add_argument("--base-url", default=None, help="مثلاً خادم mock محلي")
+    ap.add_argument("--api-key", default=None)
+    ap.add_argument("--batch", type=int, default=ai_explain.AI_EXPLAIN_MAX_BATCH)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--keep-stale", action="store_true", help="لا تحذف شروح المداخل المحذوفة من الجداول")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    ai_client.AI_API_KEY = args.api_key or ai_client.AI_API_KEY or ("mock" if args.base_url else None)
+    if not args.dry_run and (not ai_client.available() or not ai_client.AI_API_KEY):
+        print("AI_API_KEY غير مضبوط أو مكتبة openai غير مثبتة.", file=sys.stderr)
+        return 2
+    return asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
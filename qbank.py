@@ -0,0 +1,345 @@
+# qbank.py — بنك أسئلة ثابت على القرص بصيغة ثنائية مضغوطة تُقرأ عبر mmap
+# ----------------------------------------------------------
+# بدل قوائم QUESTIONS داخل الكود تُنسخ في جلسة كل مستخدم: ملف واحد للقراءة فقط
+# تتشاركه كل العمليات عبر ذاكرة التخزين المؤقت لنظام الملفات، والجلسة تحفظ أرقام البنود فقط.
+#
+# الصيغة (little-endian):
+#   ترويسة  : magic "QBNK" | version u16 | reserved u16 | n_items u32 | n_groups u32
+#             | groups_off u64 | items_off u64 | blob_off u64 | blob_len u64
+#             | digest u64 (blake2b لكل ما بعد الترويسة = هوية المحتوى؛ غائب في الإصدار 1)
+#   مجموعات: لكل (فئة، صعوبة) name_off u32 | name_len u16 | difficulty u8 | pad | start u32 | count u32
+#             البنود مرتّبة بالفئة ثم الصعوبة، فكل مجموعة (وكل فئة) مدى متصل من الأرقام
+#   بنود   : لكل سؤال ٦ نصوص (السؤال، ٤ خيارات، الشرح) كـ (off u32, len u16)
+#             + answer_index u8 + difficulty u8 — سجل ثابت الحجم ⇒ الوصول O(1)
+#   blob    : نصوص UTF-8 بلا تكرار (الخيار "٣" يُخزَّن مرة واحدة)
+#
+# الاستخدام:
+#   python qbank.py build cognitive.jsonl iq.csv -o questions.qbank
+#   python qbank.py info questions.qbank
+#   python qbank.py show questions.qbank 0 5
+#
+# JSONL: {"category": "cognitive", "difficulty": 1, "question": "...",
+#         "options": ["..", "..", "..", ".."], "answer_index": 1, "explain": "..."}
+#        (answer: نص الإجابة بديلاً عن answer_index)
+# CSV  : category,difficulty,question,option1,option2,option3,option4,answer_index,explain
+import os, sys, csv, json, mmap, zlib, struct, random, hashlib, logging, argparse
+from random import Random
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from question import Question
+
+QBANK_PATH = os.environ.get("QBANK_PATH", "questions.qbank")
+
+MAGIC = b"QBNK"
+VERSION = 2
+N_OPTIONS = 4
+
+PREFIX    = struct.Struct("<4sH")
+HEADER_V1 = struct.Struct("<4sHHIIQQQQ")
+HEADER    = struct.Struct("<4sHHIIQQQQQ")
+GROUP  = struct.Struct("<IHBxII")
+ITEM   = struct.Struct("<" + "IH" * (2 + N_OPTIONS) + "BB")
+
+MAX_STR = 0xFFFF
+
+log = logging.getLogger(__name__)
+
+
+class BankError(ValueError):
+    pass
+
+
+# ===== بناء =====
+class _Blob:
+    """نصوص UTF-8 متتالية مع دمج المتكرر."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.size = 0
+        self._seen: Dict[str, Tuple[int, int]] = {}
+
+    def put(self, s: str) -> Tuple[int, int]:
+        ref = self._seen.get(s)
+        if ref is None:
+            raw = s.encode("utf-8")
+            if len(raw) > MAX_STR:
+                raise BankError(f"نص أطول من {MAX_STR} بايت: {s[:40]!r}…")
+            ref = self._seen[s] = (self.size, len(raw))
+            self.parts.append(raw)
+            self.size += len(raw)
+        return ref
+
+
+def _row(category: str, difficulty: int, q: Question) -> Tuple[str, int, Question]:
+    if not category:
+        raise BankError(f"بند بلا فئة: {q.question[:40]!r}")
+    if not 0 <= difficulty <= 255:
+        raise BankError(f"صعوبة خارج 0..255: {difficulty}")
+    if len(q.options) != N_OPTIONS:
+        raise BankError(f"المطلوب {N_OPTIONS} خيارات بالضبط: {q.question[:40]!r}")
+    if not 0 <= q.answer_index < N_OPTIONS:
+        raise BankError(f"answer_index خارج المدى: {q.question[:40]!r}")
+    return category, difficulty, q
+
+
+def encode(rows: Iterable[Tuple[str, int, Question]]) -> bytes:
+    """rows: (category, difficulty, Question) بأي ترتيب ⇒ محتوى ملف البنك."""
+    rows = sorted((_row(*r) for r in rows), key=lambda r: (r[0], r[1]))
+    blob = _Blob()
+    groups: List[Tuple[str, int, int, int]] = []
+    items = bytearray()
+    for n, (cat, diff, q) in enumerate(rows):
+        if not groups or groups[-1][:2] != (cat, diff):
+            groups.append((cat, diff, n, 0))
+        g = groups[-1]
+        groups[-1] = (g[0], g[1], g[2], g[3] + 1)
+        refs: List[int] = []
+        for s in (q.question, *q.options, q.explain or ""):
+            refs.extend(blob.put(s))
+        items += ITEM.pack(*refs, q.answer_index, diff)
+
+    table = bytearray()
+    for cat, diff, start, count in groups:
+        off, ln = blob.put(cat)
+        table += GROUP.pack(off, ln, diff, start, count)
+
+    groups_off = HEADER.size
+    items_off = groups_off + len(table)
+    blob_off = items_off + len(items)
+    h = hashlib.blake2b(digest_size=8)
+    for part in (table, items, *blob.parts):
+        h.update(part)
+    digest = int.from_bytes(h.digest(), "little")
+    head = HEADER.pack(MAGIC, VERSION, 0, len(rows), len(groups), groups_off, items_off, blob_off, blob.size, digest)
+    return b"".join((head, bytes(table), bytes(items), *blob.parts))
+
+
+def write(path: str, rows: Iterable[Tuple[str, int, Question]]) -> int:
+    data = encode(rows)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)  # القرّاء الحاليون يبقون على الملف القديم المربوط بـ mmap
+    return len(data)
+
+
+def _from_record(rec: dict) -> Tuple[str, int, Question]:
+    opts = list(rec["options"])
+    if "answer_index" in rec and rec["answer_index"] not in (None, ""):
+        ans = int(rec["answer_index"])
+    else:
+        try:
+            ans = opts.index(rec["answer"])
+        except (KeyError, ValueError):
+            raise BankError(f"الإجابة غير موجودة بين الخيارات: {rec.get('question', '')[:40]!r}")
+    q = Question(rec["question"], opts, ans, rec.get("explain") or None)
+    return str(rec["category"]).strip(), int(rec.get("difficulty") or 0), q
+
+
+def read_source(path: str) -> List[Tuple[str, int, Question]]:
+    """يقرأ JSONL أو CSV (بحسب الامتداد)."""
+    out = []
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".csv"):
+            for n, r in enumerate(csv.DictReader(f), 2):
+                try:
+                    r["options"] = [r.pop(f"option{k}") for k in range(1, N_OPTIONS + 1)]
+                    out.append(_from_record(r))
+                except (KeyError, ValueError) as e:
+                    raise BankError(f"{path}:{n}: {e}") from None
+        else:
+            for n, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    out.append(_from_record(json.loads(line)))
+                except (KeyError, ValueError, TypeError) as e:
+                    raise BankError(f"{path}:{n}: {e}") from None
+    return out
+
+
+# ===== قراءة =====
+class QBank:
+    """قارئ البنك: buf إما mmap لملف أو bytes (بنك مبني في الذاكرة)."""
+
+    def __init__(self, buf: Union[mmap.mmap, bytes], name: str = "<memory>"):
+        self.name = name
+        self._buf = buf
+        if len(buf) < PREFIX.size:
+            raise BankError(f"{name}: ملف أقصر من الترويسة")
+        magic, version = PREFIX.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise BankError(f"{name}: ليس ملف بنك أسئلة")
+        if version not in (1, VERSION):
+            raise BankError(f"{name}: إصدار غير مدعوم {version}")
+        header = HEADER if version == VERSION else HEADER_V1
+        if len(buf) < header.size:
+            raise BankError(f"{name}: ملف أقصر من الترويسة")
+        (_, _, _, self.n_items, n_groups, groups_off,
+         self._items_off, self._blob_off, blob_len, *digest) = header.unpack_from(buf, 0)
+        # كل جدول يجب أن يقع داخل الملف قبل أي قراءة منه
+        if not (header.size <= groups_off and groups_off + n_groups * GROUP.size <= self._items_off
+                and self._items_off + self.n_items * ITEM.size <= self._blob_off):
+            raise BankError(f"{name}: جداول الترويسة متداخلة أو خارج الملف")
+        if self._blob_off + blob_len != len(buf):
+            raise BankError(f"{name}: حجم غير متطابق (ملف مبتور؟)")
+        # هوية المحتوى: الجلسات المحفوظة على بنك آخر (ولو بنفس التخطيط) تُهمل
+        if digest:
+            self.tag = digest[0]
+        else:  # الإصدار 1 بلا بصمة: نحسبها من الملف كله
+            self.tag = zlib.crc32(buf[groups_off:]) ^ blob_len
+
+        self.groups: Dict[Tuple[str, int], Tuple[int, int]] = {}
+        self.categories: Dict[str, Tuple[int, int]] = {}
+        try:
+            for g in range(n_groups):
+                off, ln, diff, start, count = GROUP.unpack_from(buf, groups_off + g * GROUP.size)
+                if off + ln > blob_len or start + count > self.n_items:
+                    raise BankError(f"{name}: مجموعة {g} خارج المدى")
+                cat = self._str(off, ln)
+                self.groups[(cat, diff)] = (start, start + count)
+                lo, hi = self.categories.get(cat, (start, start))
+                self.categories[cat] = (min(lo, start), max(hi, start + count))
+        except (struct.error, UnicodeDecodeError) as e:
+            raise BankError(f"{name}: جدول مجموعات تالف: {e}") from None
+
+    def _str(self, off: int, ln: int) -> str:
+        p = self._blob_off + off
+        return self._buf[p:p + ln].decode("utf-8")
+
+    def __len__(self) -> int:
+        return self.n_items
+
+    def get(self, i: int) -> Question:
+        if not 0 <= i < self.n_items:
+            raise IndexError(i)
+        f = ITEM.unpack_from(self._buf, self._items_off + i * ITEM.size)
+        s = [self._str(f[k], f[k + 1]) for k in range(0, 2 * (2 + N_OPTIONS), 2)]
+        return Question(s[0], s[1:1 + N_OPTIONS], f[-2], s[-1] or None)
+
+    __getitem__ = get
+
+    def difficulty(self, i: int) -> int:
+        return ITEM.unpack_from(self._buf, self._items_off + i * ITEM.size)[-1]
+
+    def span(self, category: str, difficulty: Optional[int] = None) -> range:
+        """مدى أرقام البنود لفئة (وصعوبة إن حُددت) — مدى فارغ إن لم توجد."""
+        if difficulty is None:
+            lo, hi = self.categories.get(category, (0, 0))
+        else:
+            lo, hi = self.groups.get((category, difficulty), (0, 0))
+        return range(lo, hi)
+
+    def difficulties(self, category: str) -> List[int]:
+        return sorted(d for c, d in self.groups if c == category)
+
+    def sample(self, category: str, k: int, difficulty: Optional[int] = None,
+               rng: Random = random) -> List[int]:
+        """k رقماً مختلفاً من الفئة بلا نسخ أي نصوص (random.sample على range لا يبني قائمة)."""
+        r = self.span(category, difficulty)
+        return rng.sample(r, min(k, len(r)))
+
+    def close(self):
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+
+
+def open_bank(path: str) -> QBank:
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < PREFIX.size:  # mmap لملف فارغ يرفع ValueError
+            raise BankError(f"{path}: ملف أقصر من الترويسة")
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return QBank(buf, path)
+    except BankError:
+        buf.close()
+        raise
+
+
+def from_questions(category: str, questions: Sequence[Question], difficulty: int = 0) -> QBank:
+    """بنك في الذاكرة من قائمة ثابتة — بديل حين لا يوجد ملف البنك."""
+    return QBank(encode((category, difficulty, q) for q in questions), f"<builtin:{category}>")
+
+
+_bank: Optional[QBank] = None
+_bank_loaded = False
+
+
+def default_bank() -> Optional[QBank]:
+    """البنك المشترك من QBANK_PATH (يُفتح مرة واحدة لكل عملية)، أو None إن لم يوجد."""
+    global _bank, _bank_loaded
+    if not _bank_loaded:
+        _bank_loaded = True
+        if os.path.exists(QBANK_PATH):
+            try:
+                _bank = open_bank(QBANK_PATH)
+            except (OSError, BankError) as e:
+                # بنك تالف/مبتور لا يعطّل البوت: القوائم المدمجة بديل (bank_for)
+                log.error("cannot open question bank, using built-in questions: %s", e)
+    return _bank
+
+
+def bank_for(category: str, fallback: Sequence[Question]) -> QBank:
+    """البنك المشترك إن كان فيه بنود لهذه الفئة، وإلا بنك مبني من القائمة المدمجة."""
+    bank = default_bank()
+    if bank is not None and len(bank.span(category)):
+        return bank
+    return from_questions(category, fallback)
+
+
+# ===== CLI =====
+def _cmd_build(args) -> int:
+    rows = []
+    for src in args.inputs:
+        part = read_source(src)
+        print(f"{src}: {len(part)}")
+        rows.extend(part)
+    size = write(args.out, rows)
+    print(f"{args.out}: {len(rows)} بنداً، {size} بايت")
+    return 0
+
+
+def _cmd_info(args) -> int:
+    bank = open_bank(args.path)
+    print(f"{args.path}: {len(bank)} بنداً، tag={bank.tag:08x}")
+    for (cat, diff), (lo, hi) in sorted(bank.groups.items()):
+        print(f"  {cat:<16} صعوبة {diff:<3} [{lo}, {hi})  {hi - lo}")
+    return 0
+
+
+def _cmd_show(args) -> int:
+    bank = open_bank(args.path)
+    for i in range(args.start, min(args.start + args.count, len(bank))):
+        q = bank.get(i)
+        print(json.dumps({"i": i, "difficulty": bank.difficulty(i), "question": q.question,
+                          "options": list(q.options), "answer_index": q.answer_index,
+                          "explain": q.explain}, ensure_ascii=False))
+    return 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="بنك أسئلة ثابت بصيغة mmap")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="بناء بنك من ملفات JSONL/CSV")
+    b.add_argument("inputs", nargs="+")
+    b.add_argument("-o", "--out", default=QBANK_PATH)
+    b.set_defaults(fn=_cmd_build)
+    i = sub.add_parser("info", help="الفئات والصعوبات ومداها")
+    i.add_argument("path", nargs="?", default=QBANK_PATH)
+    i.set_defaults(fn=_cmd_info)
+    s = sub.add_parser("show", help="طباعة بنود كـ JSONL")
+    s.add_argument("path")
+    s.add_argument("start", type=int, nargs="?", default=0)
+    s.add_argument("count", type=int, nargs="?", default=10)
+    s.set_defaults(fn=_cmd_show)
+    args = ap.parse_args(argv)
+    try:
+        return args.fn(args)
+    except (OSError, BankError) as e:
+        print(f"خطأ: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
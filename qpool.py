@@ -0,0 +1,103 @@
+# qpool.py — مخازن أسئلة جاهزة لكل فئة تُعاد تعبئتها في الخلفية
+# ----------------------------------------------------------
+# يُخرج التوليد من مسار التحديث: المعالج يسحب سؤالاً جاهزاً (O(1))، ومهمة خلفية
+# تعيد التعبئة بدفعات batchgen.generate في خيط منفصل عند النزول تحت النصف.
+# إن فرغ المخزن يولّد المستدعي سؤاله بنفسه كالسابق.
+# كل مخزن يبدأ عند أول pop له: فئة لا يُسجَّل مستهلكها لا تشغل خيطاً ولا ذاكرة.
+import os, asyncio, logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import batchgen
+from question import Question
+
+QPOOL_ENABLED = os.environ.get("QPOOL", "1") == "1"
+QPOOL_SIZE    = int(os.environ.get("QPOOL_SIZE", "1000"))   # سقف كل مخزن
+QPOOL_BATCH   = int(os.environ.get("QPOOL_BATCH", "256"))   # حجم دفعة التعبئة
+
+log = logging.getLogger(__name__)
+
+
+class ReadyPool:
+    def __init__(self, name: str, make: Callable[[int], List[Question]],
+                 size: int = QPOOL_SIZE, batch: int = QPOOL_BATCH):
+        self.name = name
+        self.make = make
+        self.size = size
+        self.batch = batch
+        self.items: Deque[Question] = deque()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.served = 0
+        self.misses = 0
+        self.refills = 0
+
+    def pop(self) -> Optional[Question]:
+        if len(self.items) <= self.size // 2:
+            self._wake.set()
+        if not self.items:
+            self.misses += 1
+            return None
+        self.served += 1
+        return self.items.popleft()
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while len(self.items) < self.size:
+                n = min(self.batch, self.size - len(self.items))
+                try:
+                    batch = await asyncio.to_thread(self.make, n)
+                except Exception:
+                    log.exception("refill of %s failed", self.name)
+                    break
+                self.items.extend(batch)
+                self.refills += 1
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wake.set()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+POOLS: Dict[str, ReadyPool] = {
+    name: ReadyPool(name, lambda n, k=name: batchgen.generate(k, n)) for name in ("quant", "qiyas200")
+}
+
+
+def pop(name: str) -> Optional[Question]:
+    """سؤال جاهز من مخزن name، أو None (المخزن معطّل/فارغ/غير موجود).
+
+    أول طلب داخل حلقة الأحداث يبدأ التعبئة في الخلفية ويعيد None؛ خارجها (أدوات،
+    قياس) لا مخزن فيُولّد المستدعي سؤاله بنفسه.
+    """
+    pool = POOLS.get(name)
+    if not QPOOL_ENABLED or pool is None:
+        return None
+    if pool._task is None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        pool.start()
+    return pool.pop()
+
+
+async def stop():
+    for pool in POOLS.values():
+        await pool.stop()
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {name: {"ready": len(p.items), "served": p.served, "misses": p.misses, "refills": p.refills,
+                   "numpy": batchgen.available()} for name, p in POOLS.items()}
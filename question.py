@@ -0,0 +1,50 @@
+# question.py — سجل سؤال موحّد ومضغوط لكل المولِّدات والقوائم الثابتة
+# ----------------------------------------------------------
+# بدل dict بمفاتيح نصية (question/options/answer_index هنا و q/opts/ans هناك):
+# كائن بـ __slots__، خيارات tuple من نصوص مُدمجة (interned)، وبصمة 64-بت
+# تُحسب مرة واحدة عند الحاجة لمقارنة الأسئلة وتجزئتها بلا بناء نصوص.
+import sys, hashlib
+from typing import Iterable, Optional, Tuple
+
+_SEP = "\x1f"
+
+
+class Question:
+    __slots__ = ("question", "options", "answer_index", "explain", "_fp")
+
+    def __init__(self, question: str, options: Iterable, answer_index: int, explain: Optional[str] = None):
+        self.question = question
+        self.options: Tuple[str, ...] = tuple(sys.intern(str(o)) for o in options)
+        self.answer_index = int(answer_index)
+        self.explain = explain
+        self._fp: Optional[int] = None
+
+    @property
+    def answer(self) -> str:
+        return self.options[self.answer_index]
+
+    @property
+    def fp(self) -> int:
+        """بصمة 64-بت ثابتة بين العمليات (لا تعتمد على PYTHONHASHSEED).
+
+        تشمل نص السؤال والإجابة الصحيحة فقط: ترتيب الخيارات الخاطئة لا يجعل السؤال جديداً.
+        """
+        if self._fp is None:
+            raw = self.question + _SEP + self.answer
+            self._fp = int.from_bytes(hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest(), "big")
+        return self._fp
+
+    def __eq__(self, other):
+        if not isinstance(other, Question):
+            return NotImplemented
+        return (self.question, self.options, self.answer_index) == (other.question, other.options, other.answer_index)
+
+    def __hash__(self):
+        return self.fp
+
+    def __reduce__(self):
+        # حالة مختصرة للحفظ: بلا أسماء حقول ولا البصمة المحسوبة
+        return (Question, (self.question, self.options, self.answer_index, self.explain))
+
+    def __repr__(self):
+        return f"Question({self.question!r}, {self.options!r}, {self.answer_index})"
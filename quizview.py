@@ -0,0 +1,43 @@
+# quizview.py — عرض الاختبار في رسالة واحدة تُعدَّل في مكانها
+# ----------------------------------------------------------
+# الوضع التقليدي لكل ضغطة إجابة: answer + تعديل الرسالة بالنتيجة + رسالة جديدة بالسؤال التالي
+# (٣ نداءات، وسجل محادثة بطول الاختبار). في وضع «التعديل في المكان» تُدمج نتيجة الإجابة
+# كسطر رأس فوق السؤال التالي في تعديل واحد لنفس الرسالة، وتحل أزراره محل القديمة (نداءان).
+# يُضبط لكل مستخدم (/inplace_on | /inplace_off)؛ الافتراضي التقليدي ما لم يُضبط QUIZ_INPLACE=1.
+import os
+from typing import Optional
+
+from telegram import CallbackQuery, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+
+QUIZ_INPLACE_DEFAULT = os.environ.get("QUIZ_INPLACE", "0") == "1"
+
+SEPARATOR = "\n━━━━━━━━━━\n"
+
+
+def inplace(context: ContextTypes.DEFAULT_TYPE) -> bool:
+    return context.user_data.get("inplace", QUIZ_INPLACE_DEFAULT)
+
+
+def set_inplace(context: ContextTypes.DEFAULT_TYPE, value: bool):
+    context.user_data["inplace"] = bool(value)
+
+
+def merge_kb(*kbs: Optional[InlineKeyboardMarkup]) -> Optional[InlineKeyboardMarkup]:
+    rows = [row for kb in kbs if kb is not None for row in kb.inline_keyboard]
+    return InlineKeyboardMarkup(rows) if rows else None
+
+
+def without_prefix(kb: Optional[InlineKeyboardMarkup], prefix: str) -> Optional[InlineKeyboardMarkup]:
+    """الأزرار نفسها بلا صفوف callback_data التي تبدأ بـ prefix (مثلاً زر الشرح بعد ضغطه)."""
+    if kb is None:
+        return None
+    rows = [row for row in kb.inline_keyboard
+            if not any((b.callback_data or "").startswith(prefix) for b in row if isinstance(b.callback_data, str))]
+    return InlineKeyboardMarkup(rows) if rows else None
+
+
+async def show(query: CallbackQuery, feedback: str, text: str,
+               kb: Optional[InlineKeyboardMarkup] = None, extra: Optional[InlineKeyboardMarkup] = None):
+    """تعديل واحد: نتيجة الإجابة رأساً + السؤال التالي (أو النتيجة النهائية) وأزراره."""
+    await query.edit_message_text(f"{feedback}{SEPARATOR}{text}"[:4096], reply_markup=merge_kb(kb, extra))
@@ -0,0 +1,39 @@
+# singleflight.py — دمج الطلبات المتطابقة الجارية في نداء واحد
+# ----------------------------------------------------------
+# أول طالب لمفتاح ما يطلق النداء، والبقية ينتظرون نفس النتيجة.
+# الانتظار محميّ بـ shield: إلغاء أو مهلة منتظرٍ واحد لا يلغي النداء المشترك.
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.leaders = 0   # نداءات فعلية أُطلقت
+        self.shared = 0    # طلبات انضمّت لنداء جارٍ
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # حتى لا يُسجَّل «exception was never retrieved» إن غادر الجميع
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, k=key: self._done(k, t))
+            self.leaders += 1
+        else:
+            self.shared += 1
+        waiter = asyncio.shield(task)
+        if timeout is not None:
+            return await asyncio.wait_for(waiter, timeout)
+        return await waiter
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "shared": self.shared}
@@ -0,0 +1,308 @@
+# sqlite_persistence.py — تخزين دائم تزايدي لـ user_data على SQLite (WAL)
+# ----------------------------------------------------------
+# بدل PicklePersistence (يعيد كتابة ملف واحد فيه كل المستخدمين عند كل حفظ):
+# - صف لكل مستخدم (pickle مضغوط لحالة user_data)، ولا يُكتب إلا من تغيّرت بصمة بياناته.
+# - الكتابة دفعة واحدة (معاملة واحدة) لكل دورة update_persistence كل PERSIST_INTERVAL ثانية،
+#   في خيط منفصل حتى لا تحجب حلقة الأحداث.
+# - لا تحميل عند الإقلاع: get_user_data تعيد {} ويُحمَّل كل مستخدم عند أول تحديث منه
+#   (refresh_user_data) ⇒ زمن الإقلاع لا يكبر مع عدد المستخدمين. التحديثات المتزامنة لنفس
+#   المستخدم تنتظر نفس التحميل، وفشل القراءة المؤقت يُبقيه للقراءة فقط (بلا كتابة) حتى ينجح.
+# - spill_user_data/restore_user_data: مستودع لحالة الجلسات التي يخليها sweeper.py من الذاكرة
+#   (عمود spill يُدمج عند الاستعادة أو التحميل، وتمسحه كتابة البيانات الكاملة التالية).
+# - مخطط صغير بإصدار في PRAGMA user_version مع ترقيات متسلسلة.
+#
+# الملف لا يبقى بعد إعادة التشغيل إلا على قرص دائم: نظام ملفات خدمة Render المجانية
+# مؤقت (يُمسح عند كل نشر/إعادة تشغيل/سُبات)، ولا يدعم plan: free ربط قرص. لذا يحفظ
+# الإعداد الحالي الحالة عبر دورات التخزين داخل العملية فقط؛ للبقاء بعد إعادة التشغيل
+# اربط قرصاً (خطة مدفوعة، انظر render.yaml) واضبط PERSIST_DISK ومسار PERSIST_DB عليه.
+# warn_if_ephemeral يسجّل تحذيراً عند الإقلاع إن لم يكن الملف على قرص دائم.
+#
+# bot_data/chat_data/callback_data غير مستخدمة في البوت فلا تُخزَّن (store_data).
+import os, time, pickle, sqlite3, asyncio, hashlib, logging, threading, zlib
+from typing import Any, Dict, Optional, Set
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+PERSIST_DB       = os.environ.get("PERSIST_DB", "bot_state.sqlite3")   # فارغ = بلا تخزين دائم
+PERSIST_INTERVAL = float(os.environ.get("PERSIST_INTERVAL", "30"))     # ث بين دفعات الكتابة
+PERSIST_DISK     = os.environ.get("PERSIST_DISK", "")                  # مسار ربط القرص الدائم (مثلاً /var/data)
+LOAD_RETRIES     = 3                                                   # محاولات قراءة المستخدم عند قفل القاعدة
+
+log = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+MIGRATIONS = {
+    # الإصدار ← أوامر الترقية إليه من السابق
+    1: (
+        "CREATE TABLE users ("
+        " user_id INTEGER PRIMARY KEY,"   # = rowid: بلا فهرس إضافي
+        " data    BLOB NOT NULL,"         # pickle (+ zlib إن وفّر) لـ user_data
+        " spill   BLOB,"                  # حالة أخلاها sweeper من الذاكرة (تُدمج عند التحميل)
+        " updated INTEGER NOT NULL)",     # unix ث
+    ),
+}
+
+_ZLIB = 0x78  # أول بايت لتدفق zlib؛ pickle يبدأ بـ 0x80 فلا لبس
+_COMPRESS_MIN = 512
+
+
+def _encode(obj: Any) -> bytes:
+    raw = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(raw) >= _COMPRESS_MIN:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return packed
+    return raw
+
+
+def _decode(blob: bytes) -> Any:
+    if blob[:1] == bytes((_ZLIB,)):
+        blob = zlib.decompress(blob)
+    return pickle.loads(blob)
+
+
+def warn_if_ephemeral(path: str = PERSIST_DB) -> bool:
+    """يسجّل تحذيراً إن كان ملف الحالة على نظام ملفات مؤقت؛ يعيد True إن حُذِّر."""
+    real = os.path.abspath(path)
+    if PERSIST_DISK:
+        disk = os.path.abspath(PERSIST_DISK)
+        if not os.path.ismount(disk):
+            reason = f"PERSIST_DISK={disk} ليس نقطة ربط قرص"
+        elif not real.startswith(disk + os.sep):
+            reason = f"PERSIST_DB={real} خارج القرص الدائم {disk}"
+        else:
+            return False
+    elif os.environ.get("RENDER"):
+        reason = "Render بلا قرص دائم (PERSIST_DISK غير مضبوط)"
+    else:
+        return False
+    log.warning("user_data persistence is not durable: %s; all user data is lost on restart", reason)
+    return True
+
+
+class SQLitePersistence(BasePersistence):
+    def __init__(self, path: str = PERSIST_DB, update_interval: float = PERSIST_INTERVAL):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=False,
+                                                     user_data=True, callback_data=False),
+                         update_interval=update_interval)
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()           # اتصال واحد تتشاركه خيوط to_thread
+        self._loaded: Set[int] = set()          # قُرئ صفّه بنجاح ⇒ مسموح بالكتابة
+        self._loading: Dict[int, asyncio.Task] = {}
+        self._digest: Dict[int, bytes] = {}     # بصمة آخر ما كُتب لكل مستخدم محمّل
+        self._pending: Dict[int, bytes] = {}
+        self._commit: Optional[asyncio.Task] = None
+        self.loads = 0
+        self.load_failures = 0
+        self.writes = 0
+        self.unchanged = 0
+        self.batches = 0
+        self.bytes_written = 0
+        self.last_batch_ms = 0.0
+
+    # ===== الاتصال والمخطط =====
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")  # آمن مع WAL: لا فساد، وقد تضيع آخر معاملة عند انقطاع الكهرباء
+            db.execute("PRAGMA busy_timeout=5000")
+            self._migrate(db)
+            self._db = db
+        return self._db
+
+    @staticmethod
+    def _migrate(db: sqlite3.Connection):
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f"إصدار مخطط القاعدة {version} أحدث من إصدار الكود {SCHEMA_VERSION}")
+        for v in range(version + 1, SCHEMA_VERSION + 1):
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for stmt in MIGRATIONS[v]:
+                    db.execute(stmt)
+                db.execute(f"PRAGMA user_version={v}")
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            log.info("persistence schema migrated to v%d", v)
+
+    def _run(self, fn, *args):
+        with self._lock:
+            return fn(self._conn(), *args)
+
+    # ===== user_data: تحميل كسول =====
+    async def get_user_data(self) -> Dict[int, Any]:
+        await asyncio.to_thread(self._run, lambda db: None)  # فتح/ترقية المخطط عند الإقلاع فقط
+        return {}
+
+    @staticmethod
+    def _load(db: sqlite3.Connection, user_id: int):
+        return db.execute("SELECT data, spill FROM users WHERE user_id=?", (user_id,)).fetchone()
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[str, Any]) -> None:
+        if user_id in self._loaded:
+            return
+        # تحديث ثانٍ لنفس المستخدم (من محادثة أخرى) ينتظر التحميل الجاري بدل بيانات فارغة
+        task = self._loading.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load_into(user_id, user_data))
+            self._loading[user_id] = task
+            task.add_done_callback(lambda t, u=user_id: self._loading.pop(u, None))
+        await asyncio.shield(task)
+
+    async def _load_into(self, user_id: int, user_data: Dict[str, Any]):
+        for attempt in range(LOAD_RETRIES):
+            try:
+                row = await asyncio.to_thread(self._run, self._load, user_id)
+                break
+            except sqlite3.OperationalError as e:  # «database is locked» وأمثالها: مؤقت
+                if attempt + 1 < LOAD_RETRIES:
+                    await asyncio.sleep(0.2 * 2 ** attempt)
+                    continue
+                err = e
+            except Exception as e:
+                err = e
+            # لا نضيفه لـ _loaded: لا كتابة فوق صفّه المخزّن، ويُعاد التحميل مع تحديثه التالي
+            self.load_failures += 1
+            log.warning("loading user %s failed (%s); read-only until a load succeeds", user_id, err)
+            return
+        if row is not None:
+            data, spill = row
+            try:
+                stored = _decode(data)
+                if spill is not None:
+                    stored.update(_decode(spill))
+            except Exception:
+                # صف تالف/أصناف محذوفة ⇒ بداية فارغة لا تعطّل المستخدم
+                log.exception("user %s row cannot be decoded; starting with empty data", user_id)
+            else:
+                if spill is None:
+                    self._digest[user_id] = hashlib.blake2b(data, digest_size=16).digest()
+                # وإلا فالحالة المدمجة لم تُكتب بعد (الكتابة القادمة تمسح spill)
+                for k, v in stored.items():
+                    user_data.setdefault(k, v)
+                self.loads += 1
+        self._loaded.add(user_id)
+
+    # ===== user_data: كتابة تزايدية =====
+    async def update_user_data(self, user_id: int, data: Dict[str, Any]) -> None:
+        if user_id not in self._loaded:
+            return  # لم يُحمَّل بعد: الكتابة الآن قد تمحو صفاً أقدم لم يُقرأ
+        blob = _encode(data)
+        digest = hashlib.blake2b(blob, digest_size=16).digest()
+        if self._digest.get(user_id) == digest:
+            self.unchanged += 1
+            return
+        self._digest[user_id] = digest
+        self._pending[user_id] = blob
+        # كل نداءات هذه الدورة مجدولة معاً (gather)؛ الالتزام يعمل بعدها في معاملة واحدة
+        if self._commit is None or self._commit.done():
+            self._commit = asyncio.get_running_loop().create_task(self._write_pending())
+
+    @staticmethod
+    def _write(db: sqlite3.Connection, rows):
+        db.execute("BEGIN")
+        try:
+            db.executemany(
+                "INSERT INTO users(user_id, data, updated) VALUES(?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET data=excluded.data, spill=NULL, updated=excluded.updated",
+                rows)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    async def _write_pending(self):
+        while self._pending:  # ما وصل أثناء كتابة الدفعة يُكتب في دفعة تالية فوراً
+            batch, self._pending = self._pending, {}
+            now = int(time.time())
+            t0 = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._run, self._write, [(u, b, now) for u, b in batch.items()])
+            except Exception:
+                log.exception("persisting %d users failed; will retry next flush", len(batch))
+                for uid, blob in batch.items():
+                    self._digest.pop(uid, None)
+                    self._pending.setdefault(uid, blob)
+                return
+            self.writes += len(batch)
+            self.batches += 1
+            self.bytes_written += sum(len(b) for b in batch.values())
+            self.last_batch_ms = (time.perf_counter() - t0) * 1000
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending.pop(user_id, None)
+        self._digest.pop(user_id, None)
+        await asyncio.to_thread(self._run, lambda db: db.execute("DELETE FROM users WHERE user_id=?", (user_id,)))
+
+    # ===== مستودع sweeper =====
+    @staticmethod
+    def _spill(db: sqlite3.Connection, user_id: int, blob: bytes, now: int):
+        db.execute(
+            "INSERT INTO users(user_id, data, spill, updated) VALUES(?, ?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET spill=excluded.spill, updated=excluded.updated",
+            (user_id, _encode({}), blob, now))
+
+    async def spill_user_data(self, user_id: int, data: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._run, self._spill, user_id, _encode(data), int(time.time()))
+
+    async def restore_user_data(self, user_id: int) -> Optional[Dict[str, Any]]:
+        # spill لا يُمسح هنا: تمسحه كتابة user_data الكاملة التالية (لا نافذة فقدان عند الانهيار)
+        row = await asyncio.to_thread(
+            self._run, lambda db: db.execute("SELECT spill FROM users WHERE user_id=?", (user_id,)).fetchone())
+        return _decode(row[0]) if row and row[0] is not None else None
+
+    async def flush(self) -> None:
+        if self._commit is not None and not self._commit.done():
+            await self._commit
+        await self._write_pending()
+        await asyncio.to_thread(self._run, lambda db: db.execute("PRAGMA wal_checkpoint(TRUNCATE)"))
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"loaded": len(self._loaded), "loads": self.loads,
+                "load_failures": self.load_failures, "writes": self.writes,
+                "unchanged": self.unchanged, "pending": len(self._pending), "batches": self.batches,
+                "bytes_written": self.bytes_written, "last_batch_ms": round(self.last_batch_ms, 2)}
+
+    # ===== أنواع غير مستخدمة في البوت =====
+    async def get_chat_data(self) -> Dict[int, Any]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[str, Any]:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def update_chat_data(self, chat_id: int, data) -> None:
+        pass
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
@@ -0,0 +1,215 @@
+# sweeper.py — إخلاء الجلسات الخاملة وميزانية ذاكرة لـ user_data
+# ----------------------------------------------------------
+# لا شيء كان يحذف حالة الاختبارات من user_data (sessions / seen_* / q200 / iq_quiz /
+# cog_quiz / ai_mem …)، فالجلسات المهجورة تبقى في الذاكرة للأبد.
+#
+# - معالج في group=-1 يختم نشاط كل مستخدم قبل أي معالج آخر (ترتيب LRU بـ OrderedDict).
+# - مهمة خلفية كل SWEEP_INTERVAL ثانية:
+#     ١) تُخلي حالة من خمل أكثر من SESSION_TTL.
+#     ٢) تقدّر حجم كل مستخدم (تُعاد الحسبة لمن نشط منذ آخر مرور فقط)، وإن تجاوز
+#        المجموع SESSION_MEMORY_MB تُخلي الأقدم نشاطاً أولاً حتى النزول تحت الميزانية.
+# - الإخلاء يحذف مفاتيح الحالة المؤقتة فقط (التفضيلات مثل ai_prefs/ei تبقى).
+#   إن كان للتخزين الدائم spill_user_data/restore_user_data تُنقل الحالة إليه بدل حذفها،
+#   وتُستعاد تلقائياً عند أول تحديث لاحق من المستخدم.
+import os, sys, time, asyncio, logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+SESSION_TTL        = float(os.environ.get("SESSION_TTL", str(6 * 3600)))   # ث خمول قبل الإخلاء
+SESSION_MEMORY_MB  = float(os.environ.get("SESSION_MEMORY_MB", "64"))      # ميزانية كل user_data
+SWEEP_INTERVAL     = float(os.environ.get("SWEEP_INTERVAL", "60"))
+
+# مفاتيح حالة مؤقتة تُخلى؛ ما عداها (تفضيلات صغيرة) يبقى
+VOLATILE_KEYS = ("sessions", "q200", "iq_quiz", "cog_quiz", "ai_mem", "ai_wait", "explain_q", "last_cat")
+VOLATILE_PREFIXES = ("seen_",)
+
+log = logging.getLogger(__name__)
+
+
+def is_volatile(key: str) -> bool:
+    return key in VOLATILE_KEYS or key.startswith(VOLATILE_PREFIXES)
+
+
+def footprint(obj: Any) -> int:
+    """تقدير تقريبي لحجم كائن في الذاكرة بالبايت (مشي تكراري مع منع العدّ المزدوج)."""
+    seen: Set[int] = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif isinstance(o, (str, bytes, int, float, bool)) or o is None:
+            continue
+        else:
+            for name in getattr(type(o), "__slots__", ()):
+                if hasattr(o, name):
+                    stack.append(getattr(o, name))
+            d = getattr(o, "__dict__", None)
+            if d is not None:
+                stack.append(d)
+    return size
+
+
+class Sweeper:
+    def __init__(self, ttl: float = SESSION_TTL, budget_mb: float = SESSION_MEMORY_MB,
+                 interval: float = SWEEP_INTERVAL):
+        self.ttl = ttl
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.interval = interval
+        self.app: Optional[Application] = None
+        self._active: "OrderedDict[int, float]" = OrderedDict()  # الأقدم نشاطاً أولاً
+        self._size: Dict[int, int] = {}
+        self._dirty: Set[int] = set()
+        self._spilled: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.evicted_ttl = 0
+        self.evicted_budget = 0
+        self.spilled = 0
+        self.restored = 0
+        self.sweeps = 0
+        self.last_sweep_ms = 0.0
+
+    # ===== الختم (group=-1) =====
+    async def touch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        if user is None:
+            return
+        uid = user.id
+        self._active[uid] = time.monotonic()
+        self._active.move_to_end(uid)
+        self._dirty.add(uid)
+        if uid in self._spilled:
+            await self._restore(uid, context.user_data)
+
+    def install(self, app: Application):
+        self.app = app
+        app.add_handler(TypeHandler(Update, self.touch), group=-1)
+
+    # ===== تخزين دائم اختياري =====
+    def _tier(self):
+        p = self.app.persistence if self.app is not None else None
+        if p is not None and hasattr(p, "spill_user_data") and hasattr(p, "restore_user_data"):
+            return p
+        return None
+
+    async def _restore(self, uid: int, user_data: Dict[str, Any]):
+        self._spilled.discard(uid)
+        tier = self._tier()
+        if tier is None:
+            return
+        try:
+            data = await tier.restore_user_data(uid)
+        except Exception:
+            log.exception("restore of user %s failed", uid)
+            return
+        for k, v in (data or {}).items():
+            user_data.setdefault(k, v)  # ما أُنشئ منذ الإخلاء أحدث
+        self.restored += 1
+
+    # ===== الإخلاء =====
+    async def evict(self, uid: int) -> bool:
+        ud = self.app.user_data.get(uid) if self.app is not None else None
+        self._active.pop(uid, None)
+        self._size.pop(uid, None)
+        self._dirty.discard(uid)
+        if not ud:
+            return False
+        taken = {k: ud.pop(k) for k in [k for k in ud if is_volatile(k)]}
+        if not taken:
+            return False
+        tier = self._tier()
+        if tier is not None:
+            try:
+                await tier.spill_user_data(uid, taken)
+                self._spilled.add(uid)
+                self.spilled += 1
+            except Exception:
+                log.exception("spill of user %s failed; dropping its session state", uid)
+        return True
+
+    def _idle(self, now: float) -> Iterable[int]:
+        for uid, t in list(self._active.items()):
+            if now - t < self.ttl:
+                break
+            yield uid
+
+    async def sweep(self) -> Dict[str, int]:
+        t0 = time.perf_counter()
+        now = time.monotonic()
+        by_ttl = by_budget = 0
+        for uid in list(self._idle(now)):
+            by_ttl += await self.evict(uid)
+
+        for uid in self._dirty:
+            ud = self.app.user_data.get(uid)
+            if ud:
+                self._size[uid] = footprint(ud)
+        self._dirty.clear()
+        total = sum(self._size.values())
+        if total > self.budget:
+            # الأقدم نشاطاً أولاً؛ من نشط خلال آخر مرور لا يُمس
+            for uid in list(self._active):
+                if total <= self.budget or now - self._active[uid] < self.interval:
+                    break
+                total -= self._size.get(uid, 0)
+                by_budget += await self.evict(uid)
+            if total > self.budget:
+                log.warning("user_data over budget after sweep: %.1f MB", total / 2**20)
+
+        self.evicted_ttl += by_ttl
+        self.evicted_budget += by_budget
+        self.sweeps += 1
+        self.last_sweep_ms = (time.perf_counter() - t0) * 1000
+        return {"ttl": by_ttl, "budget": by_budget}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                res = await self.sweep()
+                if res["ttl"] or res["budget"]:
+                    log.info("Evicted %d idle and %d over-budget user sessions", res["ttl"], res["budget"])
+            except Exception:
+                log.exception("session sweep failed")
+
+    def start(self):
+        """يُستدعى داخل حلقة الأحداث (post_init) بعد تحميل التخزين الدائم."""
+        now = time.monotonic()
+        for uid in self.app.user_data:  # مستخدمون محمّلون من التخزين: يبدأ عدّادهم الآن
+            if uid not in self._active:
+                self._active[uid] = now
+                self._dirty.add(uid)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        ud = self.app.user_data if self.app is not None else {}
+        live = sum(1 for d in ud.values() if any(is_volatile(k) for k in d))
+        return {"users": len(ud), "live_sessions": live, "tracked": len(self._active),
+                "bytes": sum(self._size.values()), "budget": self.budget,
+                "evicted_ttl": self.evicted_ttl, "evicted_budget": self.evicted_budget,
+                "spilled": self.spilled, "restored": self.restored, "pending_restore": len(self._spilled),
+                "sweeps": self.sweeps, "last_sweep_ms": round(self.last_sweep_ms, 2)}
+
+
+SWEEPER = Sweeper()
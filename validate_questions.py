@@ -0,0 +1,415 @@
+# validate_questions.py — تحقق جماعي مستقل من صحة الأسئلة المولَّدة
+# ----------------------------------------------------------
+# كل سؤال يُحلّ من نصه فقط (قوالب regex + حاسبة كسور دقيقة)، لا من متغيرات المولِّد،
+# ثم يُتحقق أن: الخيارات مختلفة، الإجابة المحسوبة موجودة مرة واحدة بالضبط بين الخيارات،
+# و answer_index يشير إليها. الأسئلة اللفظية تُقارن بمفتاح الجداول (SYN/ANT/COMP_SENT)
+# مع التأكد أن لا مشتّت آخر إجابة مقبولة أيضاً.
+#
+# العينة رقم s تُولَّد بـ Random(s) ⇒ كل فشل قابل للإعادة حرفياً من (الهدف، البذرة).
+# للدفعات (batch.*) البذرة تحدد دفعة كاملة والموضع offset داخلها.
+#
+# الاستخدام:
+#   python validate_questions.py -n 1000000                       # كل الأهداف، كل الأنوية
+#   python validate_questions.py -n 200000 --only qiyas200 --jobs 8
+#   python validate_questions.py --batch -n 1000000 --failures bad.jsonl
+#   python validate_questions.py --replay bad.jsonl               # يعيد الفاشلة فقط
+import os, re, ast, sys, json, time, random, argparse
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+from math import gcd
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import batchgen
+import generators
+from distractors import fold
+from question import Question
+
+Gen = Callable[[random.Random], Question]
+
+CHUNK = 20_000          # عينات لكل مهمة في المجمع
+MAX_FAILURES = 200      # سقف ما يُعاد من كل مهمة (العدّ يبقى كاملاً)
+
+
+def _qiyas200() -> Dict[str, Gen]:
+    import qiyas_200  # يستورد telegram؛ كسول حتى تعمل أهداف generators بدونه
+    out = {f"qiyas200.{fn.__name__[5:]}": fn for fn in qiyas_200.GENERATORS}
+    out["qiyas200"] = lambda rng: rng.choice(qiyas_200.GENERATORS)(rng)
+    return out
+
+
+def targets() -> Dict[str, Gen]:
+    out: Dict[str, Gen] = {"quant": generators.gen_quant, "verbal": generators.gen_verbal, "iq": generators.gen_iq}
+    out.update({f"verbal.{k}": fn for k, (_, fn) in generators.VERBAL_KINDS.items()})
+    out.update({f"iq.{k}": fn for k, (_, fn) in generators.IQ_KINDS.items()})
+    out.update(_qiyas200())
+    return out
+
+
+# ======================================================
+#                   الحلّال المستقل
+# ======================================================
+class Invalid(Exception):
+    pass
+
+
+_OPS = {ast.Add: lambda a, b: a + b, ast.Sub: lambda a, b: a - b,
+        ast.Mult: lambda a, b: a * b, ast.Div: lambda a, b: a / b}
+
+
+def calc(expr: str) -> Fraction:
+    """يحسب تعبيراً بأرقام صحيحة و + − × ÷ وأقواس، بكسور دقيقة (بلا eval)."""
+    src = expr.replace("×", "*").replace("÷", "/").replace("−", "-")
+
+    def ev(n):
+        if isinstance(n, ast.Expression):
+            return ev(n.body)
+        if isinstance(n, ast.Constant) and type(n.value) is int:
+            return Fraction(n.value)
+        if isinstance(n, ast.UnaryOp) and isinstance(n.op, ast.USub):
+            return -ev(n.operand)
+        if isinstance(n, ast.BinOp) and type(n.op) in _OPS:
+            right = ev(n.right)
+            if isinstance(n.op, ast.Div) and right == 0:
+                raise Invalid("قسمة على صفر")
+            return _OPS[type(n.op)](ev(n.left), right)
+        raise Invalid(f"تعبير غير مدعوم: {expr!r}")
+
+    try:
+        return ev(ast.parse(src, mode="eval"))
+    except SyntaxError:
+        raise Invalid(f"تعبير غير صالح: {expr!r}") from None
+
+
+def _ints(s: str) -> List[int]:
+    return [int(x) for x in re.findall(r"-?\d+", s)]
+
+
+def _diffs(seq: List[int]) -> List[int]:
+    return [b - a for a, b in zip(seq, seq[1:])]
+
+
+def _arith_next(seq: List[int]) -> Fraction:
+    d = set(_diffs(seq))
+    if len(d) != 1:
+        raise Invalid("متتالية ليست حسابية")
+    return Fraction(seq[-1] + d.pop())
+
+
+def _geom_next(seq: List[int]) -> Fraction:
+    if 0 in seq[:-1]:
+        raise Invalid("صفر في متتالية هندسية")
+    r = {Fraction(b, a) for a, b in zip(seq, seq[1:])}
+    if len(r) != 1:
+        raise Invalid("متتالية ليست هندسية")
+    return seq[-1] * r.pop()
+
+
+def _alt_next(d1: int, d2: int, seq: List[int]) -> Fraction:
+    want = [d1 if k % 2 == 0 else d2 for k in range(len(seq) - 1)]
+    if _diffs(seq) != want:
+        raise Invalid("المتتالية لا تطابق النمط المعلن")
+    return Fraction(seq[-1] + (d1 if (len(seq) - 1) % 2 == 0 else d2))
+
+
+def _squares_next(seq: List[int]) -> Fraction:
+    roots = [round(v ** 0.5) for v in seq]
+    if any(r * r != v for r, v in zip(roots, seq)) or _diffs(roots) != [1] * (len(seq) - 1):
+        raise Invalid("ليست مربعات متتالية")
+    return Fraction((roots[-1] + 1) ** 2)
+
+
+def _fibo_next(seq: List[int]) -> Fraction:
+    if any(seq[k] != seq[k - 1] + seq[k - 2] for k in range(2, len(seq))):
+        raise Invalid("ليست فيبوناتشي")
+    return Fraction(seq[-1] + seq[-2])
+
+
+def _mix_next(a: int, b: int, seq: List[int]) -> Fraction:
+    v = seq[0]
+    for k, nxt in enumerate(seq[1:]):
+        v = v + a if k % 2 == 0 else v * b
+        if v != nxt:
+            raise Invalid("المتتالية لا تطابق النمط المعلن")
+    return Fraction(v + a if (len(seq) - 1) % 2 == 0 else v * b)
+
+
+def _mean(nums: List[int]) -> Fraction:
+    return Fraction(sum(nums), len(nums))
+
+
+AR_ALPHABET = "ابتثجحخدذرزسشصضطظعغفقكلمنهوي"
+
+
+def _letter_next(letters: List[str]) -> str:
+    try:
+        pos = [AR_ALPHABET.index(c) for c in letters]
+    except ValueError:
+        raise Invalid("حرف خارج الأبجدية") from None
+    d = set(_diffs(pos))
+    if len(d) != 1 or pos[-1] + next(iter(d)) >= len(AR_ALPHABET):
+        raise Invalid("الحروف ليست بخطوة ثابتة")
+    return AR_ALPHABET[pos[-1] + d.pop()]
+
+
+_N = r"(-?\d+)"
+_SEQ = r"((?:-?\d+, )+-?\d+)"
+
+# (regex على نص السؤال، الحل من مجموعات المطابقة) — الترتيب مهم: الأخص أولاً
+NUMERIC: List[Tuple[re.Pattern, Callable[..., Fraction]]] = [(re.compile(p), f) for p, f in (
+    # gen_quant
+    (r"^احسب: (.+) = ؟$", calc),
+    (rf"^إذا كان {_N}س \+ {_N} = {_N}، فما قيمة س؟$", lambda a, b, c: Fraction(int(c) - int(b), int(a))),
+    (rf"^ما {_N}% من {_N} ؟$", lambda p, y: Fraction(int(p) * int(y), 100)),
+    (rf"^قيمة {_N}\^{_N} = ؟$", lambda b, e: Fraction(int(b) ** int(e))),
+    (rf"^سيارة سرعتها {_N} كم/س، سارت {_N} ساعات\. ما المسافة؟$", lambda v, t: Fraction(int(v) * int(t))),
+    # gen_iq
+    (rf"^أكمل المتتالية: {_SEQ}, ؟$", lambda s: _arith_next(_ints(s))),
+    (rf"^أكمل: {_SEQ}, ؟$", lambda s: _geom_next(_ints(s))),
+    (rf"^نمط متناوب \(\+{_N}, \+{_N}\): {_SEQ}, ؟$", lambda a, b, s: _alt_next(int(a), int(b), _ints(s))),
+    (rf"^مربعات: {_SEQ}, ؟$", lambda s: _squares_next(_ints(s))),
+    (rf"^فيبوناتشي: {_SEQ}, ؟$", lambda s: _fibo_next(_ints(s))),
+    (rf"^نمط \(\+{_N} ثم ×{_N}\): {_SEQ}, ؟$", lambda a, b, s: _mix_next(int(a), int(b), _ints(s))),
+    # qiyas_200
+    (rf"^كم يساوي {_N}% من {_N}؟$", lambda p, y: Fraction(int(p) * int(y), 100)),
+    (r"^كم يساوي (.+)؟$", calc),
+    (rf"^ما العدد التالي في المتتالية: {_SEQ} ؟$", lambda s: _arith_next(_ints(s))),
+    (rf"^مساحة مستطيل طوله {_N} وعرضه {_N} تساوي؟$", lambda l, w: Fraction(int(l) * int(w))),
+    (rf"^ما القاسم المشترك الأكبر للعددين {_N} و {_N}؟$", lambda a, b: Fraction(gcd(int(a), int(b)))),
+    (rf"^ما المضاعف المشترك الأصغر للعددين {_N} و {_N}؟$",
+     lambda a, b: Fraction(int(a) * int(b) // gcd(int(a), int(b)))),
+    (rf"^ما متوسط الأعداد: {_SEQ} ؟$", lambda s: _mean(_ints(s))),
+    (rf"^سيارة سرعتها {_N} كم/س لمدّة {_N} ساعات\. كم كيلومتراً تقطع؟$", lambda v, t: Fraction(int(v) * int(t))),
+    (rf"^إذا كانت النسبة {_N}:{_N} = س:{_N} فما قيمة س؟$", lambda a, b, r: Fraction(int(a) * int(r), int(b))),
+)]
+
+_LETTERS = re.compile(r"^أكمل: ((?:\w، )+\w), ؟$")
+
+
+def _multi(pairs) -> Dict[str, set]:
+    out: Dict[str, set] = {}
+    for a, b in pairs:
+        out.setdefault(fold(a), set()).add(fold(b))
+    return out
+
+
+_SYN = _multi(generators.SYN)
+_ANT = _multi(generators.ANT)
+_CLOZE = {s: {fold(c)} for s, c, _ in generators.COMP_SENT}
+_SYN_Q = re.compile(r"^مرادف «(.+)» هو:$")
+_ANT_Q = re.compile(r"^ضدّ «(.+)» هو:$")
+_ANALOGY = re.compile(r"^(.+) : (.+) :: (.+) : ؟$")
+
+
+def _verbal_key(text: str) -> Optional[set]:
+    """مجموعة الإجابات المقبولة (بعد fold) لسؤال لفظي، أو None إن لم يكن لفظياً."""
+    m = _SYN_Q.match(text)
+    if m:
+        return _SYN.get(fold(m[1])) or set()
+    m = _ANT_Q.match(text)
+    if m:
+        return _ANT.get(fold(m[1])) or set()
+    m = _ANALOGY.match(text)
+    if m:
+        a, b, c = (fold(x) for x in m.groups())
+        ok = set()
+        for table in (_SYN, _ANT):
+            if b in table.get(a, ()):
+                ok |= table.get(c, set())
+        return ok
+    if text in _CLOZE:
+        return _CLOZE[text]
+    return None
+
+
+def check(q: Question) -> Optional[str]:
+    """None إن كان السؤال سليماً، وإلا وصف المشكلة."""
+    opts = q.options
+    if len(opts) < 2:
+        return "خيارات أقل من اثنين"
+    if not 0 <= q.answer_index < len(opts):
+        return f"answer_index خارج المدى: {q.answer_index}"
+    if len({fold(o) for o in opts}) != len(opts):
+        return "خيارات مكررة"
+
+    m = _LETTERS.match(q.question)
+    if m:
+        try:
+            want = _letter_next(m[1].split("، "))
+        except Invalid as e:
+            return str(e)
+        hits = [k for k, o in enumerate(opts) if o == want]
+        return _verdict(q, hits, want)
+
+    for pat, solve in NUMERIC:
+        m = pat.match(q.question)
+        if not m:
+            continue
+        try:
+            want = solve(*m.groups())
+        except Invalid as e:
+            return str(e)
+        if want.denominator != 1:
+            return f"الإجابة الصحيحة ليست عدداً صحيحاً: {float(want):g}"
+        try:
+            vals = [int(o) for o in opts]
+        except ValueError:
+            return "خيار غير عددي"
+        return _verdict(q, [k for k, v in enumerate(vals) if v == want], want)
+
+    accepted = _verbal_key(q.question)
+    if accepted is None:
+        return "قالب سؤال غير معروف"
+    if not accepted:
+        return "لا إجابة مقبولة في الجداول"
+    return _verdict(q, [k for k, o in enumerate(opts) if fold(o) in accepted], "/".join(sorted(accepted)))
+
+
+def _verdict(q: Question, hits: List[int], want) -> Optional[str]:
+    if not hits:
+        return f"الإجابة الصحيحة {want} ليست بين الخيارات"
+    if len(hits) > 1:
+        return f"أكثر من خيار صحيح: {[q.options[k] for k in hits]}"
+    if hits[0] != q.answer_index:
+        return f"answer_index={q.answer_index} والصحيح {hits[0]} ({want})"
+    return None
+
+
+# ======================================================
+#                    التشغيل المتوازي
+# ======================================================
+def _failure(target: str, seed: int, q: Optional[Question], err: str, offset: Optional[int] = None,
+             batch: Optional[int] = None) -> Dict[str, Any]:
+    rec: Dict[str, Any] = {"target": target, "seed": seed, "error": err}
+    if offset is not None:
+        rec.update(offset=offset, batch=batch)
+    if q is not None:
+        rec.update(question=q.question, options=list(q.options), answer_index=q.answer_index)
+    return rec
+
+
+def _sample(fn: Gen, target: str, seed: int) -> Optional[Dict[str, Any]]:
+    try:
+        q = fn(random.Random(seed))
+    except Exception as e:
+        return _failure(target, seed, None, f"استثناء في المولِّد: {e!r}")
+    err = check(q)
+    return _failure(target, seed, q, err) if err else None
+
+
+def _run_chunk(target: str, start: int, count: int) -> Tuple[str, int, int, List[Dict[str, Any]]]:
+    """عينات start..start+count-1 (كل بذرة عينة)، أو دفعة batchgen واحدة بذرتها start."""
+    failures: List[Dict[str, Any]] = []
+    bad = 0
+    if target.startswith("batch."):
+        kind = target[6:]
+        for k, q in enumerate(batchgen.generate(kind, count, start)):
+            err = check(q)
+            if err:
+                bad += 1
+                if len(failures) < MAX_FAILURES:
+                    failures.append(_failure(target, start, q, err, offset=k, batch=count))
+        return target, count, bad, failures
+    fn = targets()[target]
+    for seed in range(start, start + count):
+        rec = _sample(fn, target, seed)
+        if rec:
+            bad += 1
+            if len(failures) < MAX_FAILURES:
+                failures.append(rec)
+    return target, count, bad, failures
+
+
+def _plan(names: List[str], n: int, seed: int) -> Iterator[Tuple[str, int, int]]:
+    for t, name in enumerate(names):
+        base = seed + t * (1 << 40)  # مدى بذور منفصل لكل هدف
+        for k, start in enumerate(range(0, n, CHUNK)):
+            count = min(CHUNK, n - start)
+            # الدفعة كلها من بذرة واحدة ⇒ بذرة لكل دفعة، لا لكل عينة
+            yield name, (base + k if name.startswith("batch.") else base + start), count
+
+
+def replay(path: str) -> int:
+    gens = targets()
+    still = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            target, seed = rec["target"], rec["seed"]
+            if target.startswith("batch."):
+                q = batchgen.generate(target[6:], rec["batch"], seed)[rec["offset"]]
+                err = check(q)
+            else:
+                out = _sample(gens[target], target, seed)
+                err = out and out["error"]
+            print(json.dumps({"target": target, "seed": seed, "ok": err is None, "error": err},
+                             ensure_ascii=False))
+            still += err is not None
+    return 1 if still else 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="تحقق جماعي مستقل من الأسئلة المولَّدة")
+    ap.add_argument("-n", type=int, default=100_000, help="عينات لكل هدف")
+    ap.add_argument("--only", action="append", default=[], help="هدف بعينه (يتكرر)؛ --list للأسماء")
+    ap.add_argument("--batch", action="store_true", help="أضف أهداف batchgen (batch.quant …)")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--seed", type=int, default=0, help="أول بذرة")
+    ap.add_argument("--failures", default="validate_failures.jsonl", help="ملف البذور الفاشلة (JSONL)")
+    ap.add_argument("--replay", default=None, help="أعد التحقق من ملف فشل سابق")
+    ap.add_argument("--list", action="store_true")
+    args = ap.parse_args(argv)
+
+    if args.replay:
+        return replay(args.replay)
+    known = list(targets()) + [f"batch.{k}" for k in batchgen.BATCH]
+    if args.list:
+        print("\n".join(known))
+        return 0
+    names = args.only or [t for t in targets() if "." not in t] + [t for t in targets() if "." in t]
+    if args.batch and not args.only:
+        names += [f"batch.{k}" for k in ("quant", "iq", "qiyas200")]
+    unknown = [t for t in names if t not in known]
+    if unknown:
+        ap.error(f"هدف غير معروف: {', '.join(unknown)}")
+
+    t0 = time.perf_counter()
+    totals: Dict[str, Dict[str, int]] = {t: {"samples": 0, "failed": 0} for t in names}
+    failures: List[Dict[str, Any]] = []
+    jobs = list(_plan(names, max(1, args.n), args.seed))
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = pool.map(_run_chunk, *zip(*jobs), chunksize=1)
+            for target, count, bad, fails in results:
+                totals[target]["samples"] += count
+                totals[target]["failed"] += bad
+                failures += fails
+    else:
+        for job in jobs:
+            target, count, bad, fails = _run_chunk(*job)
+            totals[target]["samples"] += count
+            totals[target]["failed"] += bad
+            failures += fails
+    wall = time.perf_counter() - t0
+
+    samples = sum(t["samples"] for t in totals.values())
+    report = {"samples": samples, "failed": sum(t["failed"] for t in totals.values()),
+              "wall_s": round(wall, 2), "per_s": round(samples / wall), "jobs": args.jobs,
+              "targets": {t: v for t, v in totals.items()}}
+    if failures:
+        with open(args.failures, "w", encoding="utf-8") as f:
+            for rec in failures:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        report["failures_file"] = args.failures
+        errors: Dict[str, int] = {}
+        for rec in failures:
+            key = f"{rec['target']}: {rec['error'].split(':')[0]}"
+            errors[key] = errors.get(key, 0) + 1
+        report["errors"] = dict(sorted(errors.items(), key=lambda kv: -kv[1])[:30])
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+# webhook_reply.py — الرد على ضغطات الأزرار داخل استجابة Webhook نفسها
+# ----------------------------------------------------------
+# تلغرام يسمح بأن يحمل جسم استجابة HTTP لطلب الـ webhook نداءً واحداً لـ Bot API
+# ({"method": ..., ...}) فيُنفَّذ بلا رحلة شبكة إضافية من البوت. كل ضغطة زر تبدأ بـ
+# query.answer() ⇒ نؤجّل الرد على طلب الـ webhook حتى يصدر المعالج answerCallbackQuery
+# (حتى WEBHOOK_REPLY_WAIT ثانية)، فنعيده في الاستجابة ونؤكّده محلياً بـ True.
+# بقية النداءات (تعديل الرسالة وإرسال السؤال التالي) تمر عبر العميل العادي.
+#
+# - answerCallbackQuery فقط: نتيجته True فيمكن تأكيده دون تلغرام؛ تعديل الرسالة
+#   يعيد Message لا نملكه، والأخطاء (رسالة لم تتغير…) لن تصل للمعالج.
+# - إن لم يُجب المعالج خلال المهلة (طابور مزدحم، زر بلا معالج) تعود استجابة فارغة
+#   ويُرسل الجواب لاحقاً بالطريقة العادية.
+# - ثمن ذلك: لا يعرف البوت إن فشل تنفيذ النداء المضمّن (تلغرام لا يبلّغ عنه).
+import os, json, signal, asyncio, logging
+from http import HTTPStatus
+from typing import Any, Dict, Optional, Tuple
+
+import tornado.web
+from tornado.httpserver import HTTPServer
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+from telegram.request import BaseRequest, RequestData
+
+WEBHOOK_INLINE_REPLY = os.environ.get("WEBHOOK_INLINE_REPLY", "1") == "1"
+WEBHOOK_REPLY_WAIT   = float(os.environ.get("WEBHOOK_REPLY_WAIT", "0.5"))   # ث انتظار أول نداء
+
+INLINE_METHODS = ("answerCallbackQuery",)
+_OK_TRUE = b'{"ok":true,"result":true}'
+
+log = logging.getLogger(__name__)
+
+
+class InlineReply:
+    """طلبات webhook معلّقة (بمعرّف callback_query) تنتظر أول نداء من معالجها."""
+
+    def __init__(self, wait: float = WEBHOOK_REPLY_WAIT):
+        self.wait = wait
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.inline = 0
+        self.fallback = 0
+
+    def expect(self, query_id: str) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[query_id] = fut
+        return fut
+
+    def offer(self, method: str, params: Dict[str, Any]) -> bool:
+        """True إن أُخذ النداء لاستجابة الـ webhook (فلا يُرسل عبر الشبكة)."""
+        fut = self._pending.pop(str(params.get("callback_query_id", "")), None)
+        if fut is None or fut.done():
+            return False
+        fut.set_result({"method": method, **params})
+        return True
+
+    def release(self, query_id: str):
+        fut = self._pending.pop(query_id, None)
+        if fut is not None and not fut.done():
+            fut.set_result(None)
+
+    async def reply_for(self, query_id: str, fut: asyncio.Future) -> Optional[Dict[str, Any]]:
+        try:
+            payload = await asyncio.wait_for(fut, self.wait)
+        except asyncio.TimeoutError:
+            payload = None
+        finally:
+            self._pending.pop(query_id, None)
+        if payload is None:
+            self.fallback += 1
+        else:
+            self.inline += 1
+        return payload
+
+    async def settle(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # آخر مجموعة: انتهت المعالجات دون answer ⇒ لا داعي لانتظار المهلة
+        if update.callback_query is not None:
+            self.release(update.callback_query.id)
+
+    def install(self, app: Application):
+        app.add_handler(TypeHandler(Update, self.settle), group=99)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.inline + self.fallback
+        return {"inline": self.inline, "fallback": self.fallback, "waiting": len(self._pending),
+                "inline_rate": round(self.inline / total, 4) if total else 0.0}
+
+
+REPLY = InlineReply()
+
+
+class InlineReplyRequest(BaseRequest):
+    """يغلّف ناقل تلغرام: answerCallbackQuery المنتظَر في webhook يُؤكَّد محلياً."""
+
+    def __init__(self, inner: BaseRequest, reply: InlineReply = REPLY):
+        self.inner = inner
+        self.reply = reply
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self.inner.read_timeout
+
+    async def initialize(self):
+        await self.inner.initialize()
+
+    async def shutdown(self):
+        await self.inner.shutdown()
+
+    async def do_request(self, url, method, request_data: Optional[RequestData] = None,
+                         read_timeout=BaseRequest.DEFAULT_NONE, write_timeout=BaseRequest.DEFAULT_NONE,
+                         connect_timeout=BaseRequest.DEFAULT_NONE, pool_timeout=BaseRequest.DEFAULT_NONE
+                         ) -> Tuple[int, bytes]:
+        name = url.rsplit("/", 1)[-1]
+        if name in INLINE_METHODS and request_data is not None and self.reply.offer(name, request_data.parameters):
+            return HTTPStatus.OK, _OK_TRUE
+        return await self.inner.do_request(url, method, request_data, read_timeout=read_timeout,
+                                           write_timeout=write_timeout, connect_timeout=connect_timeout,
+                                           pool_timeout=pool_timeout)
+
+
+class WebhookHandler(tornado.web.RequestHandler):
+    SUPPORTED_METHODS = ("POST",)
+
+    def initialize(self, app: Application, reply: InlineReply):
+        self.app = app
+        self.reply = reply
+
+    def set_default_headers(self):
+        self.set_header("Content-Type", 'application/json; charset="utf-8"')
+
+    async def post(self):
+        if self.request.headers.get("Content-Type") != "application/json":
+            raise tornado.web.HTTPError(HTTPStatus.FORBIDDEN)
+        try:
+            update = Update.de_json(json.loads(self.request.body), self.app.bot)
+        except Exception as exc:
+            log.critical("Received webhook data could not be processed: %r", self.request.body, exc_info=exc)
+            raise tornado.web.HTTPError(HTTPStatus.BAD_REQUEST, reason="Update could not be processed") from exc
+        if update is None:
+            return
+        cq = update.callback_query
+        fut = self.reply.expect(cq.id) if cq is not None else None
+        await self.app.update_queue.put(update)
+        if fut is not None:
+            payload = await self.reply.reply_for(cq.id, fut)
+            if payload is not None:
+                self.write(json.dumps(payload, ensure_ascii=False))
+
+
+async def serve(app: Application, listen: str, port: int, url_path: str, webhook_url: str,
+                drop_pending_updates: bool = False, reply: InlineReply = REPLY):
+    """بديل run_webhook بنفس الترتيب (post_init ← webhook ← start … stop ← shutdown ← post_shutdown)."""
+    server = HTTPServer(tornado.web.Application(
+        [(rf"/{url_path}/?", WebhookHandler, {"app": app, "reply": reply})]))
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        async with app:
+            if app.post_init:
+                await app.post_init(app)
+            server.listen(port, address=listen)
+            await app.bot.set_webhook(webhook_url, drop_pending_updates=drop_pending_updates)
+            await app.start()
+            try:
+                await stop.wait()
+            finally:
+                server.stop()
+                await server.close_all_connections()
+                await app.stop()
+                if app.post_stop:
+                    await app.post_stop(app)
+    finally:
+        if app.post_shutdown:
+            await app.post_shutdown(app)